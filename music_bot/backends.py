@@ -0,0 +1,242 @@
+"""
+Key-value stores holding the state the bot's processes share: the scrape cache's second tier, the
+file_ids and the persistence. Values are bytes, keys strings, grouped in namespaces.
+
+SqliteBackend is a single file every worker process of the bot opens, MemoryBackend a stand-in
+living in a single process, for benchmarks and trying things out. WriteBehindBackend hands the
+writes of another backend to a worker thread.
+"""
+import asyncio
+import sqlite3
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from music_bot.logger import logger
+from music_bot.settings import STATE_BACKEND
+
+# (namespace, key) -> value, None to delete the key.
+Changes = Dict[Tuple[str, str], Optional[bytes]]
+
+
+class Backend:
+    def get(self, namespace: str, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def items(self, namespace: str) -> Dict[str, bytes]:
+        raise NotImplementedError
+
+    def contains(self, namespace: str, key: str) -> bool:
+        return self.get(namespace, key) is not None
+
+    def write(self, changes: Changes) -> None:
+        """
+        Applies every change at once, readers see all or none of them.
+        """
+        raise NotImplementedError
+
+    def clear(self, namespace: str) -> None:
+        raise NotImplementedError
+
+    def set(self, namespace: str, key: str, value: bytes) -> None:
+        self.write({(namespace, key): value})
+
+    def delete(self, namespace: str, key: str) -> None:
+        self.write({(namespace, key): None})
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryBackend(Backend):
+    name = "memory"
+
+    def __init__(self, location: str = None):
+        self._data: Dict[str, Dict[str, bytes]] = defaultdict(dict)
+
+    def get(self, namespace: str, key: str) -> Optional[bytes]:
+        return self._data[namespace].get(key)
+
+    def contains(self, namespace: str, key: str) -> bool:
+        return key in self._data[namespace]
+
+    def items(self, namespace: str) -> Dict[str, bytes]:
+        return dict(self._data[namespace])
+
+    def write(self, changes: Changes) -> None:
+        for (namespace, key), value in changes.items():
+            if value is None:
+                self._data[namespace].pop(key, None)
+            else:
+                self._data[namespace][key] = value
+
+    def clear(self, namespace: str) -> None:
+        self._data.pop(namespace, None)
+
+
+class SqliteBackend(Backend):
+    """
+    Safe to share between threads and between processes, writers wait for each other.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, location: str):
+        self.location = location
+        # a connection per thread, opened by its first call rather than here, importing a module
+        # which creates a backend touches no file.
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    @property
+    def _connection(self) -> sqlite3.Connection:
+        # a thread waiting for another process's write doesn't hold up the reads of the others.
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.location, check_same_thread=False, timeout=30)
+            # readers of a process don't wait for the writer of another one.
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS data "
+                "(namespace TEXT, key TEXT, value BLOB, PRIMARY KEY (namespace, key))"
+            )
+            connection.commit()
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def get(self, namespace: str, key: str) -> Optional[bytes]:
+        row = self._connection.execute(
+            "SELECT value FROM data WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone()
+        return row[0] if row else None
+
+    def contains(self, namespace: str, key: str) -> bool:
+        # the value isn't read.
+        row = self._connection.execute(
+            "SELECT 1 FROM data WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone()
+        return row is not None
+
+    def items(self, namespace: str) -> Dict[str, bytes]:
+        rows = self._connection.execute(
+            "SELECT key, value FROM data WHERE namespace = ?", (namespace,)
+        ).fetchall()
+        return dict(rows)
+
+    def write(self, changes: Changes) -> None:
+        rows = [(namespace, key, value) for (namespace, key), value in changes.items()]
+        connection = self._connection
+        with connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO data VALUES (?, ?, ?)",
+                [row for row in rows if row[2] is not None],
+            )
+            connection.executemany(
+                "DELETE FROM data WHERE namespace = ? AND key = ?",
+                [row[:2] for row in rows if row[2] is None],
+            )
+
+    def clear(self, namespace: str) -> None:
+        connection = self._connection
+        with connection:
+            connection.execute("DELETE FROM data WHERE namespace = ?", (namespace,))
+
+    def close(self) -> None:
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections = []
+            # every thread opens a new connection if it's used again.
+            self._local = threading.local()
+
+
+class WriteBehindBackend(Backend):
+    """
+    Writes of another backend, made on the event loop, written together on a worker thread by a
+    task of the loop. With several worker processes a write may wait for another process's, up
+    to the sqlite timeout, the loop never does. Reads see the changes not written yet. Without
+    a running loop changes are written right away.
+    """
+
+    def __init__(self, backend: Backend):
+        self.backend = backend
+        self._pending: Changes = dict()
+        # the changes being written by the worker thread.
+        self._writing: Changes = dict()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def get(self, namespace: str, key: str) -> Optional[bytes]:
+        for changes in (self._pending, self._writing):
+            if (namespace, key) in changes:
+                return changes[(namespace, key)]
+        return self.backend.get(namespace, key)
+
+    def contains(self, namespace: str, key: str) -> bool:
+        for changes in (self._pending, self._writing):
+            if (namespace, key) in changes:
+                return changes[(namespace, key)] is not None
+        return self.backend.contains(namespace, key)
+
+    def items(self, namespace: str) -> Dict[str, bytes]:
+        items = self.backend.items(namespace)
+        for (changed_namespace, key), value in {**self._writing, **self._pending}.items():
+            if changed_namespace != namespace:
+                continue
+            if value is None:
+                items.pop(key, None)
+            else:
+                items[key] = value
+        return items
+
+    def write(self, changes: Changes) -> None:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self.backend.write(changes)
+            return
+        self._pending.update(changes)
+        if self._flush_task is None:
+            # the rest of this round's writes are written with these.
+            self._flush_task = asyncio.create_task(self._flush_pending())
+
+    async def _flush_pending(self) -> None:
+        try:
+            while self._pending:
+                self._writing, self._pending = self._pending, dict()
+                await asyncio.to_thread(self.backend.write, self._writing)
+                self._writing = dict()
+        except Exception as error:
+            logger.error(f"Writing to the {self.backend.name} backend failed: {error!r}")
+        finally:
+            self._writing = dict()
+            self._flush_task = None
+
+    def clear(self, namespace: str) -> None:
+        for changes in (self._pending, self._writing):
+            for key in [key for key in changes if key[0] == namespace]:
+                del changes[key]
+        self.backend.clear(namespace)
+
+    def close(self) -> None:
+        # what wasn't written yet, a batch being written is written again.
+        changes = {**self._writing, **self._pending}
+        self._writing, self._pending = dict(), dict()
+        if changes:
+            self.backend.write(changes)
+        self.backend.close()
+
+
+BACKENDS: Dict[str, Callable[[str], Backend]] = {
+    MemoryBackend.name: MemoryBackend,
+    SqliteBackend.name: SqliteBackend,
+}
+
+
+def open_backend(location: str, name: str = None) -> Backend:
+    """
+    Returns an instance of the named backend (STATE_BACKEND by default) storing at location.
+    """
+    return BACKENDS[name or STATE_BACKEND](location)
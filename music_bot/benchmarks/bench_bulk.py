@@ -0,0 +1,140 @@
+"""
+Bulk downloads (/album): the time to download every song of an artist page with 1, 2 and 4 songs
+downloaded at a time, then the whole command end to end, sending the page in media groups to the
+local fake Bot API, once downloading and once again from the cached file_ids. Reports the Bot API
+calls it took, status message edits included.
+
+    python -m music_bot.benchmarks.bench_bulk [--bandwidth 1000000] [--mp3-size 524288]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import sys
+import time
+
+from music_bot.benchmarks.fixtures import isolate_state
+
+_WORK_DIR = isolate_state()
+_API_PORT = random.randint(20000, 40000)
+os.environ["TELEGRAM_BASE_URL"] = f"http://127.0.0.1:{_API_PORT}/bot"
+
+import music_bot.settings as settings  # noqa: E402
+from music_bot import bot  # noqa: E402
+from music_bot.benchmarks.fake_bot_api import FakeBotApi  # noqa: E402
+from music_bot.benchmarks.fake_server import FakeMusicFaServer  # noqa: E402
+from music_bot.scrap import scraper  # noqa: E402
+from telegram import Update  # noqa: E402
+
+CHAT_ID = 1000
+
+
+def album_update(update_id: int, artist_name: str, page: int) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": CHAT_ID, "type": "private"},
+            "from": {"id": CHAT_ID, "is_bot": False, "first_name": "user"},
+            "text": f"/album {artist_name} {page}",
+            "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+        },
+    }
+
+
+async def download_times(songs, concurrencies) -> list:
+    results = []
+    for concurrency in concurrencies:
+        # a fresh directory, so every run downloads.
+        save_dir = os.path.join(_WORK_DIR, f"concurrency_{concurrency}")
+        start = time.perf_counter()
+        file_paths = await scraper.download_songs(songs, save_dir, concurrency=concurrency)
+        results.append(
+            {
+                "concurrency": concurrency,
+                "songs": len(songs),
+                "files": sum(len(paths) for paths in file_paths if paths),
+                "elapsed_s": time.perf_counter() - start,
+            }
+        )
+        shutil.rmtree(save_dir, ignore_errors=True)
+    return results
+
+
+async def album_command(application, api: FakeBotApi, server, update: dict, name: str) -> dict:
+    api.log.clear()
+    api.calls.clear()
+    mp3_requests = server.requests["mp3"]
+    start = time.perf_counter()
+    await application.update_queue.put(Update.de_json(update, application.bot))
+    while not any(
+        method == "editMessageText" and parameters.get("text", "").endswith("آهنگ ارسال شد.")
+        for method, parameters in api.log
+    ):
+        await asyncio.sleep(0.02)
+    return {
+        "run": name,
+        "elapsed_s": time.perf_counter() - start,
+        "mp3_requests": server.requests["mp3"] - mp3_requests,
+        "bot_api_calls": dict(api.calls),
+    }
+
+
+async def main(args) -> dict:
+    async with FakeMusicFaServer(
+        bandwidth=args.bandwidth, mp3_size=args.mp3_size
+    ) as server, FakeBotApi(port=_API_PORT, latency=args.api_latency) as api:
+        settings.BASE_URL = server.url
+        artist = (await scraper.get_all_artists())[0]
+        songs = await scraper.get_artist_page_songs(artist)
+        results = {"download": await download_times(songs, args.concurrency)}
+        application = bot.build_application(with_updater=False, with_crawler=False)
+        async with application:
+            await bot.on_startup(application)
+            await application.start()
+            try:
+                results["album"] = [
+                    await album_command(
+                        application, api, server, album_update(index, artist.name, 1), name
+                    )
+                    for index, name in enumerate(("downloaded", "cached file_ids"), 1)
+                ]
+            finally:
+                await application.stop()
+                await bot.on_shutdown(application)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--bandwidth", type=int, default=1_000_000, help="bytes/s of every mp3 response")
+    parser.add_argument("--mp3-size", type=int, default=512 * 1024)
+    parser.add_argument("--api-latency", type=float, default=0.02, help="seconds per Bot API call")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--output", help="json file to write the results to")
+    args = parser.parse_args()
+    try:
+        results = asyncio.run(main(args))
+    finally:
+        shutil.rmtree(_WORK_DIR, ignore_errors=True)
+    for result in results["download"]:
+        print(
+            f"{result['concurrency']} songs at a time: {result['songs']} songs "
+            f"({result['files']} files) in {result['elapsed_s']:.2f}s",
+            file=sys.stderr,
+        )
+    for result in results["album"]:
+        calls = ", ".join(f"{method} {count}" for method, count in sorted(result["bot_api_calls"].items()))
+        print(
+            f"/album, {result['run']}: {result['elapsed_s']:.2f}s, {result['mp3_requests']} mp3 "
+            f"requests, {calls}",
+            file=sys.stderr,
+        )
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    else:
+        print(json.dumps(results))
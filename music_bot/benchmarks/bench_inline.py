@@ -0,0 +1,202 @@
+"""
+Load test of the inline mode: many users typing song and artist names at once, each keystroke an
+inline query, against a catalog of synthetic songs, half of them with cached file_ids and half
+with cached audio links. The bot handles the queries in process and answers the local fake Bot
+API. The response time of a keystroke is from the bot receiving it to the answer of it, or of a
+later keystroke of the same user, reaching the API: the results the user sees. Runs with the
+answer cache and without it.
+
+    python -m music_bot.benchmarks.bench_inline [--users 200] [--songs 20000] [--keystroke 0.15]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import time
+
+from music_bot.benchmarks.fixtures import isolate_state
+
+_WORK_DIR = isolate_state()
+_API_PORT = random.randint(20000, 40000)
+os.environ["TELEGRAM_BASE_URL"] = f"http://127.0.0.1:{_API_PORT}/bot"
+
+from music_bot import bot, inline  # noqa: E402
+from music_bot.benchmarks.fake_bot_api import FakeBotApi  # noqa: E402
+from music_bot.scrap import scraper  # noqa: E402
+from music_bot.scrap.models import intern_artist, intern_song  # noqa: E402
+from telegram import Update  # noqa: E402
+
+LETTERS = "ابپتسجچحخدرزژسشصطعغفقکگلمنوهی"
+update_ids = itertools.count(1)
+
+
+def word(rng: random.Random) -> str:
+    return "".join(rng.choice(LETTERS) for _ in range(rng.randint(3, 7)))
+
+
+def fill_catalog(song_count: int, songs_per_artist: int = 50) -> list:
+    """
+    Returns the names users type, every artist's and a sample of the songs'.
+    """
+    rng = random.Random(0)
+    artists, names = [], []
+    for artist_number in range(song_count // songs_per_artist):
+        artist_url = f"https://music-fa.com/artist/{artist_number}"
+        artist = intern_artist(f"{word(rng)} {word(rng)}", artist_url)
+        artists.append(artist)
+        names.append(artist.name)
+        songs = []
+        for song_number in range(songs_per_artist):
+            song_id = artist_number * songs_per_artist + song_number + 1
+            song_url = f"https://music-fa.com/download-song/{song_id}/"
+            song = intern_song(song_id, f"{word(rng)} {word(rng)}", song_url, artist)
+            songs.append(song)
+            if song_id % 2:
+                bot.file_id_cache.set(song.url, [f"audio-{song_id}"])
+            else:
+                audio_link = f"https://ups.music-fa.com/tagdl/{song_id}/{song_id}.mp3"
+                scraper.music_link_extractor.set_cached(
+                    {f"{artist.name} - {song.name}": {"320": audio_link}}, song
+                )
+        scraper.all_artist_songs_paginated.set_cached([songs], artist)
+        scraper.index_artist_songs([songs])
+        names.extend(rng.sample([song.name for song in songs], 5))
+    scraper.index_artists(artists)
+    return names
+
+
+def inline_update(user_id: int, query: str) -> dict:
+    update_id = next(update_ids)
+    return {
+        "update_id": update_id,
+        "inline_query": {
+            "id": str(update_id),
+            "from": {"id": user_id, "is_bot": False, "first_name": f"user {user_id}"},
+            "query": query,
+            "offset": "",
+        },
+    }
+
+
+async def run(application, api: FakeBotApi, names: list, args, name: str) -> dict:
+    inline.answers.clear()
+    hits, misses = (inline.inline_answers.value(cache=cache) for cache in ("hit", "miss"))
+    # user id -> (query id, time it was received) of every keystroke, in order.
+    typed = {user_id: [] for user_id in range(1, args.users + 1)}
+    answered_at = dict()
+
+    def on_call(method: str, parameters: dict) -> None:
+        if method == "answerInlineQuery":
+            answered_at[parameters["inline_query_id"]] = time.perf_counter()
+
+    api.on_call = on_call
+    rng = random.Random(1)
+    weights = [1 / rank for rank in range(1, len(names) + 1)]
+
+    async def type_name(user_id: int) -> None:
+        # users start at different times and type at slightly different speeds.
+        await asyncio.sleep(rng.uniform(0, args.keystroke * 5))
+        # a few names are typed by many users, most by a few, like in any search.
+        name = rng.choices(names, weights)[0]
+        for length in range(1, len(name) + 1):
+            update = inline_update(user_id, name[:length])
+            typed[user_id].append((update["inline_query"]["id"], time.perf_counter()))
+            await application.update_queue.put(Update.de_json(update, application.bot))
+            await asyncio.sleep(args.keystroke * rng.uniform(0.5, 1.5))
+
+    start = time.perf_counter()
+    await asyncio.gather(*[type_name(user_id) for user_id in typed])
+    last_queries = [queries[-1][0] for queries in typed.values()]
+    deadline = time.perf_counter() + 30
+    while not all(query_id in answered_at for query_id in last_queries):
+        if time.perf_counter() > deadline:
+            break
+        await asyncio.sleep(0.02)
+    elapsed = time.perf_counter() - start
+    api.on_call = None
+    # a keystroke is answered by the answer of its query, or of a later one of the same user,
+    # which is what the user sees.
+    times = []
+    for queries in typed.values():
+        next_answer = None
+        for query_id, received_at in reversed(queries):
+            answered = answered_at.get(query_id)
+            if answered and (next_answer is None or answered < next_answer):
+                next_answer = answered
+            if next_answer:
+                times.append(next_answer - received_at)
+    query_count = sum(len(queries) for queries in typed.values())
+    times.sort()
+    hits = inline.inline_answers.value(cache="hit") - hits
+    misses = inline.inline_answers.value(cache="miss") - misses
+    return {
+        "run": name,
+        "queries": query_count,
+        "queries_per_s": query_count / elapsed,
+        "answered": len(times),
+        "answer_calls": len(answered_at),
+        "median_ms": statistics.median(times) * 1000,
+        "p95_ms": times[int(len(times) * 0.95)] * 1000,
+        "p99_ms": times[int(len(times) * 0.99)] * 1000,
+        "max_ms": times[-1] * 1000,
+        "answer_cache_hit_ratio": hits / max(hits + misses, 1),
+    }
+
+
+async def main(args) -> list:
+    names = fill_catalog(args.songs)
+    async with FakeBotApi(port=_API_PORT, latency=args.api_latency) as api:
+        application = bot.build_application(with_updater=False, with_crawler=False)
+        async with application:
+            await bot.on_startup(application)
+            await application.start()
+            try:
+                results = [await run(application, api, names, args, "answer cache")]
+                inline.INLINE_CACHE_TTL = 0
+                results.append(await run(application, api, names, args, "no answer cache"))
+            finally:
+                await application.stop()
+                await bot.on_shutdown(application)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--songs", type=int, default=20000)
+    parser.add_argument("--keystroke", type=float, default=0.15, help="seconds between keystrokes")
+    parser.add_argument("--api-latency", type=float, default=0.05, help="seconds per Bot API call")
+    parser.add_argument("--deadline", type=float, default=1.0, help="median response time allowed")
+    parser.add_argument("--output", help="json file to write the results to")
+    args = parser.parse_args()
+    try:
+        results = asyncio.run(main(args))
+    finally:
+        shutil.rmtree(_WORK_DIR, ignore_errors=True)
+    for result in results:
+        print(
+            f"{result['run']:>16}: {result['queries']} queries ({result['queries_per_s']:.0f}/s), "
+            f"{result['answer_calls']} answered, "
+            f"median {result['median_ms']:.1f}ms, p95 {result['p95_ms']:.1f}ms, "
+            f"p99 {result['p99_ms']:.1f}ms, max {result['max_ms']:.1f}ms, "
+            f"answer cache hits {result['answer_cache_hit_ratio']:.0%}",
+            file=sys.stderr,
+        )
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    else:
+        print(json.dumps(results))
+    sys.exit(
+        0
+        if all(
+            result["answered"] == result["queries"] and result["median_ms"] < args.deadline * 1000
+            for result in results
+        )
+        else 1
+    )
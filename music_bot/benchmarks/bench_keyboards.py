@@ -0,0 +1,156 @@
+"""
+Memory and time of users paging through the artist and song lists, with the keyboards built per
+navigation with whole Artist/Song objects as callback data (kept in PTB's callback data cache, as
+with arbitrary_callback_data) and with cached keyboards of compact callback ids.
+
+    python -m music_bot.benchmarks.bench_keyboards [--artists 3000] [--navigations 20000]
+"""
+import argparse
+import json
+import random
+import shutil
+import sys
+import time
+import tracemalloc
+
+from music_bot.benchmarks.fixtures import isolate_state
+
+_WORK_DIR = isolate_state()
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup  # noqa: E402
+from telegram.ext._callbackdatacache import CallbackDataCache  # noqa: E402
+
+from music_bot.bot import artist_buttons, song_buttons  # noqa: E402
+from music_bot.scrap import scraper  # noqa: E402
+from music_bot.scrap.models import intern_artist, intern_song  # noqa: E402
+from music_bot.utils.utils import create_keyboard_page, paginate_list  # noqa: E402
+
+PAGE_SIZE = 10
+
+
+def synthetic_catalog(artists_count: int, pages_per_artist: int):
+    artists = [
+        intern_artist(f"خواننده شماره {i}", f"https://music-fa.com/artist/artist-{i}/")
+        for i in range(artists_count)
+    ]
+    songs = {
+        artist.url: [
+            intern_song(
+                i * 1000 + j,
+                f"آهنگ شماره {j} از {artist.name}",
+                f"https://music-fa.com/download-song/{i * 1000 + j}/",
+                artist,
+            )
+            for j in range(pages_per_artist * PAGE_SIZE)
+        ]
+        for i, artist in enumerate(artists)
+    }
+    return artists, songs
+
+
+def legacy_keyboard_page(objects, requested_page: int, last_page: int) -> InlineKeyboardMarkup:
+    # the keyboards as they were built before, whole objects as callback data.
+    keyboard_layout = [
+        [InlineKeyboardButton(item.name, callback_data=item) for item in objects[i : i + 2]]
+        for i in range(0, len(objects), 2)
+    ]
+    keyboard_layout.append([InlineKeyboardButton(text="خروج", callback_data="exit")])
+    return InlineKeyboardMarkup(keyboard_layout)
+
+
+def legacy_navigation(artists, songs, callback_data_cache, navigation):
+    kind, artist_number, page = navigation
+    if kind == "artists":
+        paginated = paginate_list(artists)
+    else:
+        paginated = paginate_list(songs[artists[artist_number].url])
+    markup = legacy_keyboard_page(paginated[page - 1], page, len(paginated))
+    # what PTB does to every keyboard it sends with arbitrary_callback_data.
+    return callback_data_cache.process_keyboard(markup)
+
+
+def compact_navigation(artists, songs, _, navigation):
+    kind, artist_number, page = navigation
+    if kind == "artists":
+        scraper.index_artists(artists)
+        page_count = -(-len(artists) // PAGE_SIZE)
+        buttons = artist_buttons(artists[(page - 1) * PAGE_SIZE : page * PAGE_SIZE])
+    else:
+        artist_songs = songs[artists[artist_number].url]
+        page_count = -(-len(artist_songs) // PAGE_SIZE)
+        buttons = song_buttons(artist_songs[(page - 1) * PAGE_SIZE : page * PAGE_SIZE])
+    return create_keyboard_page(buttons, page, page_count)
+
+
+def run(name, navigate, artists, songs, navigations) -> dict:
+    callback_data_cache = CallbackDataCache(bot=None)
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    start = time.perf_counter()
+    for navigation in navigations:
+        navigate(artists, songs, callback_data_cache, navigation)
+    elapsed = time.perf_counter() - start
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "mode": name,
+        "navigations": len(navigations),
+        "us_per_navigation": elapsed / len(navigations) * 1e6,
+        "retained_bytes": after - before,
+        "peak_bytes": peak - before,
+        # keyboards whose buttons stopped working, as their callback data was evicted.
+        "evicted_keyboards": max(0, len(navigations) - callback_data_cache._maxsize)
+        if name == "legacy"
+        else 0,
+        "keyboard_cache_hits": create_keyboard_page.cache_info().hits,
+    }
+
+
+def main(args) -> list:
+    random.seed(0)
+    artists, songs = synthetic_catalog(args.artists, args.pages_per_artist)
+    artist_pages = -(-len(artists) // PAGE_SIZE)
+    # popular pages are visited more, like the first pages of the artist list.
+    navigations = [
+        ("artists", 0, min(artist_pages, int(random.expovariate(0.3)) + 1))
+        if random.random() < 0.5
+        else (
+            "songs",
+            min(args.artists - 1, int(random.expovariate(0.05))),
+            random.randint(1, args.pages_per_artist),
+        )
+        for _ in range(args.navigations)
+    ]
+    # the indexes exist anyway for searching, only the keyboards themselves are measured.
+    scraper.index_artists(artists)
+    for artist in artists:
+        scraper.index_artist_songs([songs[artist.url]])
+    return [
+        run("legacy", legacy_navigation, artists, songs, navigations),
+        run("compact", compact_navigation, artists, songs, navigations),
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--artists", type=int, default=3000)
+    parser.add_argument("--pages-per-artist", type=int, default=5)
+    parser.add_argument("--navigations", type=int, default=20000)
+    parser.add_argument("--output", help="json file to write the results to")
+    args = parser.parse_args()
+    try:
+        results = main(args)
+    finally:
+        shutil.rmtree(_WORK_DIR, ignore_errors=True)
+    for result in results:
+        print(
+            f"{result['mode']:<8} {result['us_per_navigation']:8.1f} us/navigation  "
+            f"retained: {result['retained_bytes'] / 1024:9.1f} KiB  "
+            f"evicted keyboards: {result['evicted_keyboards']}",
+            file=sys.stderr,
+        )
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    else:
+        print(json.dumps(results))
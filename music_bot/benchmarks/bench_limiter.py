@@ -0,0 +1,132 @@
+"""
+Checks the per-host limiter against the local fake music-fa.com server: a burst of concurrent page
+fetches is held to the configured rate and concurrency, and during an outage of the site the circuit
+opens, expired cache entries are served and the site stops being hammered until it recovers.
+
+    python -m music_bot.benchmarks.bench_limiter [--burst 100] [--latency 0.05]
+"""
+import argparse
+import asyncio
+import json
+import shutil
+import sys
+import time
+
+from music_bot.benchmarks.fixtures import isolate_state
+
+_WORK_DIR = isolate_state()
+
+import music_bot.settings as settings  # noqa: E402
+from music_bot.benchmarks.fake_server import FakeMusicFaServer  # noqa: E402
+from music_bot.scrap import scraper  # noqa: E402
+from music_bot.scrap.exceptions import CircuitOpenError  # noqa: E402
+from music_bot.scrap.models import Song  # noqa: E402
+from music_bot.utils.aioutils import close_session, fetch  # noqa: E402
+from music_bot.utils.host_limiter import get_host_limiter, host_limiter_stats  # noqa: E402
+
+
+async def burst(server: FakeMusicFaServer, requests: int) -> dict:
+    limiter = get_host_limiter(server.url)
+    server.requests.clear()
+    server.peak_in_flight = 0
+    start = time.perf_counter()
+    await asyncio.gather(
+        *[fetch(f"{server.url}/download-song/{song_id}/") for song_id in range(requests)]
+    )
+    elapsed = time.perf_counter() - start
+    return {
+        "scenario": "burst",
+        "requests": requests,
+        "elapsed_s": elapsed,
+        "upstream_rate_per_s": requests / elapsed,
+        "rate_limit_per_s": limiter.bucket.rate,
+        "peak_upstream_concurrency": server.peak_in_flight,
+        "concurrency_limit": settings.SCRAPE_CONCURRENCY_PER_HOST,
+        "queue_delay_mean_s": limiter.stats["queue_delay_total_s"] / limiter.stats["requests"],
+        "queue_delay_max_s": limiter.stats["queue_delay_max_s"],
+    }
+
+
+async def outage(server: FakeMusicFaServer, calls: int, reset_timeout: float) -> dict:
+    limiter = get_host_limiter(server.url)
+    limiter.breaker.reset_timeout = reset_timeout
+    song = Song(0, "song", f"{server.url}/download-song/outage/")
+    links = await scraper.music_link_extractor(song)
+    # every cached value is now expired.
+    scraper.cache.ttls = {key: 0 for key in scraper.cache.ttls}
+    scraper.cache.default_ttl = scraper.cache.stale_ttl = 0
+    server.fail_html = True
+    server.requests.clear()
+    served, failed = 0, 0
+    for _ in range(calls):
+        try:
+            served += await scraper.music_link_extractor(song) == links
+        except CircuitOpenError:
+            failed += 1
+        except Exception:
+            # the 503s which open the circuit.
+            failed += 1
+    upstream_requests_during_outage = sum(server.requests.values())
+    circuit_during_outage = limiter.breaker.state
+    server.fail_html = False
+    await asyncio.sleep(reset_timeout)
+    await scraper.music_link_extractor(song)
+    return {
+        "scenario": "outage",
+        "calls": calls,
+        "served_expired": served,
+        "failed": failed,
+        "upstream_requests": upstream_requests_during_outage,
+        "circuit_during_outage": circuit_during_outage,
+        "circuit_after_recovery": limiter.breaker.state,
+        "limiter": host_limiter_stats()[limiter.host],
+    }
+
+
+async def main(args) -> list:
+    settings.BASE_URL = "unused"
+    async with FakeMusicFaServer(latency=args.latency) as server:
+        try:
+            return [
+                await burst(server, args.burst),
+                await outage(server, args.outage_calls, args.reset_timeout),
+            ]
+        finally:
+            await close_session()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--burst", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per response")
+    parser.add_argument("--outage-calls", type=int, default=50)
+    parser.add_argument("--reset-timeout", type=float, default=0.5)
+    parser.add_argument("--output", help="json file to write the results to")
+    args = parser.parse_args()
+    try:
+        results = asyncio.run(main(args))
+    finally:
+        shutil.rmtree(_WORK_DIR, ignore_errors=True)
+    burst_result, outage_result = results
+    ok = (
+        burst_result["peak_upstream_concurrency"] <= burst_result["concurrency_limit"]
+        and outage_result["circuit_during_outage"] == "open"
+        and outage_result["served_expired"] > 0
+        and outage_result["circuit_after_recovery"] == "closed"
+    )
+    print(
+        f"burst: {burst_result['upstream_rate_per_s']:.1f} req/s "
+        f"(limit {burst_result['rate_limit_per_s']}), peak concurrency "
+        f"{burst_result['peak_upstream_concurrency']}, mean queue delay "
+        f"{burst_result['queue_delay_mean_s']:.2f}s\n"
+        f"outage: {outage_result['served_expired']}/{outage_result['calls']} served expired, "
+        f"{outage_result['upstream_requests']} upstream requests, circuit "
+        f"{outage_result['circuit_during_outage']} -> {outage_result['circuit_after_recovery']}",
+        file=sys.stderr,
+    )
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    else:
+        print(json.dumps(results))
+    sys.exit(0 if ok else 1)
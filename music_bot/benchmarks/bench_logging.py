@@ -0,0 +1,171 @@
+"""
+Time the event loop spends in logging calls: the former FileHandler and StreamHandler, written
+on the calling thread, against the queue the records are handed to now. A disk latency per write
+simulates a slow or busy disk. Also checks the json records carry the bound context fields, that
+the file is rotated and that debug records are sampled.
+
+    python -m music_bot.benchmarks.bench_logging [--records 5000] [--disk-latency 0.001]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import queue
+import shutil
+import statistics
+import sys
+import time
+from logging.handlers import QueueListener, RotatingFileHandler
+
+from music_bot.benchmarks.fixtures import isolate_state
+
+_WORK_DIR = isolate_state()
+
+from music_bot.logger import (  # noqa: E402
+    ContextFilter,
+    JsonFormatter,
+    RecordQueueHandler,
+    SamplingFilter,
+    log_context,
+)
+
+DEBUG_SAMPLE_RATE = 0.1
+
+
+def slow(handler_class, disk_latency: float):
+    class SlowHandler(handler_class):
+        def emit(self, record):
+            time.sleep(disk_latency)
+            super().emit(record)
+
+    return SlowHandler
+
+
+def legacy_logger(work_dir: str, disk_latency: float):
+    file_handler = slow(logging.FileHandler, disk_latency)(
+        os.path.join(work_dir, "legacy.log"), mode="w"
+    )
+    stream_handler = logging.StreamHandler(open(os.devnull, "w"))
+    formatter = logging.Formatter("%(asctime)s | %(levelname)s | %(message)s")
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+    logger = logging.Logger("legacy", level=logging.INFO)
+    logger.addHandler(file_handler)
+    logger.addHandler(stream_handler)
+    return logger, lambda: None
+
+
+def queued_logger(work_dir: str, disk_latency: float, max_bytes: int):
+    file_handler = slow(RotatingFileHandler, disk_latency)(
+        os.path.join(work_dir, "queued.log"), maxBytes=max_bytes, backupCount=100
+    )
+    file_handler.setFormatter(JsonFormatter())
+    stream_handler = logging.StreamHandler(open(os.devnull, "w"))
+    log_queue = queue.SimpleQueue()
+    queue_handler = RecordQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(DEBUG_SAMPLE_RATE))
+    queue_handler.addFilter(ContextFilter())
+    listener = QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+    listener.start()
+    logger = logging.Logger("queued", level=logging.DEBUG)
+    logger.addHandler(queue_handler)
+    return logger, listener.stop
+
+
+async def emit(logger: logging.Logger, records: int) -> list:
+    # what a handler does: a few records per update, between awaits.
+    durations = []
+    for update_id in range(records):
+        with log_context(correlation_id=update_id, user_id=update_id % 100):
+            start = time.perf_counter()
+            logger.info(f"Song {update_id} was sent.", extra={"song_id": update_id, "duration_s": 1.5})
+            durations.append(time.perf_counter() - start)
+            logger.debug(f"Sending audio {update_id}.")
+        await asyncio.sleep(0)
+    return durations
+
+
+def check_records(work_dir: str, records: int) -> dict:
+    files = [name for name in os.listdir(work_dir) if name.startswith("queued.log")]
+    entries = []
+    for name in files:
+        with open(os.path.join(work_dir, name), encoding="utf-8") as file:
+            entries.extend(json.loads(line) for line in file)
+    info = [entry for entry in entries if entry["level"] == "INFO"]
+    debug = [entry for entry in entries if entry["level"] == "DEBUG"]
+    return {
+        "log_files": len(files),
+        "info_records": len(info),
+        "with_context": sum(
+            entry.get("correlation_id") is not None and "user_id" in entry and "song_id" in entry
+            for entry in info
+        ),
+        "debug_kept_ratio": len(debug) / records,
+    }
+
+
+async def run(name: str, make_logger, records: int) -> dict:
+    logger, stop = make_logger()
+    start = time.perf_counter()
+    durations = await emit(logger, records)
+    loop_time = time.perf_counter() - start
+    stop()
+    durations.sort()
+    return {
+        "logging": name,
+        "records": records,
+        "loop_s": loop_time,
+        "call_mean_us": statistics.fmean(durations) * 1e6,
+        "call_p99_us": durations[int(len(durations) * 0.99)] * 1e6,
+    }
+
+
+async def main(args) -> dict:
+    try:
+        results = [
+            await run(
+                "sync", lambda: legacy_logger(_WORK_DIR, args.disk_latency), args.records
+            ),
+            await run(
+                "queued",
+                lambda: queued_logger(_WORK_DIR, args.disk_latency, args.max_bytes),
+                args.records,
+            ),
+        ]
+        return {"runs": results, "checks": check_records(_WORK_DIR, args.records)}
+    finally:
+        shutil.rmtree(_WORK_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=5000)
+    parser.add_argument("--disk-latency", type=float, default=0.001, help="seconds per write")
+    parser.add_argument("--max-bytes", type=int, default=256 * 1024, help="rotation size")
+    parser.add_argument("--output", help="json file to write the results to")
+    args = parser.parse_args()
+    results = asyncio.run(main(args))
+    for result in results["runs"]:
+        print(
+            f"{result['logging']:<7} loop: {result['loop_s']:6.2f}s  call mean "
+            f"{result['call_mean_us']:8.1f} us  p99 {result['call_p99_us']:8.1f} us",
+            file=sys.stderr,
+        )
+    checks = results["checks"]
+    print(
+        f"json records: {checks['info_records']}, with context: {checks['with_context']}, "
+        f"files: {checks['log_files']}, debug kept: {checks['debug_kept_ratio']:.2f}",
+        file=sys.stderr,
+    )
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    else:
+        print(json.dumps(results))
+    ok = (
+        checks["info_records"] == args.records
+        and checks["with_context"] == args.records
+        and checks["log_files"] > 1
+    )
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,140 @@
+"""
+Overhead of the metrics on a handler call and a cached scraper call, and a check of the metrics
+endpoint after scraping and downloading from the local fake music-fa.com server: every expected
+series is exposed, and a sampled handler call leaves its profile in PROFILE_DIR.
+
+    python -m music_bot.benchmarks.bench_metrics [--calls 100000]
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import sys
+import time
+
+from music_bot.benchmarks.fixtures import isolate_state
+
+_WORK_DIR = isolate_state()
+
+import music_bot.settings as settings  # noqa: E402
+from music_bot import metrics, profiling  # noqa: E402
+from music_bot.benchmarks.fake_server import FakeMusicFaServer  # noqa: E402
+from music_bot.scrap import scraper  # noqa: E402
+from music_bot.scrap.models import Song  # noqa: E402
+from music_bot.utils.aioutils import close_session, get_session  # noqa: E402
+
+EXPECTED_SERIES = (
+    "musicbot_handler_latency_seconds_count",
+    "musicbot_scraper_call_seconds_bucket",
+    "musicbot_upstream_requests_total",
+    "musicbot_upstream_bytes_total",
+    "musicbot_upstream_fetch_seconds_sum",
+    "musicbot_download_seconds_count",
+    "musicbot_scrape_cache_events_total",
+    "musicbot_scrape_cache_hit_ratio",
+    "musicbot_host_requests_total",
+    "musicbot_host_circuit_state",
+)
+
+
+async def noop(update, context):
+    return None
+
+
+async def per_call_ns(function, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        await function(None, None)
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+async def overhead(calls: int) -> dict:
+    instrumented = metrics.instrument_handler(noop)
+    await scraper.get_all_artists()
+    start = time.perf_counter()
+    for _ in range(calls):
+        scraper.cache.lookup(("get_all_artists",))
+    lookup_ns = (time.perf_counter() - start) / calls * 1e9
+    start = time.perf_counter()
+    for _ in range(calls):
+        await scraper.get_all_artists()
+    cached_call_ns = (time.perf_counter() - start) / calls * 1e9
+    return {
+        "scenario": "overhead",
+        "calls": calls,
+        "handler_bare_ns": await per_call_ns(noop, calls),
+        "handler_instrumented_ns": await per_call_ns(instrumented, calls),
+        "cache_lookup_ns": lookup_ns,
+        "cached_scraper_call_ns": cached_call_ns,
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def endpoint(server: FakeMusicFaServer) -> dict:
+    song = Song(1, "song", f"{server.url}/download-song/1/")
+    await scraper.download_song(song, settings.SAVE_DIR)
+    # sampled at a rate of 1, so the call is profiled.
+    with profiling.maybe_profile("bench_handler", sample_rate=1):
+        await metrics.instrument_handler(noop)(None, None)
+    port = free_port()
+    runner = await metrics.start_metrics_server("127.0.0.1", port)
+    try:
+        start = time.perf_counter()
+        async with get_session().get(f"http://127.0.0.1:{port}/metrics") as response:
+            text = await response.text()
+            content_type = response.headers["Content-Type"]
+        scrape_s = time.perf_counter() - start
+    finally:
+        await metrics.stop_metrics_server(runner)
+    names = {line.split("{")[0].split(" ")[0] for line in text.splitlines() if not line.startswith("#")}
+    return {
+        "scenario": "endpoint",
+        "content_type": content_type,
+        "series": len(text.splitlines()),
+        "scrape_s": scrape_s,
+        "missing": [name for name in EXPECTED_SERIES if name not in names],
+        "profiles": os.listdir(settings.PROFILE_DIR) if os.path.isdir(settings.PROFILE_DIR) else [],
+    }
+
+
+async def main(args) -> list:
+    async with FakeMusicFaServer(mp3_size=256 * 1024) as server:
+        settings.BASE_URL = server.url
+        try:
+            return [await overhead(args.calls), await endpoint(server)]
+        finally:
+            await close_session()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=100_000)
+    parser.add_argument("--output", help="json file to write the results to")
+    args = parser.parse_args()
+    try:
+        results = asyncio.run(main(args))
+    finally:
+        shutil.rmtree(_WORK_DIR, ignore_errors=True)
+    overhead_result, endpoint_result = results
+    print(
+        f"handler: {overhead_result['handler_bare_ns']:.0f} ns bare, "
+        f"{overhead_result['handler_instrumented_ns']:.0f} ns instrumented\n"
+        f"cached scraper call: {overhead_result['cached_scraper_call_ns']:.0f} ns "
+        f"(cache lookup alone {overhead_result['cache_lookup_ns']:.0f} ns)\n"
+        f"endpoint: {endpoint_result['series']} lines in {endpoint_result['scrape_s'] * 1000:.1f} ms, "
+        f"missing: {endpoint_result['missing']}, profiles: {endpoint_result['profiles']}",
+        file=sys.stderr,
+    )
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    else:
+        print(json.dumps(results))
+    sys.exit(0 if not endpoint_result["missing"] and endpoint_result["profiles"] else 1)
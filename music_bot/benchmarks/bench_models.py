@@ -0,0 +1,138 @@
+"""
+Memory of a synthetic catalog (100k songs by default) held the way the scraper holds it: every
+artist page and the artist's whole paginated song list cached separately, both loaded back from
+the scrape cache's pickles. Compares the former plain dataclasses, of which every loaded list has
+its own copies, with the slotted, interned models.
+
+    python -m music_bot.benchmarks.bench_models [--songs 100000] [--songs-per-artist 100]
+"""
+import argparse
+import gc
+import json
+import pickle
+import shutil
+import sys
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import List
+
+from music_bot.benchmarks.fixtures import isolate_state
+
+_WORK_DIR = isolate_state()
+
+from music_bot.scrap import models  # noqa: E402
+from music_bot.utils.utils import paginate_list  # noqa: E402
+
+PAGE_SIZE = 10
+
+
+@dataclass
+class LegacySong:
+    id: int
+    name: str
+    url: str
+    artist: "LegacyArtist" = None
+
+
+@dataclass
+class LegacyArtist:
+    name: str
+    url: str
+    songs: List[LegacySong] = field(default_factory=list)
+
+
+def catalog_rows(songs_count: int, songs_per_artist: int):
+    for artist_number in range(songs_count // songs_per_artist):
+        artist = (f"خواننده شماره {artist_number}", f"https://music-fa.com/artist/artist-{artist_number}/")
+        songs = [
+            (
+                # ids are strings as parsed from the urls, the legacy models kept them so.
+                str(artist_number * songs_per_artist + j),
+                f"آهنگ شماره {j} از {artist[0]}",
+                f"https://music-fa.com/download-song/{artist_number * songs_per_artist + j}/",
+            )
+            for j in range(songs_per_artist)
+        ]
+        yield artist, songs
+
+
+def load_legacy(rows) -> list:
+    cached = []
+    for (name, url), song_rows in rows:
+        artist = LegacyArtist(name, url)
+        songs = [LegacySong(id_, song_name, song_url) for id_, song_name, song_url in song_rows]
+        pages = paginate_list(songs, PAGE_SIZE)
+        # what the scrape cache's disk tier hands back, one pickle per cache entry.
+        cached.append(pickle.loads(pickle.dumps(artist)))
+        cached.extend(pickle.loads(pickle.dumps(page)) for page in pages)
+        cached.append(pickle.loads(pickle.dumps(pages)))
+    return cached
+
+
+def load_interned(rows) -> list:
+    cached = []
+    for (name, url), song_rows in rows:
+        artist = models.intern_artist(name, url)
+        songs = [
+            models.intern_song(int(id_), song_name, song_url, artist)
+            for id_, song_name, song_url in song_rows
+        ]
+        pages = paginate_list(songs, PAGE_SIZE)
+        cached.append(pickle.loads(pickle.dumps(artist)))
+        cached.extend(pickle.loads(pickle.dumps(page)) for page in pages)
+        cached.append(pickle.loads(pickle.dumps(pages)))
+    return cached
+
+
+def _songs(entry):
+    if isinstance(entry, list):
+        for item in entry:
+            yield from _songs(item)
+    elif isinstance(entry, (LegacySong, models.Song)):
+        yield entry
+
+
+def measure(name: str, load, songs_count: int, songs_per_artist: int) -> dict:
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    cached = load(catalog_rows(songs_count, songs_per_artist))
+    gc.collect()
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    song_objects = len({id(song) for song in _songs(cached)})
+    del cached
+    return {
+        "models": name,
+        "songs": songs_count,
+        "song_objects": song_objects,
+        "retained_bytes": after - before,
+        "peak_bytes": peak - before,
+        "bytes_per_song": (after - before) / songs_count,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--songs", type=int, default=100_000)
+    parser.add_argument("--songs-per-artist", type=int, default=100)
+    parser.add_argument("--output", help="json file to write the results to")
+    args = parser.parse_args()
+    try:
+        results = [
+            measure("legacy", load_legacy, args.songs, args.songs_per_artist),
+            measure("interned", load_interned, args.songs, args.songs_per_artist),
+        ]
+    finally:
+        shutil.rmtree(_WORK_DIR, ignore_errors=True)
+    for result in results:
+        print(
+            f"{result['models']:<9} {result['retained_bytes'] / 1024 / 1024:7.1f} MiB  "
+            f"{result['bytes_per_song']:6.0f} bytes/song  song objects: {result['song_objects']}",
+            file=sys.stderr,
+        )
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    else:
+        print(json.dumps(results))
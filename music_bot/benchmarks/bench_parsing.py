@@ -0,0 +1,78 @@
+"""
+Compares the speed of the html extractors against the reference BeautifulSoup/html.parser one,
+and checks that they extract exactly the same data.
+
+    python -m music_bot.benchmarks.bench_parsing [--repeat 20] [--output results.json]
+"""
+import argparse
+import json
+import shutil
+import statistics
+import sys
+import time
+
+from music_bot.benchmarks.fixtures import FIXTURES_DIR, isolate_state, load_fixtures
+
+_WORK_DIR = isolate_state()
+
+from music_bot.scrap.extractors import EXTRACTORS, SoupExtractor  # noqa: E402
+
+# fixture name -> extractor method reading it
+CASES = {
+    "home.html": "artists",
+    "artist.html": "artist_page",
+    "artist_page_2.html": "artist_page",
+    "song.html": "audio_links",
+}
+
+
+def benchmark(fixtures_dir: str = FIXTURES_DIR, repeat: int = 20) -> list:
+    fixtures = load_fixtures(fixtures_dir)
+    reference = SoupExtractor("html.parser")
+    results = []
+    for fixture_name, method in CASES.items():
+        html = fixtures[fixture_name]
+        expected = getattr(reference, method)(html)
+        for extractor_name, extractor_class in EXTRACTORS.items():
+            extract = getattr(extractor_class(), method)
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                extracted = extract(html)
+                timings.append(time.perf_counter() - start)
+            results.append(
+                {
+                    "fixture": fixture_name,
+                    "extractor": extractor_name,
+                    "html_bytes": len(html.encode()),
+                    "median_ms": statistics.median(timings) * 1000,
+                    "min_ms": min(timings) * 1000,
+                    "equal_to_reference": extracted == expected,
+                }
+            )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--fixtures", default=FIXTURES_DIR)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", help="json file to write the results to")
+    args = parser.parse_args()
+    try:
+        results = benchmark(args.fixtures, args.repeat)
+    finally:
+        shutil.rmtree(_WORK_DIR, ignore_errors=True)
+    for result in results:
+        print(
+            f"{result['fixture']:<20} {result['extractor']:<15} "
+            f"{result['median_ms']:8.2f} ms  equal: {result['equal_to_reference']}",
+            file=sys.stderr,
+        )
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    else:
+        print(json.dumps(results))
+    if not all(result["equal_to_reference"] for result in results):
+        sys.exit(1)
@@ -0,0 +1,118 @@
+"""
+Cost of persisting conversations and user data: every update written with its own commit, as a
+naive persistence would, against BackendPersistence's batched flushes on a worker thread. Also
+checks that the data of every user is back after a restart.
+
+    python -m music_bot.benchmarks.bench_persistence [--users 1000] [--rounds 10]
+"""
+import argparse
+import asyncio
+import json
+import os
+import pickle
+import shutil
+import sys
+import time
+
+from music_bot.benchmarks.fixtures import isolate_state
+
+_WORK_DIR = isolate_state()
+
+from music_bot.backends import SqliteBackend  # noqa: E402
+from music_bot.persistence import BackendPersistence  # noqa: E402
+from music_bot.scrap.models import intern_artist  # noqa: E402
+
+
+class WritePerUpdatePersistence(BackendPersistence):
+    def _write(self, kind, key, value=None, delete=False):
+        # committed on the event loop right away, one transaction per call.
+        self._commit({(kind, str(key)): None if delete else pickle.dumps(value)})
+
+
+def user_data(user_id: int, round_: int) -> dict:
+    return {
+        "start_message_id": 1000 + round_,
+        "requested_artist": intern_artist(
+            f"خواننده {user_id}", f"https://music-fa.com/artist/{user_id}/"
+        ),
+        "download_inform": True,
+    }
+
+
+async def run(name: str, persistence_class, db_path: str, users: int, rounds: int) -> dict:
+    persistence = persistence_class(SqliteBackend(db_path))
+    # the time the event loop is blocked by persistence, what users would wait for.
+    blocked = 0.0
+    start = time.perf_counter()
+    for round_ in range(rounds):
+        # one round of PTB's update_persistence: every changed user and conversation.
+        calls_start = time.perf_counter()
+        await asyncio.gather(
+            *[
+                persistence.update_user_data(user, user_data(user, round_))
+                for user in range(users)
+            ],
+            *[
+                persistence.update_conversation("music_bot", (user, user), round_ % 4)
+                for user in range(users)
+            ],
+        )
+        blocked += time.perf_counter() - calls_start
+        await asyncio.sleep(0)
+    await persistence.flush()
+    elapsed = time.perf_counter() - start
+    restored = BackendPersistence(SqliteBackend(db_path))
+    restored_users = await restored.get_user_data()
+    restored_conversations = await restored.get_conversations("music_bot")
+    await restored.flush()
+    return {
+        "mode": name,
+        "users": users,
+        "rounds": rounds,
+        "loop_blocked_ms_per_round": blocked / rounds * 1000,
+        "total_s": elapsed,
+        "commits": persistence.stats["flushes"],
+        "restored": len(restored_users) == users
+        and all(data == user_data(user, rounds - 1) for user, data in restored_users.items())
+        and restored_conversations.get((0, 0)) == (rounds - 1) % 4,
+    }
+
+
+async def main(args) -> list:
+    try:
+        return [
+            await run(
+                name,
+                persistence_class,
+                os.path.join(_WORK_DIR, f"{name}.sqlite3"),
+                args.users,
+                args.rounds,
+            )
+            for name, persistence_class in (
+                ("write_per_update", WritePerUpdatePersistence),
+                ("batched", BackendPersistence),
+            )
+        ]
+    finally:
+        shutil.rmtree(_WORK_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--output", help="json file to write the results to")
+    args = parser.parse_args()
+    results = asyncio.run(main(args))
+    for result in results:
+        print(
+            f"{result['mode']:<17} loop blocked: {result['loop_blocked_ms_per_round']:8.1f} ms/round  "
+            f"commits: {result['commits']:<6} restored: {result['restored']}",
+            file=sys.stderr,
+        )
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    else:
+        print(json.dumps(results))
+    sys.exit(0 if all(result["restored"] for result in results) else 1)
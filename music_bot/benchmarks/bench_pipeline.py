@@ -0,0 +1,124 @@
+"""
+Time-to-first-audio and total send time of a song with several audios, when its files are uploaded
+after all of them are downloaded (sequential) and as soon as each one is (pipelined). Downloads go
+to the local fake music-fa.com server, uploads to telegram are simulated with upload_bandwidth.
+
+    python -m music_bot.benchmarks.bench_pipeline [--bandwidth 2000000] [--upload-bandwidth 4000000]
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import statistics
+import sys
+import time
+
+from music_bot.benchmarks.fixtures import isolate_state
+
+_WORK_DIR = isolate_state()
+
+import music_bot.settings as settings  # noqa: E402
+from music_bot.benchmarks.fake_server import FakeMusicFaServer  # noqa: E402
+from music_bot.scrap import scraper  # noqa: E402
+from music_bot.utils.aioutils import close_session, iterate_queue  # noqa: E402
+
+
+async def sequential(song, save_dir: str, upload) -> float:
+    """
+    Returns the time to first audio.
+    """
+    start = time.perf_counter()
+    time_to_first_audio = None
+    for file_path in await scraper.download_song(song, save_dir):
+        await upload(file_path)
+        time_to_first_audio = time_to_first_audio or time.perf_counter() - start
+    return time_to_first_audio
+
+
+async def pipelined(song, save_dir: str, upload) -> float:
+    start = time.perf_counter()
+    times_to_audio = []
+    downloaded_paths = asyncio.Queue()
+
+    async def send():
+        async for file_path in iterate_queue(downloaded_paths):
+            await upload(file_path)
+            times_to_audio.append(time.perf_counter() - start)
+
+    sending = asyncio.create_task(send())
+    try:
+        await scraper.download_song(song, save_dir, on_file=downloaded_paths.put_nowait)
+    finally:
+        downloaded_paths.put_nowait(None)
+        await sending
+    return times_to_audio[0]
+
+
+async def benchmark(server: FakeMusicFaServer, args) -> list:
+    settings.BASE_URL = server.url
+    artists = await scraper.get_all_artists()
+    songs = await scraper.get_artist_page_songs(artists[0])
+    for song in songs:
+        await scraper.music_link_extractor(song)
+
+    async def upload(file_path):
+        await asyncio.sleep(os.path.getsize(file_path) / args.upload_bandwidth)
+
+    results = []
+    for name, send_song in (("sequential", sequential), ("pipelined", pipelined)):
+        times_to_first_audio, total_times = [], []
+        for run in range(args.runs):
+            # a fresh directory, so every run downloads.
+            save_dir = os.path.join(_WORK_DIR, f"{name}_{run}")
+            start = time.perf_counter()
+            times_to_first_audio.append(await send_song(songs[run % len(songs)], save_dir, upload))
+            total_times.append(time.perf_counter() - start)
+            shutil.rmtree(save_dir, ignore_errors=True)
+        results.append(
+            {
+                "mode": name,
+                "runs": args.runs,
+                "audios_per_song": len(await scraper.song_audio_links(songs[0])),
+                "time_to_first_audio_p50_s": statistics.median(times_to_first_audio),
+                "total_p50_s": statistics.median(total_times),
+            }
+        )
+    return results
+
+
+async def main(args) -> list:
+    # bounds the song's files like a busy bot would, so they don't all finish together.
+    scraper.download_semaphore = asyncio.Semaphore(args.download_concurrency)
+    server = FakeMusicFaServer(bandwidth=args.bandwidth, mp3_size=args.mp3_size)
+    async with server:
+        try:
+            return await benchmark(server, args)
+        finally:
+            await close_session()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--bandwidth", type=int, default=2_000_000, help="bytes per second per mp3")
+    parser.add_argument("--upload-bandwidth", type=int, default=4_000_000, help="bytes per second")
+    parser.add_argument("--download-concurrency", type=int, default=1)
+    parser.add_argument("--mp3-size", type=int, default=2 * 1024 * 1024)
+    parser.add_argument("--output", help="json file to write the results to")
+    args = parser.parse_args()
+    try:
+        results = asyncio.run(main(args))
+    finally:
+        shutil.rmtree(_WORK_DIR, ignore_errors=True)
+    for result in results:
+        print(
+            f"{result['mode']:<12} first audio: {result['time_to_first_audio_p50_s']:6.2f}s  "
+            f"total: {result['total_p50_s']:6.2f}s",
+            file=sys.stderr,
+        )
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    else:
+        print(json.dumps(results))
@@ -0,0 +1,105 @@
+"""
+Downloads through the fake server while it drops connections mid-stream, checking that
+download_file resumes with Range requests, retries, and ends up with an intact file.
+Reports the upstream bytes each scenario needed, exits non-zero when a scenario misbehaves.
+
+    python -m music_bot.benchmarks.bench_resume [--mp3-size 2000000] [--output results.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import time
+
+from music_bot.benchmarks.fixtures import isolate_state
+
+_WORK_DIR = isolate_state()
+
+from music_bot.benchmarks.fake_server import MP3_FRAME_HEADER, FakeMusicFaServer  # noqa: E402
+from music_bot.scrap.exceptions import DownloadRetriesExhaustedError  # noqa: E402
+from music_bot.utils import aioutils  # noqa: E402
+
+# name -> (fake server fault options, whether the download is expected to succeed)
+SCENARIOS = {
+    "healthy": (dict(), True),
+    "disconnects_with_ranges": (dict(disconnect_after=0.3, disconnects=3), True),
+    "disconnects_without_ranges": (
+        dict(disconnect_after=0.3, disconnects=3, accept_ranges=False),
+        True,
+    ),
+    # every response makes a little progress, but not enough to finish within the retries.
+    "always_disconnects": (dict(disconnect_after=0.05), False),
+}
+
+
+async def run_scenario(name: str, fault_options: dict, mp3_size: int, retries: int) -> dict:
+    fault_options = dict(fault_options)
+    if "disconnect_after" in fault_options:
+        fault_options["disconnect_after"] = int(mp3_size * fault_options["disconnect_after"])
+    server = FakeMusicFaServer(mp3_size=mp3_size, **fault_options)
+    file_path = os.path.join(_WORK_DIR, f"{name}.mp3")
+    async with server:
+        start = time.perf_counter()
+        error = None
+        try:
+            await aioutils.download_file(f"{server.url}/tagdl/1/song.mp3", file_path, retries=retries)
+        except DownloadRetriesExhaustedError as exhausted:
+            error = exhausted
+        elapsed = time.perf_counter() - start
+    intact = False
+    if error is None:
+        expected = (MP3_FRAME_HEADER * (mp3_size // len(MP3_FRAME_HEADER) + 1))[:mp3_size]
+        with open(file_path, "rb") as file:
+            intact = file.read() == expected
+        os.remove(file_path)
+    return {
+        "scenario": name,
+        "succeeded": error is None,
+        "intact": intact,
+        "error": repr(error) if error else None,
+        "attempts": server.requests["mp3"],
+        "injected_disconnects": server.injected_disconnects,
+        "upstream_bytes": server.sent_bytes,
+        "wasted_bytes_ratio": server.sent_bytes / mp3_size - 1,
+        "elapsed_s": elapsed,
+    }
+
+
+async def main(args) -> list:
+    # retries are immediate, the backoff itself isn't what's measured.
+    aioutils.DOWNLOAD_RETRY_BACKOFF = 0.01
+    try:
+        return [
+            await run_scenario(name, fault_options, args.mp3_size, args.retries)
+            for name, (fault_options, _) in SCENARIOS.items()
+        ]
+    finally:
+        await aioutils.close_session()
+        shutil.rmtree(_WORK_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mp3-size", type=int, default=2_000_000)
+    parser.add_argument("--retries", type=int, default=4)
+    parser.add_argument("--output", help="json file to write the results to")
+    args = parser.parse_args()
+    results = asyncio.run(main(args))
+    failed = False
+    for result in results:
+        should_succeed = SCENARIOS[result["scenario"]][1]
+        ok = result["succeeded"] == should_succeed and (result["intact"] or not should_succeed)
+        failed = failed or not ok
+        print(
+            f"{result['scenario']:<28} {'ok' if ok else 'FAILED':<7} attempts: {result['attempts']:<3} "
+            f"upstream: {result['upstream_bytes']:>9} bytes",
+            file=sys.stderr,
+        )
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    else:
+        print(json.dumps(results))
+    sys.exit(1 if failed else 0)
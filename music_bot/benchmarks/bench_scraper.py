@@ -0,0 +1,134 @@
+"""
+End-to-end scraper benchmark against the local fake music-fa.com server, simulating concurrent users.
+Every scenario starts from a cold cache, results are printed (or written) as json.
+
+    python -m music_bot.benchmarks.bench_scraper [--users 1 10 50] [--latency 0.05] [--bandwidth 2000000]
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import statistics
+import sys
+import time
+
+from music_bot.benchmarks.fixtures import isolate_state
+
+_WORK_DIR = isolate_state()
+
+import music_bot.settings as settings  # noqa: E402
+from music_bot.benchmarks.fake_server import FakeMusicFaServer  # noqa: E402
+from music_bot.benchmarks.fixtures import FIXTURES_DIR  # noqa: E402
+from music_bot.scrap import scraper  # noqa: E402
+from music_bot.utils.aioutils import close_session  # noqa: E402
+
+
+def _percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+async def _run_users(users: int, user_call) -> dict:
+    async def timed(user):
+        start = time.perf_counter()
+        await user_call(user)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*[timed(user) for user in range(users)])
+    wall_time = time.perf_counter() - start
+    return {
+        "users": users,
+        "wall_time_s": wall_time,
+        "latency_p50_ms": statistics.median(latencies) * 1000,
+        "latency_p95_ms": _percentile(latencies, 95) * 1000,
+        "latency_max_ms": max(latencies) * 1000,
+        "throughput_calls_per_s": users / wall_time,
+    }
+
+
+async def benchmark(server: FakeMusicFaServer, users_counts) -> list:
+    settings.BASE_URL = server.url
+    artists = await scraper.get_all_artists()
+    songs = await scraper.get_artist_page_songs(artists[0])
+
+    async def download(user):
+        save_dir = os.path.join(_WORK_DIR, f"user_{user}")
+        os.makedirs(save_dir, exist_ok=True)
+        await scraper.download_song(songs[user % len(songs)], save_dir)
+
+    scenarios = {
+        "get_all_artists": lambda user: scraper.get_all_artists(),
+        "all_artist_songs_paginated": lambda user: scraper.all_artist_songs_paginated(
+            artists[user % len(artists)]
+        ),
+        "music_link_extractor": lambda user: scraper.music_link_extractor(
+            songs[user % len(songs)]
+        ),
+        "download_song": download,
+    }
+    results = []
+    for name, user_call in scenarios.items():
+        for users in users_counts:
+            scraper.cache.clear()
+            if name == "download_song":
+                # link extraction is measured on its own, only downloads are measured here.
+                for song in songs:
+                    await scraper.music_link_extractor(song)
+                for user in range(users):
+                    save_dir = os.path.join(_WORK_DIR, f"user_{user}")
+                    shutil.rmtree(save_dir, ignore_errors=True)
+                    # its store, with the deleted index open, is created again.
+                    scraper.audio_stores.pop(save_dir, None)
+            server.requests.clear()
+            sent_bytes = server.sent_bytes
+            result = await _run_users(users, user_call)
+            result.update(
+                scenario=name,
+                upstream_requests=dict(server.requests),
+                upstream_bytes=server.sent_bytes - sent_bytes,
+            )
+            result["upstream_mb_per_s"] = result["upstream_bytes"] / 1e6 / result["wall_time_s"]
+            results.append(result)
+    return results
+
+
+async def main(args) -> list:
+    server = FakeMusicFaServer(
+        fixtures_dir=args.fixtures,
+        latency=args.latency,
+        bandwidth=args.bandwidth,
+        mp3_size=args.mp3_size,
+    )
+    async with server:
+        try:
+            return await benchmark(server, args.users)
+        finally:
+            await close_session()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--fixtures", default=FIXTURES_DIR)
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per response")
+    parser.add_argument("--bandwidth", type=int, default=None, help="bytes per second per mp3")
+    parser.add_argument("--mp3-size", type=int, default=2 * 1024 * 1024)
+    parser.add_argument("--output", help="json file to write the results to")
+    args = parser.parse_args()
+    try:
+        results = asyncio.run(main(args))
+    finally:
+        shutil.rmtree(_WORK_DIR, ignore_errors=True)
+    for result in results:
+        print(
+            f"{result['scenario']:<28} users: {result['users']:<4} "
+            f"p50: {result['latency_p50_ms']:9.1f} ms  p95: {result['latency_p95_ms']:9.1f} ms",
+            file=sys.stderr,
+        )
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    else:
+        print(json.dumps(results))
@@ -0,0 +1,160 @@
+"""
+Cold start: the import time of music_bot.settings and music_bot.bot, each in a fresh interpreter,
+and the time to first response of a freshly spawned worker process with an empty scrape cache,
+from spawning it to a chat getting the artists list, once scraping and once from a catalog
+snapshot. Telegram is the local fake Bot API, music-fa.com the local fake server.
+
+    python -m music_bot.benchmarks.bench_startup [--imports 7] [--site-latency 0.2]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+from music_bot.benchmarks.fixtures import STATE_PATHS, isolate_state
+
+_WORK_DIR = isolate_state()
+
+import music_bot.settings as settings  # noqa: E402
+from music_bot.benchmarks.bench_workers import (  # noqa: E402
+    ARTISTS_LIST_TEXT,
+    finished_chats,
+    page_update,
+    start_update,
+    wait_for_port,
+)
+from music_bot.benchmarks.fake_bot_api import FakeBotApi  # noqa: E402
+from music_bot.benchmarks.fake_server import FakeMusicFaServer  # noqa: E402
+from music_bot.scrap import scraper  # noqa: E402
+from music_bot.scrap.snapshot import save_snapshot  # noqa: E402
+from music_bot.utils.aioutils import close_session, get_session  # noqa: E402
+
+CHAT_ID = 1000
+IMPORT_CODE = (
+    "import time; start = time.perf_counter(); import {module}; "
+    "print(time.perf_counter() - start)"
+)
+
+
+def import_time(module: str, runs: int) -> dict:
+    """
+    Median seconds to import module, and the files importing it created.
+    """
+    import_dir = os.path.join(_WORK_DIR, "import")
+    env = dict(os.environ)
+    # run from import_dir, to catch files created relative to it.
+    env["PYTHONPATH"] = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+    for setting, name in STATE_PATHS.items():
+        env[setting] = os.path.join(import_dir, name)
+    times, created_files = [], set()
+    for _ in range(runs):
+        os.makedirs(import_dir, exist_ok=True)
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_CODE.format(module=module)],
+            env=env, cwd=import_dir, capture_output=True, text=True, check=True,
+        )
+        times.append(float(output.stdout))
+        created_files.update(os.listdir(import_dir))
+        shutil.rmtree(import_dir)
+    return {"module": module, "median_ms": statistics.median(times) * 1000, "files": sorted(created_files)}
+
+
+async def first_response(api: FakeBotApi, name: str, snapshot: str = "") -> dict:
+    """
+    Spawns a worker with an empty scrape cache and times a chat's /start and artists list.
+    """
+    port = random.randint(20000, 40000)
+    run_dir = os.path.join(_WORK_DIR, name.replace(" ", "_"))
+    os.makedirs(run_dir)
+    env = dict(os.environ)
+    env["SCRAPE_CACHE_DB"] = os.path.join(run_dir, "scrape_cache.sqlite3")
+    env["PERSISTENCE_DB"] = os.path.join(run_dir, "persistence.sqlite3")
+    env["LOG_FILE"] = os.path.join(run_dir, "music_bot.log")
+    env["CATALOG_SNAPSHOT"] = snapshot or os.path.join(run_dir, "no_snapshot.json.gz")
+    api.log.clear()
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "music_bot.bot", "--worker", "0", "--worker-port", str(port)],
+        env=env,
+    )
+    try:
+        await wait_for_port(port, interval=0.01)
+        listening = time.perf_counter()
+        session = get_session()
+        for update in (start_update(CHAT_ID), page_update(CHAT_ID)):
+            async with session.post(f"http://127.0.0.1:{port}/update", json=update) as response:
+                response.raise_for_status()
+        while not finished_chats(api):
+            if time.perf_counter() - start > 120:
+                raise RuntimeError(f"No {ARTISTS_LIST_TEXT!r} was sent in 120s.")
+            await asyncio.sleep(0.01)
+        answered = time.perf_counter()
+    finally:
+        process.terminate()
+        await asyncio.to_thread(process.wait, 30)
+    return {
+        "run": name,
+        "listening_s": listening - start,
+        "first_response_s": answered - start,
+    }
+
+
+async def main(args) -> dict:
+    results = {"imports": [import_time(module, args.imports) for module in args.modules]}
+    async with FakeMusicFaServer(latency=args.site_latency) as server, FakeBotApi(
+        latency=args.api_latency
+    ) as api:
+        os.environ["BASE_URL"] = settings.BASE_URL = server.url
+        os.environ["TELEGRAM_BASE_URL"] = api.base_url
+        try:
+            results["first_response"] = [await first_response(api, "scraping")]
+            # what the crawler leaves behind, the artists and some of their songs.
+            artists = await scraper.get_all_artists()
+            await asyncio.gather(
+                *[scraper.all_artist_songs_paginated(artist) for artist in artists[:5]]
+            )
+            snapshot = os.path.join(_WORK_DIR, "catalog_snapshot.json.gz")
+            await save_snapshot(snapshot)
+            results["snapshot_bytes"] = os.path.getsize(snapshot)
+            results["first_response"].append(await first_response(api, "snapshot", snapshot))
+        finally:
+            await close_session()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--imports", type=int, default=7, help="runs of every import")
+    parser.add_argument("--modules", nargs="+", default=["music_bot.settings", "music_bot.bot"])
+    parser.add_argument("--site-latency", type=float, default=0.2, help="seconds per page")
+    parser.add_argument("--api-latency", type=float, default=0.02, help="seconds per Bot API call")
+    parser.add_argument("--output", help="json file to write the results to")
+    args = parser.parse_args()
+    try:
+        results = asyncio.run(main(args))
+    finally:
+        shutil.rmtree(_WORK_DIR, ignore_errors=True)
+    for result in results["imports"]:
+        print(
+            f"import {result['module']}: {result['median_ms']:.0f}ms, "
+            f"files created: {', '.join(result['files']) or 'none'}",
+            file=sys.stderr,
+        )
+    for result in results["first_response"]:
+        print(
+            f"first response, {result['run']}: listening after {result['listening_s']:.2f}s, "
+            f"artists list after {result['first_response_s']:.2f}s",
+            file=sys.stderr,
+        )
+    print(f"snapshot: {results['snapshot_bytes']} bytes", file=sys.stderr)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    else:
+        print(json.dumps(results))
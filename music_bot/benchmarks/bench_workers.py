@@ -0,0 +1,171 @@
+"""
+Load test of the multi-worker webhook mode: the front process and 1, 2 and 4 workers handle a
+burst of chats, each sending /start and then opening the artists list. Telegram is the local fake
+Bot API, music-fa.com the local fake server, and the scrape cache every worker shares is warmed
+beforehand. Reports the updates handled per second, and checks every chat got its list, i.e. the
+callback landed on the worker which holds its conversation.
+
+    python -m music_bot.benchmarks.bench_workers [--chats 200] [--workers 1 2 4] [--api-latency 0.02]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import shutil
+import sys
+import time
+
+from music_bot.benchmarks.fixtures import isolate_state
+
+_WORK_DIR = isolate_state()
+os.environ["STATE_BACKEND"] = "sqlite"
+
+import music_bot.settings as settings  # noqa: E402
+from music_bot.benchmarks.fake_bot_api import FakeBotApi  # noqa: E402
+from music_bot.benchmarks.fake_server import FakeMusicFaServer  # noqa: E402
+from music_bot.front import run_front  # noqa: E402
+from music_bot.scrap import scraper  # noqa: E402
+from music_bot.utils.aioutils import close_session, get_session  # noqa: E402
+
+# the text of the artists list, once a chat got it the chat is done.
+ARTISTS_LIST_TEXT = "یک خواننده را انتخاب کنید"
+update_ids = itertools.count(1)
+
+
+def start_update(chat_id: int) -> dict:
+    user = {"id": chat_id, "is_bot": False, "first_name": f"user {chat_id}"}
+    return {
+        "update_id": next(update_ids),
+        "message": {
+            "message_id": 1,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": user,
+            "text": "/start",
+            "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+        },
+    }
+
+
+def page_update(chat_id: int) -> dict:
+    user = {"id": chat_id, "is_bot": False, "first_name": f"user {chat_id}"}
+    return {
+        "update_id": next(update_ids),
+        "callback_query": {
+            "id": str(next(update_ids)),
+            "from": user,
+            "chat_instance": str(chat_id),
+            "data": "page_1",
+            "message": {
+                "message_id": 2,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": {"id": 1, "is_bot": True, "first_name": "Musicfa"},
+                "text": "start",
+            },
+        },
+    }
+
+
+def finished_chats(api: FakeBotApi) -> int:
+    return sum(
+        method == "editMessageText" and parameters.get("text") == ARTISTS_LIST_TEXT
+        for method, parameters in api.log
+    )
+
+
+async def wait_for_port(port: int, timeout: float = 120, interval: float = 0.2) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(interval)
+        else:
+            writer.close()
+            return
+
+
+async def run(workers: int, api: FakeBotApi, chats: int, timeout: float) -> dict:
+    # a fresh persistence, no chat is in a conversation yet.
+    os.environ["PERSISTENCE_DB"] = os.path.join(_WORK_DIR, f"persistence-{workers}.sqlite3")
+    front_port = random.randint(20000, 40000)
+    base_port = front_port + 1
+    stopped = asyncio.Event()
+    front = asyncio.create_task(run_front(front_port, workers, base_port, stopped=stopped))
+    try:
+        await wait_for_port(front_port)
+        # the workers are only waited for before the front listens.
+        url = f"http://127.0.0.1:{front_port}/{settings.TELEGRAM_BOT_TOKEN}"
+        api.log.clear()
+        session = get_session()
+
+        async def chat(chat_id: int) -> None:
+            for update in (start_update(chat_id), page_update(chat_id)):
+                async with session.post(url, json=update) as response:
+                    response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*[chat(chat_id) for chat_id in range(1000, 1000 + chats)])
+        while finished_chats(api) < chats and time.perf_counter() - start < timeout:
+            await asyncio.sleep(0.02)
+        elapsed = time.perf_counter() - start
+    finally:
+        stopped.set()
+        await front
+    finished = finished_chats(api)
+    return {
+        "workers": workers,
+        "chats": chats,
+        "updates": chats * 2,
+        "finished_chats": finished,
+        "elapsed_s": elapsed,
+        "updates_per_s": chats * 2 / elapsed,
+        "bot_api_calls": len(api.log),
+    }
+
+
+async def main(args) -> list:
+    async with FakeMusicFaServer() as server, FakeBotApi(latency=args.api_latency) as api:
+        os.environ["BASE_URL"] = settings.BASE_URL = server.url
+        os.environ["TELEGRAM_BASE_URL"] = api.base_url
+        try:
+            # written to the scrape cache the workers share.
+            await scraper.get_all_artists()
+            results = []
+            for workers in args.workers:
+                results.append(await run(workers, api, args.chats, args.timeout))
+            return results
+        finally:
+            await close_session()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--api-latency", type=float, default=0.02, help="seconds per Bot API call")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--output", help="json file to write the results to")
+    args = parser.parse_args()
+    try:
+        results = asyncio.run(main(args))
+    finally:
+        shutil.rmtree(_WORK_DIR, ignore_errors=True)
+    for result in results:
+        print(
+            f"{result['workers']} workers: {result['updates_per_s']:7.1f} updates/s  "
+            f"{result['finished_chats']}/{result['chats']} chats got their list in "
+            f"{result['elapsed_s']:.2f}s",
+            file=sys.stderr,
+        )
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    else:
+        print(json.dumps(results))
+    sys.exit(0 if all(result["finished_chats"] == result["chats"] for result in results) else 1)
@@ -0,0 +1,126 @@
+"""
+Local stand-in for the telegram Bot API, answering the methods the bot calls with plausible
+results after a configurable latency, and recording every call. The bot uses it when
+TELEGRAM_BASE_URL is set to its base_url.
+
+    python -m music_bot.benchmarks.fake_bot_api [--port 8081] [--latency 0.02]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter
+from typing import Callable, List, Optional, Tuple
+
+from aiohttp import web
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Musicfa", "username": "musicfa_bot"}
+# methods whose result is just True.
+TRUE_METHODS = {
+    "answerCallbackQuery",
+    "answerInlineQuery",
+    "deleteMessage",
+    "deleteWebhook",
+    "setWebhook",
+    "setMyCommands",
+}
+
+
+class FakeBotApi:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0):
+        """
+        latency is added before every response in seconds, port 0 picks a free port.
+        """
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.calls = Counter()
+        # (method, parameters) of every call, in the order they were received.
+        self.log: List[Tuple[str, dict]] = []
+        # called with the method and parameters of every call as it's received.
+        self.on_call: Optional[Callable[[str, dict], None]] = None
+        self._message_ids = itertools.count(1)
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def base_url(self) -> str:
+        # what TELEGRAM_BASE_URL is set to, the bot appends its token.
+        return f"http://{self.host}:{self.port}/bot"
+
+    def _message(self, parameters: dict) -> dict:
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": int(parameters.get("chat_id", 0)), "type": "private"},
+        }
+        if "text" in parameters:
+            message["text"] = parameters["text"]
+        return message
+
+    def _result(self, method: str, parameters: dict):
+        if method == "getMe":
+            return BOT_USER
+        if method in TRUE_METHODS:
+            return True
+        if method == "editMessageText" and "inline_message_id" in parameters:
+            return True
+        if method == "sendMediaGroup":
+            return [self._audio_message(parameters) for _ in json.loads(parameters["media"])]
+        if method == "sendAudio":
+            return self._audio_message(parameters)
+        return self._message(parameters)
+
+    def _audio_message(self, parameters: dict) -> dict:
+        message = self._message(parameters)
+        file_id = f"audio-{message['message_id']}"
+        message["audio"] = {"file_id": file_id, "file_unique_id": file_id, "duration": 180}
+        return message
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        parameters = dict(await request.post())
+        self.calls[method] += 1
+        self.log.append((method, parameters))
+        if self.on_call:
+            self.on_call(method, parameters)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return web.json_response({"ok": True, "result": self._result(method, parameters)})
+
+    def application(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_route("*", "/bot{token}/{method}", self.handle)
+        return app
+
+    async def start(self) -> None:
+        self._runner = web.AppRunner(self.application(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        # the actual port, when a free one was picked.
+        self.port = self._runner.addresses[0][1]
+
+    async def stop(self) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def __aenter__(self) -> "FakeBotApi":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+
+async def serve_forever(**kwargs) -> None:
+    async with FakeBotApi(**kwargs) as api:
+        print(f"Serving a fake Bot API on {api.base_url}")
+        await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per response")
+    args = parser.parse_args()
+    asyncio.run(serve_forever(port=args.port, latency=args.latency))
@@ -0,0 +1,196 @@
+"""
+Local stand-in for music-fa.com, serving the html fixtures and synthetic mp3 files with
+configurable latency and bandwidth.
+
+    python -m music_bot.benchmarks.fake_server [--port 8080] [--latency 0.05] [--bandwidth 1000000]
+"""
+import argparse
+import asyncio
+import re
+from collections import Counter
+from typing import Optional
+
+from aiohttp import web
+
+from music_bot.benchmarks.fixtures import FIXTURES_DIR, SITE_URL, load_fixtures
+
+AUDIO_HOST_URL = re.compile(r"https://ups\.music-fa\.com/tagdl/[^/]+/")
+MP3_FRAME_HEADER = b"\xff\xfb\x90\x64"
+
+
+class FakeMusicFaServer:
+    def __init__(
+        self,
+        fixtures_dir: str = FIXTURES_DIR,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        bandwidth: Optional[int] = None,
+        mp3_size: int = 5 * 1024 * 1024,
+        chunk_size: int = 64 * 1024,
+        accept_ranges: bool = True,
+        disconnect_after: Optional[int] = None,
+        disconnects: Optional[int] = None,
+    ):
+        """
+        latency is added before every response in seconds, bandwidth limits every mp3
+        response in bytes per second, port 0 picks a free port.
+        disconnect_after injects faults: the connection of an mp3 response is dropped after
+        sending that many bytes, for the first disconnects responses (or all of them when None).
+        """
+        self.fixtures = load_fixtures(fixtures_dir)
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.mp3_size = mp3_size
+        self.chunk_size = chunk_size
+        self.accept_ranges = accept_ranges
+        self.disconnect_after = disconnect_after
+        self.disconnects = disconnects
+        self.injected_disconnects = 0
+        # html responses are 503s while set, to simulate an outage of the site.
+        self.fail_html = False
+        self.requests = Counter()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.sent_bytes = 0
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def _html(self, fixture_name: str) -> str:
+        return self.fixtures[fixture_name].replace(SITE_URL, self.url)
+
+    async def _respond_html(self, kind: str, html: str) -> web.Response:
+        self.requests[kind] += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight -= 1
+        if self.fail_html:
+            return web.Response(status=503, text="Service Unavailable")
+        self.sent_bytes += len(html.encode())
+        return web.Response(text=html, content_type="text/html")
+
+    async def home(self, request: web.Request) -> web.Response:
+        return await self._respond_html("home", self._html("home.html"))
+
+    async def artist(self, request: web.Request) -> web.Response:
+        page = int(request.match_info.get("page", 1))
+        fixture_name = "artist.html" if page == 1 else "artist_page_2.html"
+        return await self._respond_html("artist", self._html(fixture_name))
+
+    async def song(self, request: web.Request) -> web.Response:
+        song_id = request.match_info["song_id"]
+        html = AUDIO_HOST_URL.sub(f"{self.url}/tagdl/{song_id}/", self._html("song.html"))
+        # every song gets its own file names, like on the site.
+        html = html.replace("%20-%20", f"%20-%20{song_id}%20")
+        return await self._respond_html("song", html)
+
+    async def mp3(self, request: web.Request) -> web.StreamResponse:
+        self.requests["mp3"] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        start = 0
+        range_header = request.headers.get("Range", "")
+        if self.accept_ranges and range_header.startswith("bytes="):
+            start = int(range_header[len("bytes=") :].split("-")[0])
+        if start >= self.mp3_size:
+            return web.Response(
+                status=416, headers={"Content-Range": f"bytes */{self.mp3_size}"}
+            )
+        headers = {
+            "Content-Type": "audio/mpeg",
+            "Content-Length": str(self.mp3_size - start),
+        }
+        if self.accept_ranges:
+            headers["Accept-Ranges"] = "bytes"
+        if start:
+            headers["Content-Range"] = f"bytes {start}-{self.mp3_size - 1}/{self.mp3_size}"
+        response = web.StreamResponse(status=206 if start else 200, headers=headers)
+        await response.prepare(request)
+        disconnect_at = None
+        if self.disconnect_after is not None and (
+            self.disconnects is None or self.injected_disconnects < self.disconnects
+        ):
+            self.injected_disconnects += 1
+            disconnect_at = self.disconnect_after
+        payload = MP3_FRAME_HEADER * (self.chunk_size // len(MP3_FRAME_HEADER) + 1)
+        position, sent = start, 0
+        while position < self.mp3_size:
+            offset = position % len(MP3_FRAME_HEADER)
+            data = payload[offset : offset + min(self.chunk_size, self.mp3_size - position)]
+            if disconnect_at is not None and sent + len(data) >= disconnect_at:
+                await response.write(data[: disconnect_at - sent])
+                self.sent_bytes += disconnect_at - sent
+                # drops the connection mid body, the client sees a truncated payload.
+                request.transport.close()
+                return response
+            await response.write(data)
+            position += len(data)
+            sent += len(data)
+            self.sent_bytes += len(data)
+            if self.bandwidth:
+                await asyncio.sleep(len(data) / self.bandwidth)
+        await response.write_eof()
+        return response
+
+    def application(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/", self.home)
+        app.router.add_get("/artist/{slug}", self.artist)
+        app.router.add_get("/artist/{slug}/page/{page:\\d+}", self.artist)
+        app.router.add_get("/artist/{slug}/page/{page:\\d+}/", self.artist)
+        app.router.add_get("/download-song/{song_id}/", self.song)
+        app.router.add_get("/tagdl/{song_id}/{file_name}", self.mp3)
+        return app
+
+    async def start(self) -> None:
+        self._runner = web.AppRunner(self.application())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # the actual port, when a free one was picked.
+        self.port = self._runner.addresses[0][1]
+
+    async def stop(self) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def __aenter__(self) -> "FakeMusicFaServer":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+
+async def serve_forever(**kwargs) -> None:
+    async with FakeMusicFaServer(**kwargs) as server:
+        print(f"Serving fake music-fa.com on {server.url}")
+        await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--fixtures", default=FIXTURES_DIR)
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--bandwidth", type=int, default=None)
+    parser.add_argument("--mp3-size", type=int, default=5 * 1024 * 1024)
+    args = parser.parse_args()
+    asyncio.run(
+        serve_forever(
+            fixtures_dir=args.fixtures,
+            port=args.port,
+            latency=args.latency,
+            bandwidth=args.bandwidth,
+            mp3_size=args.mp3_size,
+        )
+    )
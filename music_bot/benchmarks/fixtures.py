@@ -0,0 +1,181 @@
+"""
+HTML fixtures of music-fa.com pages for the benchmarks.
+
+    python -m music_bot.benchmarks.fixtures --record     saves the live pages
+    python -m music_bot.benchmarks.fixtures              generates synthetic pages
+
+Synthetic pages mimic the site's markup around the parts the scraper reads, with enough
+surrounding markup to make parsing costs realistic.
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+from typing import Dict, Optional
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+# fixture name -> path of the page on the site
+FIXTURE_PAGES = {
+    "home.html": "/",
+    "artist.html": "/artist/homayoun-shajarian",
+    "artist_page_2.html": "/artist/homayoun-shajarian/page/2",
+    "song.html": "/download-song/66342/",
+}
+SITE_URL = "https://music-fa.com"
+# settings of the files and directories the bot keeps its state in -> their name in a work dir.
+STATE_PATHS = {
+    "SAVE_DIR": "downloaded_audios",
+    "FILE_ID_DB": "file_ids.sqlite3",
+    "SCRAPE_CACHE_DB": "scrape_cache.sqlite3",
+    "PERSISTENCE_DB": "persistence.sqlite3",
+    "CATALOG_SNAPSHOT": "catalog_snapshot.json.gz",
+    "PROFILE_DIR": "profiles",
+    "LOG_FILE": "music_bot.log",
+}
+_work_dir: Optional[str] = None
+
+_NOISE_BLOCK = (
+    '<div class="widget"><h3 class="title">{title}</h3><ul class="list">{items}</ul>'
+    '<script>window.dataLayer = window.dataLayer || []; dataLayer.push({{"n": {n}}});</script></div>'
+)
+
+
+def _noise(n: int) -> str:
+    blocks = []
+    for i in range(n):
+        items = "".join(
+            f'<li class="item"><a href="{SITE_URL}/tag/{i}-{j}/" rel="tag">برچسب {i} {j}</a>'
+            f'<span class="count">{j}</span></li>'
+            for j in range(15)
+        )
+        blocks.append(_NOISE_BLOCK.format(title=f"بخش {i}", items=items, n=i))
+    return "".join(blocks)
+
+
+def _page(body: str) -> str:
+    return (
+        '<!DOCTYPE html><html dir="rtl" lang="fa-IR"><head><meta charset="UTF-8">'
+        "<title>موزیکفا</title>"
+        + "".join(f'<link rel="stylesheet" href="{SITE_URL}/css/{i}.css">' for i in range(10))
+        + '</head><body><header class="hdr">'
+        + _noise(3)
+        + f'</header><main class="cnt">{body}</main><footer class="ftr">'
+        + _noise(4)
+        + "</footer></body></html>"
+    )
+
+
+def _artist_page(page: int, last_page: int, songs_per_page: int) -> str:
+    articles = []
+    for i in range(songs_per_page):
+        song_id = 70000 - page * songs_per_page - i
+        articles.append(
+            f'<article class="postbox"><div class="pic"><a href="{SITE_URL}/download-song/{song_id}/" '
+            f'title="دانلود آهنگ همایون شجریان آهنگ {song_id}"><img src="{SITE_URL}/img/{song_id}.jpg" '
+            f'alt="آهنگ {song_id}"></a></div><div class="txt"><h2><a href="{SITE_URL}/download-song/{song_id}/">'
+            f"آهنگ {song_id}</a></h2><p>متن آهنگ {song_id} " + "لورم ایپسوم " * 30 + "</p></div></article>"
+        )
+    page_indexes = "".join(
+        f'<a href="{SITE_URL}/artist/homayoun-shajarian/page/{i}/">{i}</a>'
+        for i in range(1, last_page + 1)
+    )
+    return _page(
+        "".join(articles)
+        + f'<div class="pnavifa fxmf">{page_indexes}</div>'
+        + '<aside class="sidebar">'
+        + _noise(5)
+        + "</aside>"
+    )
+
+
+def generate_fixtures(
+    directory: str = FIXTURES_DIR,
+    artists: int = 400,
+    songs_per_page: int = 12,
+    last_page: int = 25,
+) -> None:
+    random.seed(0)
+    os.makedirs(directory, exist_ok=True)
+    artist_items = "".join(
+        f'<li class="cat-item"><a href="{SITE_URL}/artist/artist-{i}">خواننده شماره {i}</a></li>'
+        for i in range(artists)
+    )
+    pages = {
+        "home.html": _page(
+            _artist_page(1, last_page, songs_per_page)
+            + f'<aside class="rwr"><ul>{artist_items}</ul></aside>'
+        ),
+        "artist.html": _artist_page(1, last_page, songs_per_page),
+        "artist_page_2.html": _artist_page(2, last_page, songs_per_page),
+        "song.html": _page(
+            '<div class="cntfa">'
+            + "".join(
+                f'<a href="https://ups.music-fa.com/tagdl/6e41/Homayoun%20Shajarian%20-%20Song{i}%20({quality}).mp3">'
+                f"دانلود آهنگ با کیفیت {quality}</a>"
+                for i in range(2)
+                for quality in ("320", "128")
+            )
+            + f'<a href="{SITE_URL}/artist/homayoun-shajarian">همایون شجریان</a></div>'
+        ),
+    }
+    for name, html in pages.items():
+        with open(os.path.join(directory, name), "w", encoding="utf-8") as file:
+            file.write(html)
+
+
+async def record_fixtures(directory: str = FIXTURES_DIR) -> None:
+    from music_bot.utils.aioutils import fetch, close_session
+
+    os.makedirs(directory, exist_ok=True)
+    try:
+        for name, path in FIXTURE_PAGES.items():
+            html = await fetch(SITE_URL + path)
+            with open(os.path.join(directory, name), "w", encoding="utf-8") as file:
+                file.write(html)
+    finally:
+        await close_session()
+
+
+def isolate_state() -> str:
+    """
+    Points every state path of the bot to a new temporary directory, which is returned, so a
+    benchmark neither reads nor leaves behind the files of a real deployment. Called before
+    music_bot.settings is imported, a benchmark importing another one gets the same directory.
+    """
+    global _work_dir
+    if _work_dir:
+        return _work_dir
+    _work_dir = tempfile.mkdtemp(prefix="music_bot_bench_")
+    for setting, name in STATE_PATHS.items():
+        os.environ[setting] = os.path.join(_work_dir, name)
+    # the fake Bot API takes any token, a real one is never sent to it.
+    os.environ["TELEGRAM_BOT_TOKEN"] = "benchmark"
+    os.environ["LOG_LEVEL"] = "WARNING"
+    # no metrics server, the port may be held by a running bot.
+    os.environ["METRICS_PORT"] = "0"
+    return _work_dir
+
+
+def load_fixtures(directory: str = FIXTURES_DIR) -> Dict[str, str]:
+    """
+    Returns fixture name -> html, generating synthetic fixtures for the missing ones.
+    """
+    if not all(os.path.isfile(os.path.join(directory, name)) for name in FIXTURE_PAGES):
+        generate_fixtures(directory)
+    fixtures = dict()
+    for name in FIXTURE_PAGES:
+        with open(os.path.join(directory, name), encoding="utf-8") as file:
+            fixtures[name] = file.read()
+    return fixtures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--record", action="store_true", help="save the live pages")
+    parser.add_argument("--directory", default=FIXTURES_DIR)
+    args = parser.parse_args()
+    if args.record:
+        asyncio.run(record_fixtures(args.directory))
+    else:
+        generate_fixtures(args.directory)
@@ -1,8 +1,21 @@
-from typing import List
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import argparse
+import asyncio
 import os
+import signal
+import time
 
-import requests
-from telegram import Update, Message, InlineKeyboardButton, InlineKeyboardMarkup
+from aiohttp import ClientError
+from telegram import (
+    Update,
+    Message,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    InlineQuery,
+    InlineQueryResultsButton,
+    InputMediaAudio,
+)
+from telegram.error import BadRequest, TelegramError
 from telegram.ext import (
     Application,
     ContextTypes,
@@ -11,26 +24,138 @@ from telegram.ext import (
     filters,
     ConversationHandler,
     CallbackQueryHandler,
+    InlineQueryHandler,
 )
 
 from music_bot.scrap.models import Artist, Song
-from music_bot.utils.utils import paginate_list, create_keyboard_page
-from music_bot.settings import TELEGRAM_BOT_TOKEN, SAVE_DIR
+from music_bot.utils.utils import (
+    create_keyboard_page,
+    StatusMessageUpdater,
+)
+from music_bot.settings import (
+    TELEGRAM_BOT_TOKEN,
+    SAVE_DIR,
+    FILE_ID_DB,
+    CRAWLER_INTERVAL,
+    CRAWLER_FIRST_DELAY,
+    DOWNLOAD_WORKERS,
+    DOWNLOADS_PER_USER,
+    MAX_QUEUED_DOWNLOADS_PER_USER,
+    STATUS_UPDATE_INTERVAL,
+    AUDIO_SEND_MODE,
+    BULK_MAX_SONGS,
+    INLINE_CACHE_TTL,
+    INLINE_CONCURRENT_ANSWERS,
+    PERSISTENCE_DB,
+    PERSISTENCE_UPDATE_INTERVAL,
+    METRICS_HOST,
+    METRICS_PORT,
+    TELEGRAM_BASE_URL,
+    WEBHOOK_URL,
+    WEBHOOK_WORKERS,
+    WORKER_BASE_PORT,
+)
 from music_bot.scrap.scraper import (
     download_song,
+    download_songs,
+    song_audio_links,
     get_all_artists,
     get_artist,
+    artists_page,
+    artist_id,
+    get_artist_by_id,
+    get_song_by_id,
+    warm_indexes,
+    search_artists,
+    search_songs,
+    artist_songs_page,
+    artist_page_count,
+    get_artist_page_songs,
     all_artist_songs_paginated,
-    cache,
+    is_artist_page_cached,
+    prefetch,
+    close_audio_stores,
+    close_scrape_cache,
 )
-from music_bot.logger import logger
+from music_bot.scrap.crawler import crawl
+from music_bot.scrap.exceptions import CircuitOpenError, SiteError
+from music_bot.scrap.snapshot import restore_snapshot
+from music_bot.utils.aioutils import start_session, close_session, iterate_queue
+from music_bot.file_id_cache import FileIdCache
+from music_bot.backends import WriteBehindBackend, open_backend
+from music_bot.inline import inline_results
+from music_bot.persistence import BackendPersistence
+from music_bot.download_scheduler import DownloadScheduler, QueueFullError
+from music_bot.metrics import (
+    Gauge,
+    instrument_handler,
+    start_metrics_server,
+    stop_metrics_server,
+    time_to_first_audio,
+    upload_duration,
+)
+from music_bot.logger import bind_log_context, logger
 
 PORT = os.environ.get('PORT')
 if PORT:
     port = int(PORT)
-ARTIST, SONG, ARTIST_SELECTION = range(3)
+ARTIST, SONG, ARTIST_SELECTION, SONG_SEARCH = range(4)
+# audios telegram takes in a single media group.
+MEDIA_GROUP_SIZE = 10
+LIST_EXPIRED_TEXT = "این لیست منقضی شده است، لطفا با /start دوباره شروع کنید."
+SITE_UNAVAILABLE_TEXT = "سایت در حال حاضر در دسترس نیست، لطفا بعدا دوباره سعی کنید."
+# errors of a request to the site, CircuitOpenError included.
+SCRAPE_ERRORS = (ClientError, asyncio.TimeoutError, SiteError)
+file_id_cache = FileIdCache(WriteBehindBackend(open_backend(FILE_ID_DB)))
+download_scheduler = DownloadScheduler(
+    workers=DOWNLOAD_WORKERS,
+    per_user_limit=DOWNLOADS_PER_USER,
+    max_queued_per_user=MAX_QUEUED_DOWNLOADS_PER_USER,
+)
+# (chat id, user id) of the conversations which haven't ended, the keys ConversationHandler uses.
+active_conversations = set()
+metrics_runner = None
+# user id -> id of the user's latest inline query.
+latest_inline_queries: Dict[int, str] = dict()
+# answers sent at a time, the HTTP client's cost per request grows with the requests in flight.
+inline_answer_semaphore = asyncio.Semaphore(INLINE_CONCURRENT_ANSWERS)
+Gauge(
+    "musicbot_download_jobs",
+    "Downloads of the scheduler by state.",
+    ["state"],
+    function=lambda: {
+        ("queued",): download_scheduler.queued,
+        ("running",): download_scheduler.running,
+    },
+)
+Gauge(
+    "musicbot_active_conversations",
+    "Users in a conversation with the bot.",
+    function=lambda: len(active_conversations),
+)
+
+
+# callback data is a compact id, resolved through the scraper's indexes.
+def artist_buttons(artists: List[Artist]) -> Tuple[Tuple[str, str], ...]:
+    return tuple((artist.name, f"artist_{artist_id(artist)}") for artist in artists)
 
 
+def song_buttons(songs: List[Song]) -> Tuple[Tuple[str, str], ...]:
+    return tuple((song.name, f"song_{song.id}") for song in songs)
+
+
+def retry_markup(callback_data: str) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(
+        [
+            [
+                InlineKeyboardButton(text="تلاش دوباره", callback_data=callback_data),
+                InlineKeyboardButton(text="خروج", callback_data="exit"),
+            ]
+        ]
+    )
+
+
+@instrument_handler
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.message.from_user
     logger.info(f"User {user.full_name} started the bot")
@@ -41,31 +166,50 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 text="لیست آهنگ های خواننده",
                 callback_data="artist_songs",
             ),
-        ]
+        ],
+        [InlineKeyboardButton(text="جستجوی آهنگ", callback_data="search_songs")],
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     text = "به بات موزیکفا خوش آمدید!\n برای خروج از بات از /exit استفاده بکنید و یا دکمه خروج را فشار دهید \n یک گزینه را انتخاب کنید"
     message = await update.message.reply_text(text, reply_markup=reply_markup)
-    context.user_data["start_message"] = message
+    # the id rather than the Message, user_data is persisted.
+    context.user_data["start_message_id"] = message.message_id
+    active_conversations.add((update.effective_chat.id, user.id))
     return ARTIST
 
 
+async def edit_start_message(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, text: str, reply_markup=None
+) -> None:
+    await context.bot.edit_message_text(
+        text,
+        chat_id=update.effective_chat.id,
+        message_id=context.user_data.get("start_message_id"),
+        reply_markup=reply_markup,
+    )
+
+
+@instrument_handler
 async def list_artists(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
-    all_artists_cache = cache.get(())
-    if not all_artists_cache:
+    if not get_all_artists.is_cached():
         await query.edit_message_text("در حال دریافت لیست خوانندگان ...")
-    artists = await get_all_artists()
-    paginated_artists = paginate_list(artists)
     requested_page = int(query.data.split("_")[-1])
-    reply_markup = create_keyboard_page(paginated_artists, requested_page)
+    try:
+        artists, page_count = await artists_page(requested_page)
+    except SCRAPE_ERRORS:
+        logger.error(f"Couldn't get page {requested_page} of the artists.")
+        await query.edit_message_text(SITE_UNAVAILABLE_TEXT, reply_markup=retry_markup(query.data))
+        return ARTIST
+    reply_markup = create_keyboard_page(artist_buttons(artists), requested_page, page_count)
     await query.edit_message_text(
         text="یک خواننده را انتخاب کنید", reply_markup=reply_markup
     )
     return ARTIST
 
 
+@instrument_handler
 async def input_artist(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -78,39 +222,96 @@ async def input_artist(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return ARTIST_SELECTION
 
 
+@instrument_handler
 async def set_artist_by_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
-    artist: Artist = query.data
+    artist = get_artist_by_id(query.data.split("_")[-1])
+    if not artist:
+        await query.edit_message_text(LIST_EXPIRED_TEXT)
+        active_conversations.discard((update.effective_chat.id, update.effective_user.id))
+        return ConversationHandler.END
     context.user_data.update({"requested_artist": artist})
     logger.info(
-        {
-            f"User {query.from_user.full_name} chose {context.user_data.get('requested_artist')} via callback."
-        }
+        f"User {query.from_user.full_name} chose {context.user_data.get('requested_artist')} via callback."
     )
     update.callback_query = None  # the reason for this is to not trigger this function's callback query when calling it: list_artist_songs.
     await list_artist_songs(update, context)
     return SONG
 
 
+@instrument_handler
 async def set_artist_by_msg(update: Update, context: ContextTypes.DEFAULT_TYPE):
     inputed_artist_name = update.message.text
-    artist = await get_artist(inputed_artist_name)
+    try:
+        artist = await get_artist(inputed_artist_name)
+        candidates = None if artist else await search_artists(inputed_artist_name, limit=6)
+    except SCRAPE_ERRORS:
+        logger.error(f"Couldn't look up the artist {inputed_artist_name}.")
+        # the user can send the name again.
+        await update.message.reply_text(SITE_UNAVAILABLE_TEXT)
+        return ARTIST_SELECTION
     if not artist:
+        if not candidates:
+            await update.message.reply_text(
+                "خواننده مورد نظر پیدا نشد. لطفا دوباره نام خواننده را وارد نمایید."
+            )
+            return ARTIST_SELECTION
+        keyboard = [
+            [InlineKeyboardButton(text, callback_data=data)]
+            for text, data in artist_buttons(candidates)
+        ]
         await update.message.reply_text(
-            "خواننده مورد نظر پیدا نشد. لطفا دوباره نام خواننده را وارد نمایید."
+            "منظور شما کدام خواننده است؟ یکی را انتخاب کنید و یا دوباره نام خواننده را وارد نمایید.",
+            reply_markup=InlineKeyboardMarkup(keyboard),
         )
         return ARTIST_SELECTION
     context.user_data.update({"requested_artist": artist})
     logger.info(
-        {
-            f"User {update.effective_user.full_name} chose {context.user_data.get('requested_artist')} via message input."
-        }
+        f"User {update.effective_user.full_name} chose {context.user_data.get('requested_artist')} via message input."
     )
     await list_artist_songs(update, context)
     return SONG
 
 
+@instrument_handler
+async def input_song_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    await query.edit_message_text(
+        text="نام آهنگ خود را وارد کنید. مثل:\n ایران",
+        reply_markup=InlineKeyboardMarkup(
+            [[InlineKeyboardButton(text="خروج", callback_data="exit")]]
+        ),
+    )
+    return SONG_SEARCH
+
+
+@instrument_handler
+async def search_songs_by_msg(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    searched_text = update.message.text
+    results = search_songs(searched_text)
+    logger.info(
+        f"User {update.effective_user.full_name} searched for {searched_text}, {len(results)} results."
+    )
+    if not results:
+        await update.message.reply_text(
+            "آهنگی پیدا نشد. لطفا نام دیگری را وارد نمایید."
+        )
+        return SONG_SEARCH
+    keyboard = [
+        [InlineKeyboardButton(f"{song.name} - {song.artist.name}", callback_data=f"song_{song.id}")]
+        for song in results
+    ]
+    keyboard.append([InlineKeyboardButton(text="خروج", callback_data="exit")])
+    await update.message.reply_text(
+        "یک آهنگ را انتخاب کنید و یا نام آهنگ دیگری را وارد نمایید.",
+        reply_markup=InlineKeyboardMarkup(keyboard),
+    )
+    return SONG
+
+
+@instrument_handler
 async def list_artist_songs(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     if query:
@@ -119,118 +320,562 @@ async def list_artist_songs(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         requested_page = 1
     artist = context.user_data.get("requested_artist")
-    paginated_songs_cache = cache.get((artist.name,))
-    start_message = context.user_data.get("start_message")
-    if not paginated_songs_cache:
-        await start_message.edit_text(text="در حال دریافت لیست آهنگ ها ...")
-    paginated_songs = await all_artist_songs_paginated(artist)
-    reply_markup = create_keyboard_page(paginated_songs, requested_page)
-    await start_message.edit_text(
-        text=f"خواننده انتخاب شده:\n{artist.name}\nیک آهنگ را انتخاب کنید.",
+    if not is_artist_page_cached(artist, requested_page):
+        await edit_start_message(update, context, "در حال دریافت لیست آهنگ ها ...")
+    try:
+        page_songs, page_count = await artist_songs_page(artist, requested_page)
+    except SCRAPE_ERRORS:
+        logger.error(f"Couldn't get page {requested_page} of the songs of {artist.name}.")
+        reply_markup = retry_markup(f"page_{requested_page}")
+        await edit_start_message(update, context, SITE_UNAVAILABLE_TEXT, reply_markup=reply_markup)
+        return SONG
+    reply_markup = create_keyboard_page(song_buttons(page_songs), requested_page, page_count)
+    await edit_start_message(
+        update,
+        context,
+        f"خواننده انتخاب شده:\n{artist.name}\nیک آهنگ را انتخاب کنید.",
         reply_markup=reply_markup,
     )
     return SONG
 
 
+@instrument_handler
 async def download_selected_songs(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
+    song = get_song_by_id(int(query.data.split("_")[-1]))
+    file_ids = file_id_cache.get(song.url)
+    if file_ids:
+        logger.info(
+            f"User {update.effective_user.full_name} requested {song.name}, sending cached file_ids.",
+            extra={"song_id": song.id},
+        )
+        try:
+            for file_id in file_ids:
+                await update.effective_chat.send_audio(file_id)
+        except BadRequest:
+            # file_id was revoked on telegram's side, falling back to downloading it again.
+            logger.error(f"Cached file_ids of {song.name} are invalid, redownloading.")
+            file_id_cache.delete(song.url)
+        else:
+            return SONG
     status_message = await update.effective_chat.send_message(
         text="در حال دانلود آهنگ ..."
     )
-    song: Song = query.data
+    logger.info(
+        f"User {update.effective_user.full_name} requested to download song: {song.name}.",
+        extra={"song_id": song.id},
+    )
+    # updates are handled one at a time, the download mustn't keep other users waiting.
+    context.application.create_task(
+        download_and_send_song(update, context, status_message, song), update=update
+    )
+    return SONG
+
+
+async def download_and_send_song(
+    update: Update,
+    context: ContextTypes.DEFAULT_TYPE,
+    status_message: Message,
+    song: Song,
+):
+    requested_at = time.perf_counter()
+    # the task has a context of its own, the binding ends with it.
+    bind_log_context(song_id=song.id)
+    status_updater = StatusMessageUpdater(status_message, STATUS_UPDATE_INTERVAL)
+    file_ids = []
     try:
-        logger.info(f"User {update.effective_user.full_name} requested to download song: {song.name}.")
-        file_paths = await download_song(song=song, save_dir=SAVE_DIR)
-    except requests.exceptions.ChunkedEncodingError or requests.exceptions.SSLError:
+        audio_links = await song_audio_links(song)
+        if AUDIO_SEND_MODE == "url":
+            audio_links = await send_songs_by_url(update, song, audio_links, file_ids, requested_at)
+        if audio_links:
+            downloaded_paths = asyncio.Queue()
+            # files are uploaded as soon as they're downloaded, while the rest are still downloading.
+            sending = asyncio.create_task(
+                send_selected_songs(
+                    update, song, iterate_queue(downloaded_paths), file_ids, requested_at
+                )
+            )
+            try:
+                await download_scheduler.submit(
+                    user_id=update.effective_user.id,
+                    key=tuple(audio_links),
+                    download=lambda on_progress, on_file: download_song(
+                        song=song,
+                        save_dir=SAVE_DIR,
+                        on_progress=on_progress,
+                        on_file=on_file,
+                        audio_links=audio_links,
+                    ),
+                    on_position=status_updater.position,
+                    on_progress=status_updater.progress,
+                    on_part=downloaded_paths.put_nowait,
+                )
+                status_updater.stop()
+                await status_message.edit_text(text="در حال ارسال آهنگ ...")
+            finally:
+                status_updater.stop()
+                downloaded_paths.put_nowait(None)
+                # the downloaded files are still sent when the rest failed.
+                await sending
+    except QueueFullError:
+        await status_message.edit_text(
+            "تعداد دانلود های در صف شما زیاد است، لطفا تا پایان آن ها صبر کنید."
+        )
+        return
+    except CircuitOpenError:
+        logger.warning(
+            f"User {update.effective_user.full_name} couldn't download {song.name}, "
+            "the site is unavailable."
+        )
+        await status_message.edit_text(SITE_UNAVAILABLE_TEXT)
+        return
+    # FileNotFoundError: evicted by another worker process between its download and its upload.
+    except (ClientError, asyncio.TimeoutError, SiteError, FileNotFoundError):
         logger.error(f"User {update.effective_user.full_name} failed to download {song.name}.")
         await update.effective_chat.send_message(
             "دانلود به مشکل خورد لطفا دوباره سعی کنید!"
         )
         await status_message.delete()
-        return SONG
-    await send_selected_songs(update, context, status_message, file_paths)
-    return SONG
+        return
+    # TimedOut, NetworkError...: the upload of the audios failed.
+    except TelegramError as error:
+        logger.error(
+            f"Couldn't send {song.name} to user: {update.effective_user.full_name}: {error!r}"
+        )
+        await status_message.edit_text("ارسال آهنگ به مشکل خورد لطفا دوباره سعی کنید!")
+        return
+    elapsed = time.perf_counter() - requested_at
+    logger.info(
+        f"{song.name} was sent to user: {update.effective_user.full_name} in {elapsed:.2f}s.",
+        extra={"duration_s": elapsed},
+    )
+    file_id_cache.set(song.url, file_ids)
+    if not context.user_data.get("download_inform"):
+        await status_message.edit_text(
+            text="آهنگ دانلود شد. \n میتوانید از لیست آهنگ هایی که هنوز در لیست بالا موجود هستند آهنگ دانلود کنید در غیر این صورت دکمه خروج را فشار دهید"
+        )
+        context.user_data["download_inform"] = True
+    else:
+        await status_message.delete()
+
+
+def audio_sent(
+    update: Update, song: Song, message: Message, file_ids: List[str], requested_at: float
+) -> None:
+    if not file_ids:
+        elapsed = time.perf_counter() - requested_at
+        time_to_first_audio.observe(elapsed)
+        logger.info(
+            f"Time to first audio of {song.name} for user: {update.effective_user.full_name}: "
+            f"{elapsed:.2f}s.",
+            extra={"time_to_first_audio_s": elapsed},
+        )
+    file_ids.append(message.audio.file_id)
+
+
+async def send_songs_by_url(
+    update: Update, song: Song, audio_links: List[str], file_ids: List[str], requested_at: float
+) -> List[str]:
+    """
+    Lets telegram fetch the audios from music-fa itself, nothing goes through the bot's disk or
+    bandwidth. Returns the links telegram couldn't fetch (e.g. larger than its url limit).
+    """
+    failed_links = []
+    for audio_link in audio_links:
+        try:
+            with upload_duration.time(mode="url"):
+                message = await update.effective_chat.send_audio(audio_link, write_timeout=2000)
+        except BadRequest as error:
+            logger.warning(f"Telegram couldn't fetch {audio_link} ({error}), uploading it instead.")
+            failed_links.append(audio_link)
+        else:
+            audio_sent(update, song, message, file_ids, requested_at)
+    return failed_links
 
 
 async def send_selected_songs(
     update: Update,
-    context: ContextTypes.DEFAULT_TYPE,
-    status_message: Message,
-    file_paths: List[str],
+    song: Song,
+    file_paths: AsyncIterator[str],
+    file_ids: List[str],
+    requested_at: float,
 ):
-    await status_message.edit_text(text="در حال ارسال آهنگ ...")
-    for file_path in file_paths:
+    async for file_path in file_paths:
         with open(file_path, "rb") as file:
-            logger.info(
+            logger.debug(
                 f"Sending audio: {file_path} to user: {update.effective_user.full_name} "
             )
-            await update.effective_chat.send_audio(file, write_timeout=2000)
-        logger.info(f"Audio: {file_path} was succesfully sent to user: {update.effective_user.full_name}" )
-    if not context.user_data.get("download_inform"):
-        await status_message.edit_text(
-            text="آهنگ دانلود شد. \n میتوانید از لیست آهنگ هایی که هنوز در لیست بالا موجود هستند آهنگ دانلود کنید در غیر این صورت دکمه خروج را فشار دهید"
+            start = time.perf_counter()
+            message = await update.effective_chat.send_audio(file, write_timeout=2000)
+        elapsed = time.perf_counter() - start
+        upload_duration.observe(elapsed, mode="upload")
+        audio_sent(update, song, message, file_ids, requested_at)
+        logger.info(
+            f"Audio: {file_path} was succesfully sent to user: {update.effective_user.full_name}",
+            extra={"upload_s": elapsed, "bytes": os.path.getsize(file_path)},
         )
-        context.user_data["download_inform"] = True
+
+
+@instrument_handler
+async def download_album(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    /album <artist> [page]: sends every song of a page of the artist, or of the whole artist.
+    """
+    words = list(context.args)
+    page = int(words.pop()) if len(words) > 1 and words[-1].isdigit() else None
+    if not words:
+        await update.message.reply_text(
+            "نام خواننده را بعد از دستور وارد کنید. مثل:\n/album همایون شجریان\n/album همایون شجریان 2"
+        )
+        return
+    try:
+        artist = await get_artist(" ".join(words))
+        page_count = await artist_page_count(artist) if artist and page else None
+    except SCRAPE_ERRORS:
+        await update.message.reply_text(SITE_UNAVAILABLE_TEXT)
+        return
+    if not artist:
+        await update.message.reply_text("خواننده مورد نظر پیدا نشد.")
+        return
+    if page and page > page_count:
+        await update.message.reply_text("صفحه مورد نظر پیدا نشد.")
+        return
+    logger.info(
+        f"User {update.effective_user.full_name} requested the songs of {artist.name}, "
+        f"page {page or 'all'}."
+    )
+    status_message = await update.message.reply_text("در حال دریافت لیست آهنگ ها ...")
+    context.application.create_task(
+        download_and_send_album(update, status_message, artist, page), update=update
+    )
+
+
+async def download_and_send_album(
+    update: Update, status_message: Message, artist: Artist, page: Optional[int]
+):
+    bind_log_context(artist=artist.name)
+    status_updater = StatusMessageUpdater(status_message, STATUS_UPDATE_INTERVAL)
+    try:
+        if page:
+            songs = await get_artist_page_songs(artist, page)
+        else:
+            paginated_songs = await all_artist_songs_paginated(artist)
+            # a song listed on two pages is sent once.
+            songs = list(dict.fromkeys(song for page_songs in paginated_songs for song in page_songs))
+            songs = songs[:BULK_MAX_SONGS]
+    except CircuitOpenError:
+        await status_message.edit_text(SITE_UNAVAILABLE_TEXT)
+        return
+    except SCRAPE_ERRORS:
+        await status_message.edit_text("دریافت لیست آهنگ ها به مشکل خورد لطفا دوباره سعی کنید!")
+        return
+    audios = asyncio.Queue()
+    not_sent = []
+    # songs sent before are sent again by their file_ids, without downloading them.
+    for song in songs:
+        file_ids = file_id_cache.get(song.url)
+        if file_ids:
+            audios.put_nowait((song, file_ids))
+        else:
+            not_sent.append(song)
+    sending = asyncio.create_task(send_media_groups(update, iterate_queue(audios)))
+    downloaded = 0
+
+    def song_downloaded(part: Tuple[Song, Optional[List[str]]]) -> None:
+        nonlocal downloaded
+        downloaded += 1
+        status_updater.songs(downloaded, len(not_sent))
+        if part[1]:
+            audios.put_nowait(part)
+
+    queue_full = False
+    try:
+        if not_sent:
+            await download_scheduler.submit(
+                user_id=update.effective_user.id,
+                key=("album",) + tuple(song.id for song in not_sent),
+                download=lambda on_progress, on_part: download_songs(
+                    not_sent,
+                    SAVE_DIR,
+                    on_song=lambda song, file_paths: on_part((song, file_paths)),
+                ),
+                on_position=status_updater.position,
+                on_part=song_downloaded,
+            )
+    except QueueFullError:
+        queue_full = True
+    finally:
+        status_updater.stop()
+        audios.put_nowait(None)
+        # the songs downloaded so far are still sent when the rest failed.
+        sent = await sending
+    logger.info(
+        f"{sent} of the {len(songs)} songs of {artist.name} were sent to user: "
+        f"{update.effective_user.full_name}.",
+        extra={"songs": len(songs), "sent": sent},
+    )
+    if queue_full:
+        text = "تعداد دانلود های در صف شما زیاد است، لطفا تا پایان آن ها صبر کنید."
+    elif sent < len(songs):
+        text = f"{sent} از {len(songs)} آهنگ ارسال شد، ارسال بقیه به مشکل خورد لطفا دوباره سعی کنید!"
     else:
-        await status_message.delete()
-    return SONG
+        text = f"{sent} آهنگ ارسال شد."
+    await status_message.edit_text(text)
+
+
+async def send_media_groups(
+    update: Update, songs: AsyncIterator[Tuple[Song, List[str]]]
+) -> int:
+    """
+    Sends the audios of the songs, paths or file_ids, in media groups as soon as there are
+    MEDIA_GROUP_SIZE of them, and caches the file_ids of every song. Returns the songs sent.
+    """
+    group: List[Tuple[Song, str]] = []
+    audio_counts: Dict[Song, int] = dict()
+    file_ids: Dict[Song, List[str]] = dict()
+    sent = 0
+
+    async def send_group(group: List[Tuple[Song, str]]) -> None:
+        nonlocal sent
+        start = time.perf_counter()
+        try:
+            if len(group) == 1:
+                messages = [await update.effective_chat.send_audio(group[0][1], write_timeout=2000)]
+            else:
+                messages = await update.effective_chat.send_media_group(
+                    [InputMediaAudio(audio) for _, audio in group], write_timeout=2000
+                )
+        except TelegramError as error:
+            logger.error(f"Couldn't send a media group of {len(group)} audios: {error!r}")
+            for song, _ in group:
+                # its file_ids may have been revoked, it's downloaded again next time.
+                file_id_cache.delete(song.url)
+                file_ids.pop(song, None)
+            return
+        upload_duration.observe(time.perf_counter() - start, mode="media_group")
+        for (song, _), message in zip(group, messages):
+            # the song's other audios failed in another group.
+            if song not in file_ids:
+                continue
+            file_ids[song].append(message.audio.file_id)
+            if len(file_ids[song]) == audio_counts[song]:
+                file_id_cache.set(song.url, file_ids.pop(song))
+                sent += 1
+
+    async for song, audios in songs:
+        audio_counts[song] = len(audios)
+        file_ids[song] = []
+        for audio in audios:
+            group.append((song, audio))
+            if len(group) == MEDIA_GROUP_SIZE:
+                await send_group(group)
+                group = []
+    if group:
+        await send_group(group)
+    return sent
 
 
+@instrument_handler
+async def answer_inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.inline_query
+    latest_inline_queries[query.from_user.id] = query.id
+    # answered in the background, updates are handled one at a time and every keystroke is one.
+    context.application.create_task(send_inline_answer(query), update=update)
 
+
+async def send_inline_answer(query: InlineQuery) -> None:
+    async with inline_answer_semaphore:
+        # the user typed on while this one waited, only the latest query is shown.
+        if latest_inline_queries.get(query.from_user.id) != query.id:
+            return
+        results = inline_results(query.query, file_id_cache)
+        button = None
+        if not results:
+            button = InlineQueryResultsButton(text="جستجو در بات موزیکفا", start_parameter="inline")
+        try:
+            await query.answer(results, cache_time=INLINE_CACHE_TTL, button=button)
+        except BadRequest as error:
+            # too old, telegram doesn't take answers of expired queries.
+            logger.debug(f"Inline query {query.query!r} wasn't answered: {error}")
+    if latest_inline_queries.get(query.from_user.id) == query.id:
+        del latest_inline_queries[query.from_user.id]
+
+
+@instrument_handler
 async def exit(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.callback_query:
         query = update.callback_query
         await query.answer()
         await query.edit_message_text("ممنون که از بات موزیکفا استفاده میکنید!")
     else:
-        message = context.chat_data.get("start_message")
-        await message.edit_text("ممنون که از بات موزیکفا استفاده میکنید !")
+        await edit_start_message(update, context, "ممنون که از بات موزیکفا استفاده میکنید !")
     logger.info(f"User {update.effective_user.full_name} exited the bot.")
+    active_conversations.discard((update.effective_chat.id, update.effective_user.id))
     return ConversationHandler.END
 
 
-def main():
-    application = (
+async def on_error(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Logs the errors the handlers didn't handle themselves, the ones the site raises are.
+    """
+    logger.error(f"Handling an update failed: {context.error!r}", exc_info=context.error)
+
+
+async def on_startup(application: Application):
+    global metrics_runner
+    await start_session()
+    # the first users are answered from the snapshot, before anything is scraped.
+    restore_snapshot()
+    # keyboards sent before a restart keep working.
+    warm_indexes()
+    active_conversations.update(await application.persistence.get_conversations("music_bot"))
+    if METRICS_PORT:
+        metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT)
+
+
+async def fetch_artists(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Fetches the artist list, the first thing every user asks for, when neither the scrape cache nor
+    the snapshot had it.
+    """
+    if not get_all_artists.is_cached():
+        prefetch(get_all_artists())
+
+
+async def on_shutdown(application: Application):
+    await download_scheduler.stop()
+    await stop_metrics_server(metrics_runner)
+    await close_session()
+    close_audio_stores()
+    close_scrape_cache()
+    file_id_cache.close()
+
+
+def build_application(with_updater: bool = True, with_crawler: bool = True) -> Application:
+    if not TELEGRAM_BOT_TOKEN:
+        raise Exception("No telegram bot token was found in environment variables.")
+    builder = (
         Application.builder()
         .token(TELEGRAM_BOT_TOKEN)
+        .base_url(TELEGRAM_BASE_URL)
         .read_timeout(500)
-        .arbitrary_callback_data(True)
-        .build()
+        .persistence(
+            BackendPersistence(open_backend(PERSISTENCE_DB), PERSISTENCE_UPDATE_INTERVAL)
+        )
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
     )
+    if not with_updater:
+        # updates are put into application.update_queue by the caller.
+        builder = builder.updater(None)
+    application = builder.build()
     conv_handler = ConversationHandler(
         entry_points=[CommandHandler("start", start)],
         states={
             ARTIST: [
-                CallbackQueryHandler(set_artist_by_callback, pattern=Artist),
-                CallbackQueryHandler(list_artists, pattern="^page_\d+$"),
+                CallbackQueryHandler(set_artist_by_callback, pattern="^artist_[0-9a-f]+$"),
+                CallbackQueryHandler(list_artists, pattern=r"^page_\d+$"),
                 CallbackQueryHandler(input_artist, pattern="^artist_songs$"),
+                CallbackQueryHandler(input_song_search, pattern="^search_songs$"),
             ],
             ARTIST_SELECTION: [
+                CallbackQueryHandler(set_artist_by_callback, pattern="^artist_[0-9a-f]+$"),
                 MessageHandler(filters.TEXT & ~filters.COMMAND, set_artist_by_msg),
             ],
+            SONG_SEARCH: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, search_songs_by_msg),
+            ],
             SONG: [
-                CallbackQueryHandler(download_selected_songs, pattern=Song),
-                CallbackQueryHandler(list_artist_songs, pattern="^page_\d+$"),
+                CallbackQueryHandler(download_selected_songs, pattern=r"^song_\d+$"),
+                CallbackQueryHandler(list_artist_songs, pattern=r"^page_\d+$"),
+                MessageHandler(filters.TEXT & ~filters.COMMAND, search_songs_by_msg),
             ],
         },
         fallbacks=[
             CallbackQueryHandler(exit, pattern="^exit$"),
             CommandHandler("exit", exit),
         ],
+        name="music_bot",
+        persistent=True,
     )
     application.add_handler(conv_handler)
+    application.add_handler(CommandHandler("album", download_album))
+    application.add_handler(InlineQueryHandler(answer_inline_query))
+    application.add_error_handler(on_error)
+    if with_crawler and application.job_queue:
+        application.job_queue.run_once(fetch_artists, when=0)
+        application.job_queue.run_repeating(
+            crawl, interval=CRAWLER_INTERVAL, first=CRAWLER_FIRST_DELAY
+        )
+    elif with_crawler:
+        logger.warning("JobQueue isn't available, the background crawler is disabled.")
+    return application
+
+
+async def run_worker(index: int, port: int) -> None:
+    """
+    Worker process of the multi-worker webhook mode, handles the updates music_bot.front
+    posts to http://127.0.0.1:port/update until it's terminated.
+    """
+    from aiohttp import web
+
+    # a single crawler warms the cache every worker shares.
+    application = build_application(with_updater=False, with_crawler=index == 0)
+    stopped = asyncio.Event()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        asyncio.get_running_loop().add_signal_handler(signal_number, stopped.set)
+
+    async def receive_update(request: web.Request) -> web.Response:
+        update = Update.de_json(await request.json(), application.bot)
+        await application.update_queue.put(update)
+        return web.Response()
+
+    server = web.Application()
+    server.router.add_post("/update", receive_update)
+    runner = web.AppRunner(server, access_log=None)
+    async with application:
+        # run_webhook and run_polling call these themselves.
+        await on_startup(application)
+        await application.start()
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+        logger.info(f"Worker {index} is handling updates on port {port}.")
+        await stopped.wait()
+        await runner.cleanup()
+        await application.stop()
+        await on_shutdown(application)
+
+
+def main():
+    if PORT and WEBHOOK_WORKERS > 1:
+        # only the front process needs it.
+        from music_bot.front import run_front
+
+        if not TELEGRAM_BOT_TOKEN:
+            raise Exception("No telegram bot token was found in environment variables.")
+        asyncio.run(run_front(int(PORT), WEBHOOK_WORKERS, WORKER_BASE_PORT, WEBHOOK_URL))
+        return
+    application = build_application()
     if PORT:
-        print(PORT)
         application.run_webhook(
             listen="0.0.0.0",
             port=int(PORT),
             url_path=TELEGRAM_BOT_TOKEN,
-            webhook_url="https://musicfa-bot.herokuapp.com/" + TELEGRAM_BOT_TOKEN
+            webhook_url=WEBHOOK_URL + TELEGRAM_BOT_TOKEN,
         )
     else:
         application.run_polling()
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    # the Procfile passes PORT, which is read from the environment.
+    parser.add_argument("port", nargs="?", help=argparse.SUPPRESS)
+    parser.add_argument("--worker", type=int, help="run as this worker of music_bot.front")
+    parser.add_argument("--worker-port", type=int)
+    args = parser.parse_args()
+    if args.worker is not None:
+        asyncio.run(run_worker(args.worker, args.worker_port))
+    else:
+        main()
@@ -0,0 +1,196 @@
+import asyncio
+from collections import Counter, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional
+
+from music_bot.logger import logger
+
+ProgressCallback = Callable[[int, Optional[int]], None]
+PositionCallback = Callable[[int], Awaitable[None]]
+PartCallback = Callable[[Any], None]
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class _Job:
+    def __init__(
+        self,
+        user_id: int,
+        key: Hashable,
+        download: Callable[[ProgressCallback, PartCallback], Awaitable],
+    ):
+        self.user_id = user_id
+        self.key = key
+        self.download = download
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.position_callbacks: List[PositionCallback] = []
+        self.progress_callbacks: List[ProgressCallback] = []
+        self.part_callbacks: List[PartCallback] = []
+        # partial results reported so far, replayed to callers merged into a running job.
+        self.parts: List[Any] = []
+        self.position: Optional[int] = None
+
+    def progress(self, downloaded_bytes: int, total_bytes: Optional[int]) -> None:
+        for callback in self.progress_callbacks:
+            callback(downloaded_bytes, total_bytes)
+
+    def part(self, part: Any) -> None:
+        self.parts.append(part)
+        for callback in self.part_callbacks:
+            callback(part)
+
+
+class DownloadScheduler:
+    """
+    Runs downloads on a fixed pool of workers. Users are served round-robin, each with at most
+    per_user_limit running and max_queued_per_user waiting downloads, and a download whose key
+    is already queued or running is merged with it instead of starting again.
+    """
+
+    def __init__(self, workers: int, per_user_limit: int = 1, max_queued_per_user: int = 5):
+        self.workers = workers
+        self.per_user_limit = per_user_limit
+        self.max_queued_per_user = max_queued_per_user
+        self._queues: Dict[int, Deque[_Job]] = dict()
+        # round-robin order of the users with queued jobs.
+        self._users: Deque[int] = deque()
+        self._running = Counter()
+        self._jobs_by_key: Dict[Hashable, _Job] = dict()
+        self._condition: Optional[asyncio.Condition] = None
+        self._worker_tasks: List[asyncio.Task] = []
+        self._callback_tasks = set()
+
+    @property
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    @property
+    def running(self) -> int:
+        return sum(self._running.values())
+
+    def start(self) -> None:
+        if self._worker_tasks:
+            return
+        self._condition = asyncio.Condition()
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+    async def submit(
+        self,
+        user_id: int,
+        key: Hashable,
+        download: Callable[[ProgressCallback, PartCallback], Awaitable[Any]],
+        on_position: PositionCallback = None,
+        on_progress: ProgressCallback = None,
+        on_part: PartCallback = None,
+    ) -> Any:
+        """
+        Queues download, which is called with a progress and a part callback, and returns its result.
+        on_position is called with the job's queue position whenever it changes, on_part with every
+        partial result the download reports (e.g. a finished file), before the whole result is ready.
+        """
+        self.start()
+        job = self._jobs_by_key.get(key)
+        if job is None:
+            queue = self._queues.get(user_id)
+            if queue is not None and len(queue) >= self.max_queued_per_user:
+                raise QueueFullError(f"User {user_id} has {len(queue)} queued downloads.")
+            job = _Job(user_id, key, download)
+            # a failed job whose callers were all cancelled mustn't log "exception was never retrieved".
+            job.future.add_done_callback(lambda future: future.cancelled() or future.exception())
+            self._jobs_by_key[key] = job
+            if queue is None:
+                queue = self._queues[user_id] = deque()
+                self._users.append(user_id)
+            queue.append(job)
+            async with self._condition:
+                self._condition.notify()
+        else:
+            logger.info(f"Download of {key} is already queued, merging.")
+        if on_position:
+            job.position_callbacks.append(on_position)
+        if on_progress:
+            job.progress_callbacks.append(on_progress)
+        if on_part:
+            for part in job.parts:
+                on_part(part)
+            job.part_callbacks.append(on_part)
+        self._update_positions()
+        # shielded, so a cancelled caller doesn't cancel a download others may be waiting for.
+        return await asyncio.shield(job.future)
+
+    def _pick(self) -> Optional[_Job]:
+        for _ in range(len(self._users)):
+            user_id = self._users.popleft()
+            if self._running[user_id] >= self.per_user_limit:
+                self._users.append(user_id)
+                continue
+            queue = self._queues[user_id]
+            job = queue.popleft()
+            if queue:
+                self._users.append(user_id)
+            else:
+                del self._queues[user_id]
+            return job
+        return None
+
+    def _positions(self) -> Dict[_Job, int]:
+        """
+        Positions of the queued jobs, in the round-robin order they would be picked in.
+        """
+        positions = dict()
+        position = 1
+        depth = 0
+        while len(positions) < self.queued:
+            for user_id in self._users:
+                queue = self._queues[user_id]
+                if depth < len(queue):
+                    positions[queue[depth]] = position
+                    position += 1
+            depth += 1
+        return positions
+
+    def _update_positions(self) -> None:
+        for job, position in self._positions().items():
+            if job.position == position:
+                continue
+            job.position = position
+            for callback in job.position_callbacks:
+                # not awaited, so workers don't wait for status message edits.
+                task = asyncio.create_task(callback(position))
+                self._callback_tasks.add(task)
+                task.add_done_callback(self._callback_done)
+
+    def _callback_done(self, task: asyncio.Task) -> None:
+        self._callback_tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.error(f"Queue position callback failed: {task.exception()!r}")
+
+    async def _worker(self) -> None:
+        while True:
+            async with self._condition:
+                job = self._pick()
+                while job is None:
+                    await self._condition.wait()
+                    job = self._pick()
+            self._running[job.user_id] += 1
+            self._update_positions()
+            try:
+                job.future.set_result(await job.download(job.progress, job.part))
+            except asyncio.CancelledError:
+                job.future.cancel()
+                raise
+            except Exception as error:
+                job.future.set_exception(error)
+            finally:
+                self._running[job.user_id] -= 1
+                self._jobs_by_key.pop(job.key, None)
+                async with self._condition:
+                    # the user may have been blocked by per_user_limit.
+                    self._condition.notify_all()
@@ -0,0 +1,56 @@
+import json
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from music_bot.backends import Backend
+from music_bot.settings import FILE_ID_MEMORY_SIZE, FILE_ID_MISS_TTL
+
+NAMESPACE = "file_ids"
+
+
+class FileIdCache:
+    """
+    Persistent mapping of a song page url (and requested quality) to the telegram file_ids
+    returned by the first upload of its audio files, so a song is only ever uploaded once.
+
+    The most recently read entries are kept in memory, get is called on the event loop for every
+    song of a list or an inline answer.
+    """
+
+    def __init__(self, backend: Backend, memory_size: int = FILE_ID_MEMORY_SIZE):
+        self.backend = backend
+        self.memory_size = memory_size
+        # key -> (expiry time of a miss or None, file_ids), least recently used first.
+        self._memory: "OrderedDict[str, Tuple[Optional[float], List[str]]]" = OrderedDict()
+
+    def _remember(self, key: str, file_ids: List[str]) -> None:
+        expiry = None if file_ids else time.monotonic() + FILE_ID_MISS_TTL
+        self._memory[key] = (expiry, file_ids)
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get(self, song_url: str, quality: str = "any") -> List[str]:
+        key = f"{quality} {song_url}"
+        remembered = self._memory.get(key)
+        if remembered and (remembered[0] is None or remembered[0] > time.monotonic()):
+            self._memory.move_to_end(key)
+            return list(remembered[1])
+        data = self.backend.get(NAMESPACE, key)
+        file_ids = json.loads(data) if data else []
+        self._remember(key, file_ids)
+        return list(file_ids)
+
+    def set(self, song_url: str, file_ids: List[str], quality: str = "any") -> None:
+        key = f"{quality} {song_url}"
+        self.backend.set(NAMESPACE, key, json.dumps(file_ids).encode())
+        self._remember(key, list(file_ids))
+
+    def delete(self, song_url: str, quality: str = "any") -> None:
+        key = f"{quality} {song_url}"
+        self.backend.delete(NAMESPACE, key)
+        self._memory.pop(key, None)
+
+    def close(self) -> None:
+        self.backend.close()
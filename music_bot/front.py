@@ -0,0 +1,165 @@
+"""
+Front process of the multi-worker webhook mode. Telegram's updates are received here and posted
+to one of the worker processes (see bot.run_worker), picked by the id of the update's user: every
+update of a user, in a private chat or a group, lands on the same worker, which is the only one
+writing the user's data and conversation states (keyed by chat and user). The scrape cache,
+file_ids and persistence are shared by the workers through their backend, see music_bot.backends.
+
+    PORT=8443 WEBHOOK_WORKERS=4 python -m music_bot.bot
+"""
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+from typing import List, Optional
+
+from aiohttp import ClientError, ClientSession, ClientTimeout, TCPConnector, web
+from telegram import Bot
+
+from music_bot.logger import logger
+from music_bot.metrics import Counter, start_metrics_server, stop_metrics_server
+from music_bot.settings import (
+    LOG_FILE,
+    METRICS_HOST,
+    METRICS_PORT,
+    STATE_BACKEND,
+    TELEGRAM_BASE_URL,
+    TELEGRAM_BOT_TOKEN,
+)
+
+# seconds a worker has to start listening.
+WORKER_START_TIMEOUT = 60
+dispatched_updates = Counter(
+    "musicbot_front_updates_total", "Updates dispatched to the workers.", ["worker", "result"]
+)
+
+
+def update_user_id(update: dict) -> Optional[int]:
+    """
+    Returns the id of the user of an update as telegram sends it, the chat's id for updates
+    without a user (e.g. channel posts).
+    """
+    for value in update.values():
+        if not isinstance(value, dict):
+            continue
+        if "from" in value:
+            return value["from"]["id"]
+        chat = value.get("chat") or (value.get("message") or {}).get("chat")
+        if chat:
+            return chat["id"]
+    return None
+
+
+def worker_index(update: dict, workers: int) -> int:
+    user_id = update_user_id(update)
+    return user_id % workers if user_id is not None else 0
+
+
+def spawn_workers(workers: int, base_port: int) -> List[subprocess.Popen]:
+    processes = []
+    for index in range(workers):
+        env = dict(os.environ)
+        # the front serves its metrics on METRICS_PORT, the workers on the following ports.
+        env["METRICS_PORT"] = str(METRICS_PORT + 1 + index) if METRICS_PORT else "0"
+        # a file each, rotating a file several processes write to would lose records.
+        log_file, extension = os.path.splitext(LOG_FILE)
+        env["LOG_FILE"] = f"{log_file}.worker-{index}{extension}"
+        command = [
+            sys.executable, "-m", "music_bot.bot",
+            "--worker", str(index), "--worker-port", str(base_port + index),
+        ]
+        processes.append(subprocess.Popen(command, env=env))
+    return processes
+
+
+async def wait_for_workers(processes: List[subprocess.Popen], base_port: int) -> None:
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + WORKER_START_TIMEOUT
+    for index, process in enumerate(processes):
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"Worker {index} exited with {process.returncode}.")
+            try:
+                _, writer = await asyncio.open_connection("127.0.0.1", base_port + index)
+            except OSError:
+                if loop.time() > deadline:
+                    raise RuntimeError(f"Worker {index} didn't start in {WORKER_START_TIMEOUT}s.")
+                await asyncio.sleep(0.2)
+            else:
+                writer.close()
+                break
+
+
+async def stop_workers(processes: List[subprocess.Popen]) -> None:
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            await asyncio.to_thread(process.wait, 30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def create_front_app(worker_urls: List[str], session: ClientSession) -> web.Application:
+    async def receive_update(request: web.Request) -> web.Response:
+        data = await request.read()
+        index = worker_index(json.loads(data), len(worker_urls))
+        try:
+            async with session.post(
+                worker_urls[index], data=data, headers={"Content-Type": "application/json"}
+            ) as response:
+                delivered = response.status == 200
+        except (ClientError, asyncio.TimeoutError):
+            delivered = False
+        dispatched_updates.inc(worker=index, result="delivered" if delivered else "failed")
+        if not delivered:
+            logger.error(f"Worker {index} couldn't take an update, telegram will send it again.")
+            return web.Response(status=503)
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_post(f"/{TELEGRAM_BOT_TOKEN}", receive_update)
+    return app
+
+
+async def run_front(
+    port: int,
+    workers: int,
+    base_port: int,
+    webhook_url: Optional[str] = None,
+    stopped: asyncio.Event = None,
+) -> None:
+    """
+    Starts the workers, receives the updates on port until stopped is set (or the process is
+    terminated) and stops the workers. The webhook is set to webhook_url when it's given.
+    """
+    if STATE_BACKEND == "memory":
+        logger.warning("The memory backend isn't shared, every worker has a cache of its own.")
+    if stopped is None:
+        stopped = asyncio.Event()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            asyncio.get_running_loop().add_signal_handler(signal_number, stopped.set)
+    processes = spawn_workers(workers, base_port)
+    # the workers are on this host, they're never waited for because of a pool limit.
+    session = ClientSession(connector=TCPConnector(limit=0), timeout=ClientTimeout(total=30))
+    worker_urls = [f"http://127.0.0.1:{base_port + index}/update" for index in range(workers)]
+    runner = web.AppRunner(create_front_app(worker_urls, session), access_log=None)
+    metrics_runner = None
+    try:
+        await wait_for_workers(processes, base_port)
+        await runner.setup()
+        await web.TCPSite(runner, "0.0.0.0", port).start()
+        if METRICS_PORT:
+            metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT)
+        if webhook_url:
+            async with Bot(TELEGRAM_BOT_TOKEN, base_url=TELEGRAM_BASE_URL) as bot:
+                await bot.set_webhook(webhook_url + TELEGRAM_BOT_TOKEN)
+        logger.info(f"Dispatching updates received on port {port} to {workers} workers.")
+        await stopped.wait()
+    finally:
+        await runner.cleanup()
+        await stop_metrics_server(metrics_runner)
+        await session.close()
+        await stop_workers(processes)
@@ -0,0 +1,66 @@
+"""
+Inline mode, "@bot <song or artist>" in any chat. Answers come from the songs the bot already
+knows (see scraper.search_catalog), never from scraping: songs sent before are answered with their
+telegram file_ids, the others with their audio links when those are cached.
+"""
+import time
+from collections import OrderedDict
+from typing import List, Tuple
+
+from telegram import InlineQueryResult, InlineQueryResultAudio, InlineQueryResultCachedAudio
+
+from music_bot.file_id_cache import FileIdCache
+from music_bot.metrics import Counter
+from music_bot.scrap.models import Song
+from music_bot.scrap.scraper import cached_audio_links, search_catalog
+from music_bot.settings import INLINE_CACHE_SIZE, INLINE_CACHE_TTL, INLINE_RESULTS_LIMIT
+from music_bot.utils.search import normalize_persian
+
+# normalized query -> (expiry time, results), least recently used first.
+answers: "OrderedDict[str, Tuple[float, List[InlineQueryResult]]]" = OrderedDict()
+inline_answers = Counter(
+    "musicbot_inline_answers_total", "Inline queries answered, by the answer cache.", ["cache"]
+)
+
+
+def song_results(song: Song, file_id_cache: FileIdCache) -> List[InlineQueryResult]:
+    file_ids = file_id_cache.get(song.url)
+    if file_ids:
+        return [
+            InlineQueryResultCachedAudio(f"{song.id}_{index}", file_id)
+            for index, file_id in enumerate(file_ids)
+        ]
+    performer = song.artist.name if song.artist else None
+    return [
+        InlineQueryResultAudio(f"{song.id}_{index}", audio_link, song.name, performer=performer)
+        for index, audio_link in enumerate(cached_audio_links(song))
+    ]
+
+
+def inline_results(query: str, file_id_cache: FileIdCache) -> List[InlineQueryResult]:
+    """
+    Returns the results of query, the same ones for INLINE_CACHE_TTL seconds, as each keystroke
+    of every user typing the same name is a query of its own.
+    """
+    query = normalize_persian(query)
+    if not query:
+        return []
+    now = time.monotonic()
+    cached = answers.get(query)
+    if cached and cached[0] > now:
+        answers.move_to_end(query)
+        inline_answers.inc(cache="hit")
+        return cached[1]
+    inline_answers.inc(cache="miss")
+    results = []
+    for song in search_catalog(query, INLINE_RESULTS_LIMIT):
+        results.extend(song_results(song, file_id_cache))
+        # songs of several audios fill the results before the last songs are reached.
+        if len(results) >= INLINE_RESULTS_LIMIT:
+            break
+    results = results[:INLINE_RESULTS_LIMIT]
+    answers[query] = (now + INLINE_CACHE_TTL, results)
+    answers.move_to_end(query)
+    if len(answers) > INLINE_CACHE_SIZE:
+        answers.popitem(last=False)
+    return results
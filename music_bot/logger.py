@@ -1,16 +1,116 @@
+"""
+Records are handed to a queue and written by a background thread, logging never blocks the event
+loop on the disk. The log file holds one json object per record, rotated by size, with the fields
+bound by log_context (e.g. the correlation id of the update being handled) and those passed as
+extra.
+"""
+import atexit
+import copy
+import json
 import logging
+import queue
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Dict
 
+from music_bot.settings import (
+    LOG_BACKUP_COUNT,
+    LOG_DEBUG_SAMPLE_RATE,
+    LOG_FILE,
+    LOG_LEVEL,
+    LOG_MAX_BYTES,
+)
 
-file_handler = logging.FileHandler("music_bot.log", mode="w")
-stream_handler = logging.StreamHandler()
+# attributes every LogRecord has, the rest were passed as extra or bound by log_context.
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+_log_fields: ContextVar[Dict[str, Any]] = ContextVar("log_fields", default={})
+
+
+def bind_log_context(**fields):
+    """
+    Adds fields to every record logged from the current context, and the tasks it creates.
+    Returns the token to reset it with, a task's bindings end with it anyway.
+    """
+    return _log_fields.set({**_log_fields.get(), **fields})
+
+
+@contextmanager
+def log_context(**fields):
+    token = bind_log_context(**fields)
+    try:
+        yield
+    finally:
+        _log_fields.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        for key, value in _log_fields.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Lets through a sample_rate fraction of the debug records, hot paths can log at debug level.
+    """
 
-formatter = logging.Formatter(
-    "%(asctime)s | %(levelname)s | %(message)s")
-file_handler.setFormatter(formatter)
-stream_handler.setFormatter(formatter)
+    def __init__(self, sample_rate: float):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.DEBUG or random.random() < self.sample_rate
+
+
+class RecordQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # QueueHandler would merge the traceback into the message, it's a field of its own here.
+        record = copy.copy(record)
+        record.message = record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        entry.update(
+            (key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES
+        )
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+# the file is opened by the first record written to it, not on import.
+file_handler = RotatingFileHandler(
+    LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, delay=True
+)
+file_handler.setFormatter(JsonFormatter())
+stream_handler = logging.StreamHandler()
+stream_handler.setFormatter(logging.Formatter("%(asctime)s | %(levelname)s | %(message)s"))
 
+log_queue = queue.SimpleQueue()
+queue_handler = RecordQueueHandler(log_queue)
+queue_handler.addFilter(SamplingFilter(LOG_DEBUG_SAMPLE_RATE))
+queue_handler.addFilter(ContextFilter())
+listener = QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+listener.start()
+# writes what's still queued on exit.
+atexit.register(listener.stop)
 
 logger = logging.getLogger("music_bot")
-logger.addHandler(file_handler)
-logger.addHandler(stream_handler)
-logger.setLevel(logging.INFO)
+logger.addHandler(queue_handler)
+logger.setLevel(LOG_LEVEL)
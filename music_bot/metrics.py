@@ -0,0 +1,272 @@
+"""
+Counters, gauges and histograms of the bot, exposed in prometheus' text format on a local http
+endpoint (see start_metrics_server).
+"""
+import bisect
+import functools
+import math
+import time
+from contextlib import contextmanager
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from music_bot.logger import log_context, logger
+from music_bot.profiling import maybe_profile
+from music_bot.settings import PROFILE_SAMPLE_RATE
+
+if TYPE_CHECKING:
+    from aiohttp import web
+
+LabelValues = Tuple[str, ...]
+# seconds, from a cached page to a whole song upload.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+registry: List["Metric"] = []
+
+
+def _format_labels(labelnames: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        registry.append(self)
+
+    def _label_values(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterator[Tuple[str, LabelValues, str, float]]:
+        """
+        Yields (name suffix, label values, extra label, value) of every sample.
+        """
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for suffix, values, extra, value in self.samples():
+            labels = _format_labels(self.labelnames, values, extra)
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = dict()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._label_values(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._label_values(labels), 0)
+
+    def samples(self):
+        for values, value in self._values.items():
+            yield "", values, "", value
+
+
+class Gauge(Metric):
+    """
+    Set directly, or read at scrape time from function, which returns the value or, for labeled
+    gauges, a dict of label values to value.
+    """
+
+    type = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        function: Callable[[], Union[float, Dict[LabelValues, float]]] = None,
+        type_: str = None,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+        # counters kept by other objects (e.g. the cache stats) are exposed as counters too.
+        self.type = type_ or self.type
+        self._values: Dict[LabelValues, float] = dict()
+
+    def set(self, value: float, **labels) -> None:
+        self._values[self._label_values(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._label_values(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        values = self._values
+        if self.function is not None:
+            result = self.function()
+            values = result if isinstance(result, dict) else {(): result}
+        for label_values, value in values.items():
+            yield "", tuple(label_values), "", value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # label values -> (count per bucket, sum)
+        self._values: Dict[LabelValues, Tuple[List[int], float]] = dict()
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._label_values(labels)
+        counts, total = self._values.get(key) or ([0] * len(self.buckets), 0.0)
+        # the first bucket whose upper bound is >= value.
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        counts, _ = self._values.get(self._label_values(labels)) or ([0], 0.0)
+        return sum(counts)
+
+    def samples(self):
+        for values, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield "_bucket", values, f'le="{_format_value(bound)}"', cumulative
+            yield "_sum", values, "", total
+            yield "_count", values, "", cumulative
+
+
+def render() -> str:
+    return "\n".join(metric.render() for metric in registry) + "\n"
+
+
+handler_latency = Histogram(
+    "musicbot_handler_latency_seconds", "Latency of the telegram update handlers.", ["handler"]
+)
+handler_errors = Counter(
+    "musicbot_handler_errors_total", "Handler calls which raised.", ["handler"]
+)
+scraper_latency = Histogram(
+    "musicbot_scraper_call_seconds",
+    "Latency of the cached scraper calls, by whether the cache had the value.",
+    ["function", "cache"],
+)
+upstream_requests = Counter(
+    "musicbot_upstream_requests_total", "Requests to upstream hosts by status.", ["host", "status"]
+)
+upstream_bytes = Counter(
+    "musicbot_upstream_bytes_total", "Bytes received from upstream hosts.", ["host", "kind"]
+)
+upstream_latency = Histogram(
+    "musicbot_upstream_fetch_seconds", "Latency of page fetches, retries included.", ["host"]
+)
+download_duration = Histogram(
+    "musicbot_download_seconds", "Duration of audio file downloads, cache hits excluded."
+)
+upload_duration = Histogram(
+    "musicbot_upload_seconds", "Duration of audio uploads to telegram.", ["mode"]
+)
+time_to_first_audio = Histogram(
+    "musicbot_time_to_first_audio_seconds", "From a song request to its first audio being sent."
+)
+
+
+def instrument_handler(handler):
+    """
+    Records the latency and errors of a telegram handler, sampled ones are profiled. What's
+    logged while handling an update carries its id as correlation_id, and the user's id.
+    """
+    @functools.wraps(handler)
+    async def wrapper(update, *args, **kwargs):
+        start = time.perf_counter()
+        user = getattr(update, "effective_user", None)
+        try:
+            with log_context(
+                correlation_id=getattr(update, "update_id", None),
+                user_id=user.id if user else None,
+            ):
+                if not PROFILE_SAMPLE_RATE:
+                    return await handler(update, *args, **kwargs)
+                with maybe_profile(handler.__name__):
+                    return await handler(update, *args, **kwargs)
+        except Exception:
+            handler_errors.inc(handler=handler.__name__)
+            raise
+        finally:
+            handler_latency.observe(time.perf_counter() - start, handler=handler.__name__)
+
+    return wrapper
+
+
+async def _metrics(request: "web.Request") -> "web.Response":
+    from aiohttp import web
+
+    return web.Response(text=render(), content_type="text/plain", charset="utf-8")
+
+
+async def start_metrics_server(host: str, port: int) -> Optional["web.AppRunner"]:
+    # aiohttp's server isn't imported unless metrics are served.
+    from aiohttp import web
+
+    app = web.Application()
+    app.router.add_get("/metrics", _metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError as error:
+        # metrics are no reason not to run the bot.
+        logger.error(f"Metrics endpoint couldn't listen on {host}:{port}: {error!r}")
+        await runner.cleanup()
+        return None
+    logger.info(f"Metrics are served on http://{host}:{port}/metrics")
+    return runner
+
+
+async def stop_metrics_server(runner: Optional["web.AppRunner"]) -> None:
+    if runner is not None:
+        await runner.cleanup()
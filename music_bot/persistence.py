@@ -0,0 +1,121 @@
+import asyncio
+import json
+import pickle
+from typing import Any, Dict, Optional, Tuple
+
+from telegram.ext import BasePersistence
+
+from music_bot.backends import Backend
+from music_bot.logger import logger
+
+USER, CHAT, BOT, CALLBACK = "user", "chat", "bot", "callback"
+
+
+class BackendPersistence(BasePersistence):
+    """
+    Keeps conversation states, user, chat, bot and callback data in a Backend, so a restart
+    resumes every conversation where it was. PTB hands the changed data over every
+    update_interval seconds, the changes of each round are written in a single transaction on a
+    worker thread, handling updates never waits for the disk.
+
+    With several worker processes every one of them writes the data of the users dispatched to
+    it, their user data and conversations. The chat, bot and callback data aren't used by the bot.
+    """
+
+    def __init__(self, backend: Backend, update_interval: float = 60):
+        super().__init__(update_interval=update_interval)
+        self.backend = backend
+        # (kind, key) -> pickled value, None to delete it. Written by the next flush.
+        self._pending: Dict[Tuple[str, str], Optional[bytes]] = dict()
+        self._flush_task: Optional[asyncio.Task] = None
+        self.stats = dict(flushes=0, written_rows=0)
+
+    def _load(self, kind: str) -> Dict[str, Any]:
+        return {key: pickle.loads(value) for key, value in self.backend.items(kind).items()}
+
+    def _write(self, kind: str, key: Any, value: Any = None, delete: bool = False) -> None:
+        # pickled right away, the handlers keep mutating the data after it's handed over.
+        self._pending[(kind, str(key))] = None if delete else pickle.dumps(value)
+        if self._flush_task is None:
+            # runs after the rest of this round's update_* calls, they're written together.
+            self._flush_task = asyncio.create_task(self._flush_pending())
+
+    async def _flush_pending(self) -> None:
+        try:
+            while self._pending:
+                pending, self._pending = self._pending, dict()
+                await asyncio.to_thread(self._commit, pending)
+        except Exception as error:
+            logger.error(f"Persisting the bot's data failed: {error!r}")
+        finally:
+            self._flush_task = None
+
+    def _commit(self, pending: Dict[Tuple[str, str], Optional[bytes]]) -> None:
+        self.backend.write(pending)
+        self.stats["flushes"] += 1
+        self.stats["written_rows"] += len(pending)
+
+    async def get_user_data(self) -> Dict[int, Dict[Any, Any]]:
+        return {int(key): value for key, value in self._load(USER).items()}
+
+    async def get_chat_data(self) -> Dict[int, Dict[Any, Any]]:
+        return {int(key): value for key, value in self._load(CHAT).items()}
+
+    async def get_bot_data(self) -> Dict[Any, Any]:
+        return self._load(BOT).get("", dict())
+
+    async def get_callback_data(self) -> Optional[Tuple]:
+        return self._load(CALLBACK).get("")
+
+    async def get_conversations(self, name: str) -> Dict[Tuple[int, ...], object]:
+        return {
+            tuple(json.loads(key)): state
+            for key, state in self._load(f"conversation:{name}").items()
+        }
+
+    async def update_conversation(
+        self, name: str, key: Tuple[int, ...], new_state: Optional[object]
+    ) -> None:
+        self._write(
+            f"conversation:{name}", json.dumps(list(key)), new_state, delete=new_state is None
+        )
+
+    async def update_user_data(self, user_id: int, data: Dict[Any, Any]) -> None:
+        self._write(USER, user_id, data)
+
+    async def update_chat_data(self, chat_id: int, data: Dict[Any, Any]) -> None:
+        self._write(CHAT, chat_id, data)
+
+    async def update_bot_data(self, data: Dict[Any, Any]) -> None:
+        self._write(BOT, "", data)
+
+    async def update_callback_data(self, data: Tuple) -> None:
+        self._write(CALLBACK, "", data)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._write(USER, user_id, delete=True)
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._write(CHAT, chat_id, delete=True)
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict[Any, Any]) -> None:
+        # updates are dispatched to the workers by user id, this process is the only writer of
+        # the user's data, the data in memory is always the latest.
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict[Any, Any]) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: Dict[Any, Any]) -> None:
+        pass
+
+    async def flush(self) -> None:
+        """
+        Writes what's left on shutdown.
+        """
+        if self._flush_task is not None:
+            await self._flush_task
+        if self._pending:
+            self._commit(self._pending)
+            self._pending = dict()
+        self.backend.close()
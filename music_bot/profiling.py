@@ -0,0 +1,74 @@
+"""
+Sampled profiling of the bot's handlers, and profiling of a scrape from the command line:
+
+    python -m music_bot.profiling "محمود کریمی" [--output profile.prof]
+"""
+import argparse
+import asyncio
+import cProfile
+import os
+import pstats
+import random
+import time
+from contextlib import contextmanager
+
+from music_bot.logger import logger
+from music_bot.settings import PROFILE_DIR, PROFILE_SAMPLE_RATE
+
+# cProfile profiles a whole thread, a single sample can be taken at a time.
+_profiling = False
+
+
+@contextmanager
+def maybe_profile(name: str, sample_rate: float = PROFILE_SAMPLE_RATE):
+    """
+    Profiles the block for a sample_rate fraction of the calls, dumping the stats into
+    PROFILE_DIR as <name>-<timestamp>.prof. Everything the event loop runs meanwhile is in
+    the profile too, not only the awaited handler.
+    """
+    global _profiling
+    if _profiling or not sample_rate or random.random() >= sample_rate:
+        yield
+        return
+    _profiling = True
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        _profiling = False
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        file_path = os.path.join(PROFILE_DIR, f"{name}-{time.time():.0f}.prof")
+        profile.dump_stats(file_path)
+        logger.info(f"Profile of {name} was written to {file_path}.")
+
+
+async def profile_artist_scrape(artist_name: str, output: str) -> int:
+    # imported here, the scraper opens its cache on import.
+    from music_bot.scrap.scraper import get_artist, all_artist_songs_paginated
+    from music_bot.utils.aioutils import close_session
+
+    try:
+        with cProfile.Profile() as profile:
+            artist = await get_artist(artist_name)
+            if not artist:
+                raise SystemExit(f"Artist {artist_name} wasn't found.")
+            pages = await all_artist_songs_paginated(artist)
+    finally:
+        await close_session()
+    stats = pstats.Stats(profile)
+    stats.sort_stats(pstats.SortKey.TIME)
+    stats.print_stats(30)
+    stats.dump_stats(output)
+    return len(pages)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("artist", help="name of the artist whose song pages are scraped")
+    parser.add_argument("--output", default="profile.prof", help="file to dump the stats to")
+    args = parser.parse_args()
+    start = time.perf_counter()
+    pages_count = asyncio.run(profile_artist_scrape(args.artist, args.output))
+    print(f"Downloaded {pages_count} pages in {time.perf_counter() - start:.2f} seconds.")
@@ -0,0 +1,203 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+from typing import Dict, Literal, Optional, Tuple
+
+from music_bot.logger import logger
+
+INDEX_FILE_NAME = ".audio_index.sqlite3"
+TEMP_FILE_SUFFIX = ".part"
+# seconds after which a temporary file is a leftover of an interrupted download, rather than one
+# another worker process is writing.
+STALE_TEMP_FILE_AGE = 3600
+# seconds between two writes of the files' usage to the index.
+USAGE_FLUSH_INTERVAL = 60
+
+
+class AudioStore:
+    """
+    Downloaded audio files of a directory, bounded by max_bytes. The least recently (lru) or the
+    least frequently (lfu) used files are evicted when it's full. Files are written to a temporary
+    file and renamed into place once complete, so a file in the store is always a complete one.
+    Sizes and usage are kept in an index, lookups don't touch the files themselves, and usage is
+    counted in memory and written to the index in batches: every USAGE_FLUSH_INTERVAL, before
+    evicting and on close.
+    The bot's worker processes share the directory and its index, which is what every one of them
+    goes by: a file another process evicted isn't returned, and max_bytes bounds them together.
+    Writing to the index may wait for another process's write, commit is called off the event
+    loop and the index's writes use a connection of their own, which lookups don't wait for.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, policy: Literal["lru", "lfu"] = "lru"):
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self.policy = policy
+        # file name -> (last used timestamp, hits) since the last flush.
+        self._usage: Dict[str, Tuple[float, int]] = dict()
+        self._flushed_at = time.monotonic()
+        os.makedirs(self.directory, exist_ok=True)
+        self._write_connection = self._connect()
+        # lookups of a process don't wait for the writes of another one.
+        self._write_connection.execute("PRAGMA journal_mode=WAL")
+        self._write_connection.execute(
+            "CREATE TABLE IF NOT EXISTS files (name TEXT PRIMARY KEY, size INTEGER, last_used REAL, hits INTEGER)"
+        )
+        self._write_connection.commit()
+        # writes of the threads commit is called from, one at a time.
+        self._write_lock = threading.Lock()
+        self._connection = self._connect()
+        with self._write_lock:
+            self._load_index()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(
+            os.path.join(self.directory, INDEX_FILE_NAME), check_same_thread=False, timeout=30
+        )
+
+    @property
+    def current_bytes(self) -> int:
+        """
+        Bytes stored by every process sharing the directory.
+        """
+        return self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM files").fetchone()[0]
+
+    def _load_index(self) -> None:
+        indexed_names = {name for name, in self._write_connection.execute("SELECT name FROM files")}
+        # files downloaded before the index existed are adopted, leftovers of interrupted downloads removed.
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.startswith(INDEX_FILE_NAME) or not entry.is_file():
+                    continue
+                if entry.name.endswith(TEMP_FILE_SUFFIX):
+                    if entry.stat().st_mtime < time.time() - STALE_TEMP_FILE_AGE:
+                        os.remove(entry.path)
+                elif entry.name not in indexed_names and entry.stat().st_size > 0:
+                    self._add(entry.name, entry.stat().st_size)
+                indexed_names.discard(entry.name)
+        # files removed by hand.
+        for name in indexed_names:
+            self._remove_from_index(name)
+        self._evict()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def get(self, name: str) -> Optional[str]:
+        """
+        Returns the path of a stored file and marks it as used, or None when it isn't stored.
+        """
+        if self.size(name) is None:
+            return None
+        _, hits = self._usage.get(name, (0, 0))
+        self._usage[name] = (time.time(), hits + 1)
+        return self.path(name)
+
+    def usage_flush_due(self) -> bool:
+        return bool(self._usage) and time.monotonic() - self._flushed_at > USAGE_FLUSH_INTERVAL
+
+    def take_usage(self) -> Dict[str, Tuple[float, int]]:
+        """
+        Returns the usage counted since the last flush, for write_usage, and starts counting anew.
+        """
+        usage, self._usage = self._usage, dict()
+        self._flushed_at = time.monotonic()
+        return usage
+
+    def write_usage(self, usage: Dict[str, Tuple[float, int]]) -> None:
+        """
+        Adds usage to the index. Safe to call from another thread, with a connection of its own.
+        """
+        if not usage:
+            return
+        connection = self._connect()
+        with closing(connection), connection:
+            connection.executemany(
+                "UPDATE files SET last_used = MAX(last_used, ?), hits = hits + ? WHERE name = ?",
+                [(last_used, hits, name) for name, (last_used, hits) in usage.items()],
+            )
+
+    def flush(self) -> None:
+        self.write_usage(self.take_usage())
+
+    def close(self) -> None:
+        self.flush()
+        self._connection.close()
+        with self._write_lock:
+            self._write_connection.close()
+
+    def size(self, name: str) -> Optional[int]:
+        row = self._connection.execute("SELECT size FROM files WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def __contains__(self, name: str) -> bool:
+        return self.size(name) is not None
+
+    def temp_path(self, name: str) -> str:
+        # unique, so concurrent downloads of the same file don't write to the same file.
+        return self.path(f"{name}.{uuid.uuid4().hex[:8]}{TEMP_FILE_SUFFIX}")
+
+    def commit(self, name: str, temp_path: str) -> str:
+        """
+        Atomically moves a completely written temporary file into the store, returns its path.
+        Waits for the index, called from a worker thread.
+        """
+        path = self.path(name)
+        os.replace(temp_path, path)
+        with self._write_lock:
+            self._add(name, os.path.getsize(path))
+            self._evict(keep=name)
+        return path
+
+    def discard(self, temp_path: str) -> None:
+        if os.path.isfile(temp_path):
+            os.remove(temp_path)
+
+    def remove(self, name: str) -> None:
+        with self._write_lock:
+            self._remove(name)
+
+    def _remove(self, name: str) -> None:
+        # out of the index first, no process returns the file once it's being removed.
+        self._remove_from_index(name)
+        try:
+            os.remove(self.path(name))
+        except FileNotFoundError:
+            # removed by another process.
+            pass
+
+    # the methods below are called with the write lock held.
+
+    def _add(self, name: str, size: int) -> None:
+        with self._write_connection:
+            self._write_connection.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)", (name, size, time.time(), 0)
+            )
+
+    def _remove_from_index(self, name: str) -> None:
+        with self._write_connection:
+            self._write_connection.execute("DELETE FROM files WHERE name = ?", (name,))
+
+    def _evict(self, keep: str = None) -> None:
+        current_bytes = self._write_connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM files"
+        ).fetchone()[0]
+        if current_bytes <= self.max_bytes:
+            return
+        # the files are picked by this process's latest usage too, other processes' is written
+        # every USAGE_FLUSH_INTERVAL.
+        self.flush()
+        order = "hits, last_used" if self.policy == "lfu" else "last_used"
+        rows = self._write_connection.execute(
+            f"SELECT name, size FROM files ORDER BY {order}"
+        ).fetchall()
+        for name, size in rows:
+            if current_bytes <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            logger.info(f"Audio store is full, evicting {name}.")
+            self._remove(name)
+            current_bytes -= size
@@ -0,0 +1,163 @@
+import pickle
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from music_bot.backends import Backend
+from music_bot.logger import logger
+
+MISSING = object()
+NAMESPACE = "scrape_cache"
+
+
+class ScrapeCache:
+    """
+    Two tier cache for parsed scraping results: an in-memory LRU bounded by the pickled size
+    of its values, backed by a Backend which survives restarts and is shared with the bot's other
+    worker processes.
+
+    Every key is a tuple whose first item is its key type (usually the cached function's name),
+    which selects the ttl of the entry. Entries older than their ttl are still served as stale
+    for stale_ttl more seconds, while the caller refreshes them. Fully expired entries are kept
+    until they're replaced or evicted, last_known still returns them when the site is down.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        backend: Optional[Backend] = None,
+        ttls: Dict[str, float] = None,
+        default_ttl: float = 86400,
+        stale_ttl: float = 0,
+    ):
+        self.max_bytes = max_bytes
+        self.ttls = ttls or {}
+        self.default_ttl = default_ttl
+        self.stale_ttl = stale_ttl
+        self.current_bytes = 0
+        # key -> (value, size, stored_at)
+        self._memory: "OrderedDict[Tuple, Tuple[Any, int, float]]" = OrderedDict()
+        self.stats = dict(
+            hits=0, stale_hits=0, disk_hits=0, misses=0, evictions=0, last_known_hits=0
+        )
+        self.backend = backend
+
+    def ttl(self, key: Tuple) -> float:
+        return self.ttls.get(key[0], self.default_ttl)
+
+    def lookup(self, key: Tuple) -> Tuple[Any, bool]:
+        """
+        Returns (value, is_stale), value is MISSING when the key isn't cached or has fully expired.
+        """
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+            value, _, stored_at = entry
+        else:
+            value, stored_at = self._disk_get(key)
+            if value is MISSING:
+                self.stats["misses"] += 1
+                return MISSING, False
+            self.stats["disk_hits"] += 1
+        age = time.time() - stored_at
+        if age < self.ttl(key):
+            self.stats["hits"] += 1
+            return value, False
+        if age < self.ttl(key) + self.stale_ttl:
+            self.stats["stale_hits"] += 1
+            return value, True
+        self.stats["misses"] += 1
+        return MISSING, False
+
+    def last_known(self, key: Tuple) -> Any:
+        """
+        Returns the value of the key however old it is, MISSING when it was never cached.
+        """
+        entry = self._memory.get(key)
+        value = entry[0] if entry is not None else self._disk_get(key)[0]
+        if value is not MISSING:
+            self.stats["last_known_hits"] += 1
+        return value
+
+    def get(self, key: Tuple, default: Any = None) -> Any:
+        value, _ = self.lookup(key)
+        return default if value is MISSING else value
+
+    def set(self, key: Tuple, value: Any) -> None:
+        self.set_many({key: value})
+
+    def set_many(self, values: Dict[Tuple, Any], stored_at: Dict[Tuple, float] = None) -> None:
+        """
+        Sets every value with a single write to the backend. stored_at gives the time some of
+        them were fetched at, for values older than now.
+        """
+        changes = dict()
+        for key, value in values.items():
+            key_stored_at = (stored_at or {}).get(key) or time.time()
+            data = pickle.dumps((value, key_stored_at))
+            self._memory_set(key, value, len(data), key_stored_at)
+            changes[(NAMESPACE, repr(key))] = data
+        if self.backend:
+            self.backend.write(changes)
+
+    def delete(self, key: Tuple) -> None:
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry[1]
+        if self.backend:
+            self.backend.delete(NAMESPACE, repr(key))
+
+    def clear(self) -> None:
+        self._memory.clear()
+        self.current_bytes = 0
+        if self.backend:
+            self.backend.clear(NAMESPACE)
+
+    def close(self) -> None:
+        if self.backend:
+            self.backend.close()
+
+    def contains(self, key: Tuple) -> bool:
+        """
+        Whether the key is cached, without counting a hit or a miss, loading the value or marking
+        it as used. Only the memory tier knows how old an entry is, one only the backend has may
+        have fully expired.
+        """
+        entry = self._memory.get(key)
+        if entry is not None:
+            return time.time() - entry[2] < self.ttl(key) + self.stale_ttl
+        return bool(self.backend) and self.backend.contains(NAMESPACE, repr(key))
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.contains(key)
+
+    def __len__(self) -> int:
+        return len(self._memory)
+
+    def _memory_set(self, key: Tuple, value: Any, size: int, stored_at: float) -> None:
+        old_entry = self._memory.pop(key, None)
+        if old_entry is not None:
+            self.current_bytes -= old_entry[1]
+        if size > self.max_bytes:
+            logger.info(f"Cache value of {key[0]} is larger than the cache itself, not keeping it in memory.")
+            return
+        self._memory[key] = (value, size, stored_at)
+        self.current_bytes += size
+        while self.current_bytes > self.max_bytes:
+            _, (_, evicted_size, _) = self._memory.popitem(last=False)
+            self.current_bytes -= evicted_size
+            self.stats["evictions"] += 1
+
+    def _disk_get(self, key: Tuple) -> Tuple[Any, float]:
+        data = self.backend.get(NAMESPACE, repr(key)) if self.backend else None
+        if data is None:
+            return MISSING, 0
+        try:
+            value, stored_at = pickle.loads(data)
+        except Exception as error:
+            # written by an older version of the models, it's refetched.
+            logger.warning(f"Cache entry {key} can't be loaded ({error!r}), dropping it.")
+            self.delete(key)
+            return MISSING, 0
+        self._memory_set(key, value, len(data), stored_at)
+        return value, stored_at
@@ -0,0 +1,110 @@
+import asyncio
+import time
+from typing import List
+
+import music_bot.settings as settings
+from music_bot.logger import logger
+from music_bot.scrap.models import Artist, Song
+from music_bot.scrap.scraper import (
+    _artist_page,
+    get_all_artists,
+    all_artist_songs_paginated,
+    index_artist_songs,
+)
+from music_bot.scrap.snapshot import save_snapshot
+from music_bot.utils.utils import paginate_list
+
+
+class RequestPacer:
+    """
+    Spaces out requests so that at most one starts every interval seconds.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._lock = asyncio.Lock()
+        self._last_request = 0.0
+
+    async def wait(self) -> None:
+        async with self._lock:
+            delay = self._last_request + self.interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._last_request = time.monotonic()
+
+
+async def refresh_artist_songs(artist: Artist, pacer: RequestPacer) -> List[List[Song]]:
+    """
+    Refreshes the cached paginated songs of an artist. When the artist is already cached,
+    paging stops at the first already known song, since the site lists the newest songs first.
+    """
+    known_pages = all_artist_songs_paginated.cached_value(artist)
+    if not known_pages:
+        await pacer.wait()
+        first_page_songs, last_page_number = await _artist_page(artist)
+        pages = [first_page_songs]
+        for page in range(2, (last_page_number or 1) + 1):
+            await pacer.wait()
+            songs, _ = await _artist_page(artist, page)
+            pages.append(songs)
+        all_artist_songs_paginated.set_cached(pages, artist)
+        index_artist_songs(pages)
+        logger.debug(f"Crawler fetched {len(pages)} pages of {artist.name}.")
+        return pages
+    known_ids = {song.id for page in known_pages for song in page}
+    new_songs = []
+    page, last_page_number = 1, 1
+    # the songs of a page on the site, as a full first page shows.
+    site_page_size = 0
+    reached_known_song = False
+    while page <= last_page_number and not reached_known_song:
+        await pacer.wait()
+        songs, last_page_number = await _artist_page(artist, page)
+        last_page_number = last_page_number or 1
+        if page == 1 and last_page_number > 1:
+            site_page_size = len(songs)
+        for song in songs:
+            if song.id in known_ids:
+                reached_known_song = True
+                break
+            new_songs.append(song)
+        page += 1
+    if new_songs:
+        known_songs = [song for page_songs in known_pages for song in page_songs]
+        songs = new_songs + known_songs
+        # laid out like the site's pages, artist_songs_page may go from ones to the others.
+        # A single page, or an empty first one, holds every song.
+        pages = paginate_list(songs, page_size=site_page_size or len(songs))
+        logger.info(f"Crawler found {len(new_songs)} new songs of {artist.name}.")
+    else:
+        pages = known_pages
+    # setting it even without new songs renews the entry's ttl.
+    all_artist_songs_paginated.set_cached(pages, artist)
+    index_artist_songs(pages)
+    return pages
+
+
+async def crawl(context=None) -> None:
+    """
+    Pre-warms the artists list and every artist's songs, signature matches a JobQueue callback.
+    """
+    start = time.perf_counter()
+    pacer = RequestPacer(settings.CRAWLER_REQUEST_INTERVAL)
+    semaphore = asyncio.Semaphore(settings.CRAWLER_CONCURRENCY)
+    artists = await get_all_artists.refresh()
+
+    async def refresh_one(artist: Artist):
+        async with semaphore:
+            try:
+                await refresh_artist_songs(artist, pacer)
+            except Exception:
+                logger.exception(f"Crawler failed to refresh {artist.name}.")
+
+    await asyncio.gather(*[refresh_one(artist) for artist in artists])
+    elapsed = time.perf_counter() - start
+    logger.info(
+        f"Crawler refreshed {len(artists)} artists in {elapsed:.1f}s.",
+        extra={"artists": len(artists), "duration_s": elapsed},
+    )
+    # the next dyno starts with what was just crawled.
+    await save_snapshot()
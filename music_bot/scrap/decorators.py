@@ -1,25 +1,114 @@
+import asyncio
 import functools
+import time
+from typing import Dict, Tuple
+
+from music_bot.logger import logger
+from music_bot.metrics import scraper_latency
+from music_bot.scrap.cache import MISSING, ScrapeCache
+from music_bot.scrap.exceptions import CircuitOpenError
 from music_bot.scrap.models import Song, Artist
 
 
-def music_cacher(cache):
+def _cache_key(key_type: str, args, kwargs) -> Tuple:
+    # Song and Artist instances are identified by their url, names aren't unique.
+    args_copy = [
+        item.url if isinstance(item, (Artist, Song)) else item for item in args
+    ]
+    kwargs_copy = {
+        key: value.url if isinstance(value, (Artist, Song)) else value
+        for key, value in kwargs.items()
+    }
+    return (key_type,) + tuple(args_copy) + tuple(kwargs_copy.items())
+
+
+def music_cacher(cache: ScrapeCache, key_type: str = None):
     """
-    Caching decorator for Song and Artist instances.
+    Caching decorator for Song and Artist instances, a thin front end to ScrapeCache.
+    Stale values are returned at once and refreshed in the background, concurrent calls
+    with the same cache key share a single call of the decorated function. While the site's
+    circuit is open, expired values are returned rather than failing.
     """
     def decorator_cache(func):
+        type_ = key_type or func.__name__
+        in_flight: Dict[Tuple, asyncio.Task] = dict()
+
+        async def load(cache_key, args, kwargs):
+            value = await func(*args, **kwargs)
+            cache.set(cache_key, value)
+            return value
+
+        def on_done(cache_key, task: asyncio.Task):
+            in_flight.pop(cache_key, None)
+            # retrieving the exception keeps asyncio quiet when every caller was cancelled.
+            if not task.cancelled() and isinstance(task.exception(), CircuitOpenError):
+                logger.warning(f"Loading {cache_key} was skipped: {task.exception()}")
+            elif not task.cancelled() and task.exception():
+                logger.error(f"Loading {cache_key} failed: {task.exception()!r}")
+
+        def load_once(cache_key, args, kwargs) -> asyncio.Task:
+            task = in_flight.get(cache_key)
+            if task is None:
+                task = asyncio.create_task(load(cache_key, args, kwargs))
+                in_flight[cache_key] = task
+                task.add_done_callback(functools.partial(on_done, cache_key))
+            return task
+
+        async def cached_call(cache_key, args, kwargs):
+            """
+            Returns the value and how it was served: hit, stale, miss or last_known.
+            """
+            value, is_stale = cache.lookup(cache_key)
+            if value is MISSING:
+                try:
+                    # shielded, so a cancelled caller doesn't cancel the load for the others.
+                    return await asyncio.shield(load_once(cache_key, args, kwargs)), "miss"
+                except CircuitOpenError:
+                    value = cache.last_known(cache_key)
+                    if value is MISSING:
+                        raise
+                    logger.warning(f"Site is unavailable, serving expired {cache_key}.")
+                    return value, "last_known"
+            if is_stale:
+                load_once(cache_key, args, kwargs)
+                return value, "stale"
+            return value, "hit"
+
         @functools.wraps(func)
         async def wrapper_cache(*args, **kwargs):
-            kwargs_copy = dict(kwargs) # kwargs_copy is kwargs -> False
-            args_copy = list(args)
-            for i, item in enumerate(args_copy):
-                if isinstance(item, Artist) or isinstance(item, Song):
-                    args_copy[i] = item.name
-            for key, value in kwargs_copy.items():
-                if isinstance(value, Artist) or isinstance(value, Song):
-                    kwargs_copy[key] = value.name
-            cache_key = tuple(args_copy) + tuple(kwargs_copy.items())
-            if cache_key not in cache:
-                cache[cache_key] =  await func(*args, **kwargs)
-            return cache[cache_key]
+            start = time.perf_counter()
+            served = "error"
+            try:
+                value, served = await cached_call(_cache_key(type_, args, kwargs), args, kwargs)
+                return value
+            finally:
+                scraper_latency.observe(time.perf_counter() - start, function=type_, cache=served)
+
+        def is_cached(*args, **kwargs) -> bool:
+            return cache.contains(_cache_key(type_, args, kwargs))
+
+        def cached_value(*args, **kwargs):
+            return cache.get(_cache_key(type_, args, kwargs))
+
+        def last_known_value(*args, **kwargs):
+            value = cache.last_known(_cache_key(type_, args, kwargs))
+            return None if value is MISSING else value
+
+        def set_cached(value, *args, **kwargs) -> None:
+            cache.set(_cache_key(type_, args, kwargs), value)
+
+        def cache_key(*args, **kwargs) -> Tuple:
+            return _cache_key(type_, args, kwargs)
+
+        async def refresh(*args, **kwargs):
+            cache_key = _cache_key(type_, args, kwargs)
+            return await asyncio.shield(load_once(cache_key, args, kwargs))
+
+        wrapper_cache.is_cached = is_cached
+        wrapper_cache.cached_value = cached_value
+        wrapper_cache.last_known_value = last_known_value
+        wrapper_cache.set_cached = set_cached
+        wrapper_cache.cache_key = cache_key
+        wrapper_cache.refresh = refresh
         return wrapper_cache
-    return decorator_cache
\ No newline at end of file
+    return decorator_cache
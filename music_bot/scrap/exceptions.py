@@ -0,0 +1,60 @@
+class SiteError(Exception):
+    """
+    Base class of the errors raised when music-fa.com or its audio hosts fail, the user is told
+    to try again later.
+    """
+
+
+class DownloadError(SiteError):
+    """
+    Base class of the errors raised while downloading an audio file.
+    """
+
+    def __init__(self, url: str, message: str = ""):
+        self.url = url
+        super().__init__(f"{message} ({url})" if message else url)
+
+
+class IncompleteDownloadError(DownloadError):
+    def __init__(self, url: str, expected_bytes: int, received_bytes: int):
+        self.expected_bytes = expected_bytes
+        self.received_bytes = received_bytes
+        super().__init__(url, f"Received {received_bytes} of {expected_bytes} bytes")
+
+
+class DownloadHTTPError(DownloadError):
+    """
+    The server answered with an error status which isn't worth retrying.
+    """
+
+    def __init__(self, url: str, status: int):
+        self.status = status
+        super().__init__(url, f"HTTP {status}")
+
+
+class DownloadRetriesExhaustedError(DownloadError):
+    def __init__(self, url: str, attempts: int, last_error: BaseException):
+        self.attempts = attempts
+        self.last_error = last_error
+        super().__init__(url, f"Failed after {attempts} attempts, last error: {last_error!r}")
+
+
+class NoAudioLinksError(SiteError):
+    """
+    The song's page has no audio links, e.g. it was taken down or the site's layout changed.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        super().__init__(f"No audio links were found ({url})")
+
+
+class CircuitOpenError(SiteError):
+    """
+    Requests to the host are rejected for a while, it has been failing.
+    """
+
+    def __init__(self, host: str, retry_after: float):
+        self.host = host
+        self.retry_after = retry_after
+        super().__init__(f"Circuit of {host} is open, retry after {retry_after:.1f}s")
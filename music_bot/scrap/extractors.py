@@ -0,0 +1,152 @@
+"""
+Extraction of plain data out of music-fa.com pages, with interchangeable parsing backends.
+
+Every extractor returns:
+    artists(html) -> [(name, url), ...]
+    artist_page(html) -> ([(song_id, song_name, song_url), ...], last_page_number or None)
+    audio_links(html) -> [url, ...]
+"""
+import importlib.util
+from typing import Callable, Dict, List, Optional, Tuple
+
+from music_bot.utils.utils import HTMLTagClass, last_page_number_extractor
+
+# the parsers are imported by the first extractor created, the bot starts without them.
+# lxml is optional, html.parser is used without it.
+HAS_LXML = importlib.util.find_spec("lxml") is not None
+
+SONG_TITLE_PREFIX = "دانلود آهنگ "
+ArtistRow = Tuple[str, str]
+SongRow = Tuple[str, str, str]
+
+
+def _song_row(href: str, title: str) -> SongRow:
+    # song url sample: https://music-fa.com/download-song/66342/
+    return href.split("/")[-2], title.replace(SONG_TITLE_PREFIX, ""), href
+
+
+def _last_page_number(last_page_url: str) -> int:
+    return int(last_page_url.split("/")[-2])
+
+
+class SoupExtractor:
+    """
+    Parses whole pages with BeautifulSoup, the reference implementation.
+    """
+
+    name = "soup"
+
+    def __init__(self, parser: str = "html.parser"):
+        from bs4 import BeautifulSoup
+
+        self.parser = parser
+        self._soup = BeautifulSoup
+
+    def artists(self, html: str) -> List[ArtistRow]:
+        bs = self._soup(html, self.parser)
+        artists = bs.find("aside", class_=HTMLTagClass.ARTISTS.value).find_all("li")
+        return [(artist.text, artist.a.attrs["href"]) for artist in artists]
+
+    def artist_page(self, html: str) -> Tuple[List[SongRow], Optional[int]]:
+        bs = self._soup(html, self.parser)
+        songs = [
+            _song_row(song.a.attrs["href"], song.a.attrs["title"])
+            for song in bs.find_all("article")
+        ]
+        return songs, last_page_number_extractor(bs)
+
+    def audio_links(self, html: str) -> List[str]:
+        bs = self._soup(html, self.parser)
+        song_cover = bs.find("div", class_=HTMLTagClass.SONG_COVER.value)
+        return [a_tag.attrs["href"] for a_tag in song_cover.find_all("a")]
+
+
+class StrainedSoupExtractor(SoupExtractor):
+    """
+    BeautifulSoup, but only the relevant subtrees of a page are built.
+    """
+
+    name = "strained_soup"
+
+    def __init__(self, parser: str = "lxml" if HAS_LXML else "html.parser"):
+        from bs4 import SoupStrainer
+
+        super().__init__(parser)
+        self._artists_only = SoupStrainer("aside", class_=HTMLTagClass.ARTISTS.value)
+        self._songs_only = SoupStrainer("article")
+        self._page_indexes_only = SoupStrainer("div", class_=HTMLTagClass.PAGE_INDEXES.value)
+        self._song_cover_only = SoupStrainer("div", class_=HTMLTagClass.SONG_COVER.value)
+
+    def artists(self, html: str) -> List[ArtistRow]:
+        bs = self._soup(html, self.parser, parse_only=self._artists_only)
+        return [(artist.text, artist.a.attrs["href"]) for artist in bs.find_all("li")]
+
+    def artist_page(self, html: str) -> Tuple[List[SongRow], Optional[int]]:
+        songs_bs = self._soup(html, self.parser, parse_only=self._songs_only)
+        songs = [
+            _song_row(song.a.attrs["href"], song.a.attrs["title"])
+            for song in songs_bs.find_all("article")
+        ]
+        indexes_bs = self._soup(html, self.parser, parse_only=self._page_indexes_only)
+        return songs, last_page_number_extractor(indexes_bs)
+
+    def audio_links(self, html: str) -> List[str]:
+        bs = self._soup(html, self.parser, parse_only=self._song_cover_only)
+        return [a_tag.attrs["href"] for a_tag in bs.find_all("a")]
+
+
+class LxmlExtractor:
+    """
+    Uses lxml's C parser and XPath directly, without building a BeautifulSoup tree.
+    """
+
+    name = "lxml"
+
+    def __init__(self):
+        import lxml.html
+
+        self._fromstring = lxml.html.fromstring
+
+    @staticmethod
+    def _has_class(class_: str) -> str:
+        # same as BeautifulSoup's class_ matching of a single class.
+        return f"contains(concat(' ', normalize-space(@class), ' '), ' {class_} ')"
+
+    def artists(self, html: str) -> List[ArtistRow]:
+        tree = self._fromstring(html)
+        artists = tree.xpath(f"(//aside[{self._has_class(HTMLTagClass.ARTISTS.value)}])[1]//li")
+        return [
+            (artist.text_content(), artist.xpath(".//a")[0].get("href")) for artist in artists
+        ]
+
+    def artist_page(self, html: str) -> Tuple[List[SongRow], Optional[int]]:
+        tree = self._fromstring(html)
+        songs = []
+        for article in tree.iter("article"):
+            a_tag = next(article.iter("a"))
+            songs.append(_song_row(a_tag.get("href"), a_tag.get("title")))
+        page_indexes = tree.xpath(
+            f"(//div[@class='{HTMLTagClass.PAGE_INDEXES.value}'])[1]//a/@href"
+        )
+        return songs, _last_page_number(page_indexes[-1]) if page_indexes else None
+
+    def audio_links(self, html: str) -> List[str]:
+        tree = self._fromstring(html)
+        return tree.xpath(f"(//div[{self._has_class(HTMLTagClass.SONG_COVER.value)}])[1]//a/@href")
+
+
+EXTRACTORS: Dict[str, Callable] = {
+    SoupExtractor.name: SoupExtractor,
+    StrainedSoupExtractor.name: StrainedSoupExtractor,
+}
+if HAS_LXML:
+    EXTRACTORS[LxmlExtractor.name] = LxmlExtractor
+
+
+def get_extractor(name: str = None):
+    """
+    Returns an instance of the named extractor, or the fastest available one.
+    """
+    if name is None:
+        name = LxmlExtractor.name if HAS_LXML else StrainedSoupExtractor.name
+    return EXTRACTORS[name]()
@@ -1,23 +1,60 @@
-from typing import List
 from dataclasses import dataclass, field
+from typing import Dict, Optional
 
 
-@dataclass
-class Song:
-    id: int
+@dataclass(frozen=True, slots=True)
+class Artist:
     name: str
     url: str
-    artist: 'Artist' = None
 
     def __repr__(self) -> str:
-        return f"{self.__class__.__name__}(name: '{self.name}', id: {self.id})"
+        return f"{self.__class__.__name__}(\"{self.name}\")"
 
+    def __reduce__(self):
+        # unpickled artists (e.g. loaded from the scrape cache) are the canonical ones too.
+        return intern_artist, (self.name, self.url)
 
-@dataclass
-class Artist:
+
+@dataclass(frozen=True, slots=True)
+class Song:
+    id: int
     name: str
     url: str
-    songs: List[Song] = field(default_factory=list)
+    artist: Optional[Artist] = field(default=None, compare=False)
 
     def __repr__(self) -> str:
-        return f"{self.__class__.__name__}(\"{self.name}\")"
+        return f"{self.__class__.__name__}(name: '{self.name}', id: {self.id})"
+
+    def __reduce__(self):
+        return intern_song, (self.id, self.name, self.url, self.artist)
+
+
+# the canonical instances, lists of artists and songs hold references to these.
+artists_by_url: Dict[str, Artist] = dict()
+songs_by_id: Dict[int, Song] = dict()
+
+
+def intern_artist(name: str, url: str) -> Artist:
+    """
+    Returns the single Artist instance of url, a new one only when the artist was renamed.
+    """
+    artist = artists_by_url.get(url)
+    if artist is None or artist.name != name:
+        artist = artists_by_url[url] = Artist(name, url)
+    return artist
+
+
+def intern_song(id_: int, name: str, url: str, artist: Optional[Artist] = None) -> Song:
+    """
+    Returns the single Song instance of id_, a new one only when the song has changed.
+    """
+    song = songs_by_id.get(id_)
+    if song is not None and artist is None:
+        artist = song.artist
+    if song is None or (song.name, song.url) != (name, url) or song.artist is not artist:
+        song = songs_by_id[id_] = Song(id_, name, url, artist)
+    return song
+
+
+def get_song(id_: int) -> Optional[Song]:
+    return songs_by_id.get(id_)
@@ -1,131 +1,430 @@
+import functools
+import hashlib
 import os
-from typing import Dict, List, BinaryIO, Literal, Optional
-from urllib import response
-from cachetools import TTLCache
+import time
+from typing import Callable, Dict, List, Literal, Optional, Tuple
 import asyncio
 
 
-import requests
-from aiohttp import ClientSession
-from bs4 import BeautifulSoup
 
 import music_bot.settings as settings
+from music_bot.backends import WriteBehindBackend, open_backend
 from music_bot.logger import logger
-from music_bot.scrap.models import Artist, Song
+from music_bot.metrics import Gauge, download_duration
+from music_bot.scrap.models import Artist, Song, get_song, intern_artist, intern_song
+from music_bot.scrap.audio_store import AudioStore
+from music_bot.scrap.cache import ScrapeCache
 from music_bot.scrap.decorators import music_cacher
-from music_bot.utils.aioutils import fetch
-from music_bot.utils.utils import HTMLTagClass, last_page_number_extractor
+from music_bot.scrap.exceptions import NoAudioLinksError
+from music_bot.scrap.extractors import get_extractor
+from music_bot.utils.aioutils import fetch, download_file
+from music_bot.utils.search import EXACT_MATCH_SCORE, PREFIX_MATCH_SCORE, SearchIndex
 
-cache = TTLCache(maxsize=80, ttl=172800)
+cache = ScrapeCache(
+    max_bytes=settings.SCRAPE_CACHE_MAX_BYTES,
+    backend=WriteBehindBackend(open_backend(settings.SCRAPE_CACHE_DB)),
+    ttls=settings.SCRAPE_CACHE_TTLS,
+    stale_ttl=settings.SCRAPE_CACHE_STALE_TTL,
+)
+artist_index = SearchIndex()
+# filled as artists' songs are fetched, keyed by the song's id.
+song_index = SearchIndex()
+# the artist list artist_index was last filled from.
+indexed_artists: Optional[List[Artist]] = None
+# artist_id -> artist, of every indexed artist.
+artists_by_id: Dict[str, Artist] = dict()
+prefetch_tasks = set()
+# directory -> its store, SAVE_DIR's and any other directory songs are downloaded to.
+audio_stores: Dict[str, AudioStore] = dict()
+# shared between every download_song call, so concurrent users are bounded together.
+download_semaphore = asyncio.Semaphore(settings.MAX_CONCURRENT_DOWNLOADS)
+
+
+@functools.lru_cache(maxsize=None)
+def html_extractor():
+    """
+    The extractor of every scraped page, created by the first scrape: the bot answers from the
+    cache without importing any html parser.
+    """
+    return get_extractor(settings.HTML_EXTRACTOR)
+
+
+def cache_hit_ratio() -> float:
+    lookups = cache.stats["hits"] + cache.stats["stale_hits"] + cache.stats["misses"]
+    return (cache.stats["hits"] + cache.stats["stale_hits"]) / lookups if lookups else 0.0
+
+
+Gauge(
+    "musicbot_scrape_cache_events_total",
+    "Lookups, evictions and expired values served by the scrape cache.",
+    ["event"],
+    function=lambda: {(event,): count for event, count in cache.stats.items()},
+    type_="counter",
+)
+Gauge(
+    "musicbot_scrape_cache_hit_ratio",
+    "Fresh and stale hits of all the scrape cache's lookups.",
+    function=cache_hit_ratio,
+)
+Gauge(
+    "musicbot_scrape_cache_bytes",
+    "Bytes held by the scrape cache in memory.",
+    function=lambda: cache.current_bytes,
+)
 
 
 @music_cacher(cache)
 async def get_all_artists() -> List[Artist]:
-    async with ClientSession() as session:
-        response = await fetch(session, settings.BASE_URL)
-        bs = BeautifulSoup(response, "html.parser")
-    artists = bs.find("aside", class_=HTMLTagClass.ARTISTS.value).find_all("li")
-    return [Artist(artist.text, artist.a.attrs["href"]) for artist in artists]
+    response = await fetch(settings.BASE_URL)
+    return [intern_artist(name, url) for name, url in html_extractor().artists(response)]
 
 
-async def get_artist(artist: str) -> Artist:
+def index_artists(artists: List[Artist]) -> None:
+    global indexed_artists
+    # the same list is returned until the cache entry is refreshed, it's indexed only once.
+    if artists is not indexed_artists:
+        artist_index.add_many([(artist.name, artist, artist.url) for artist in artists])
+        for artist in artists:
+            artist_id(artist)
+        indexed_artists = artists
+
+
+async def search_artists(name: str, limit: int = 10) -> List[Artist]:
+    index_artists(await get_all_artists())
+    return artist_index.search(name, limit)
+
+
+async def artists_page(page: int, page_size: int = 10) -> Tuple[List[Artist], int]:
+    """
+    Returns the artists of a single page of the artist list and the page count.
+    """
     all_artists = await get_all_artists()
-    for arti in all_artists:
-        if arti.name == artist:
-            return arti
-    return None
+    index_artists(all_artists)
+    page_count = max(1, -(-len(all_artists) // page_size))
+    return all_artists[(page - 1) * page_size : page * page_size], page_count
 
 
-@music_cacher(cache)
-async def _artist_bs(artist: Artist, page: int = 1) -> BeautifulSoup:
+def artist_id(artist: Artist) -> str:
+    """
+    A compact id of the artist for callback data, derived from its url: the same in every worker
+    process and after a restart, whatever order the artists were indexed in.
+    """
+    id_ = hashlib.blake2b(artist.url.encode(), digest_size=6).hexdigest()
+    artists_by_id.setdefault(id_, artist)
+    return id_
+
+
+def get_artist_by_id(id_: str) -> Optional[Artist]:
+    """
+    Returns None for an artist which isn't in the artist list anymore, or not yet after a restart.
+    """
+    return artists_by_id.get(id_)
+
+
+def get_song_by_id(song_id: int) -> Song:
+    song = get_song(song_id)
+    if song is None:
+        # a song of a keyboard sent before a restart, whose page isn't loaded yet. A song page
+        # is identified by its id alone, the name is only known once the page is fetched.
+        song = intern_song(song_id, str(song_id), f"{settings.BASE_DOWNLOAD_URL}{song_id}/")
+    return song
+
+
+def warm_indexes() -> None:
+    """
+    Fills the artist index from the cached artist list, however old, so the artists of keyboards
+    sent before a restart are found by their ids.
+    """
+    artists = get_all_artists.last_known_value()
+    if artists:
+        index_artists(artists)
+
+
+async def get_artist(artist: str) -> Artist:
+    """
+    Returns the artist whose name matches the given name, ignoring persian character forms and spacing.
+    """
+    index_artists(await get_all_artists())
+    matches = artist_index.search_with_scores(artist, limit=1, min_score=EXACT_MATCH_SCORE)
+    return matches[0][0] if matches else None
+
+
+def index_artist_songs(paginated_songs: List[List[Song]]) -> None:
+    song_index.add_many([(song.name, song, song.id) for page in paginated_songs for song in page])
+
+
+def search_songs(query: str, limit: int = 10) -> List[Song]:
+    """
+    Searches the songs of every artist whose songs were already fetched, doesn't scrape.
+    """
+    return song_index.search(query, limit)
+
+
+def cached_artist_songs(artist: Artist) -> List[Song]:
+    """
+    Returns the songs of the artist known without scraping: of every page when they're all
+    cached, of the first page otherwise.
+    """
+    paginated_songs = all_artist_songs_paginated.last_known_value(artist)
+    if paginated_songs:
+        return [song for page in paginated_songs for song in page]
+    return get_artist_page_songs.last_known_value(artist, 1) or []
+
+
+def search_catalog(query: str, limit: int = 10) -> List[Song]:
+    """
+    Searches the songs already fetched, then the known songs of the artist matching query.
+    Doesn't scrape, fast enough to run on every keystroke.
+    """
+    songs = search_songs(query, limit)
+    artists = artist_index.search_with_scores(query, limit=1, min_score=PREFIX_MATCH_SCORE)
+    if artists:
+        songs.extend(cached_artist_songs(artists[0][0]))
+    return list(dict.fromkeys(songs))[:limit]
+
+
+async def _artist_page(artist: Artist, page: int = 1) -> Tuple[List[Song], Optional[int]]:
+    """
+    Returns the songs of an artist page and the artist's last page number.
+    """
     url = artist.url
-    async with ClientSession() as session:
-        if page == 1:
-            response = await fetch(session, url)
-        else:
-            response = await fetch(session, url=url + f"/page/{page}")
-    bs = BeautifulSoup(response, "html.parser")
-    return bs
+    if page == 1:
+        response = await fetch(url)
+    else:
+        response = await fetch(url + f"/page/{page}")
+    song_rows, last_page_number = html_extractor().artist_page(response)
+    songs = [intern_song(int(id_), name, url, artist) for id_, name, url in song_rows]
+    return songs, last_page_number
 
 
+@music_cacher(cache)
 async def get_artist_page_songs(artist: Artist, page: int = 1) -> List[Song]:
-    bs = await _artist_bs(artist, page)
-    return [
-        Song(
-            id=song.a.attrs["href"].split("/")[-2],
-            name=song.a.attrs["title"].replace("دانلود آهنگ ", ""),
-            url=song.a.attrs["href"],
-        )
-        for song in bs.find_all("article")
-    ]
+    songs, last_page_number = await _artist_page(artist, page)
+    if page == 1:
+        artist_page_count.set_cached(last_page_number or 1, artist)
+    index_artist_songs([songs])
+    return songs
+
+
+@music_cacher(cache)
+async def artist_page_count(artist: Artist) -> int:
+    songs, last_page_number = await _artist_page(artist)
+    # the first page is fetched anyway, keeping it saves a request when it's shown.
+    get_artist_page_songs.set_cached(songs, artist, 1)
+    index_artist_songs([songs])
+    return last_page_number or 1
+
+
+def is_artist_page_cached(artist: Artist, page: int) -> bool:
+    return all_artist_songs_paginated.is_cached(artist) or (
+        artist_page_count.is_cached(artist) and get_artist_page_songs.is_cached(artist, page)
+    )
+
+
+async def artist_songs_page(artist: Artist, page: int = 1) -> Tuple[List[Song], int]:
+    """
+    Returns the songs of a single page of an artist and the artist's page count, only fetching
+    the requested page unless every page of the artist is already cached.
+    The next page is prefetched in the background, ahead of the user's navigation.
+    """
+    paginated_songs = all_artist_songs_paginated.cached_value(artist)
+    if paginated_songs and page <= len(paginated_songs):
+        return paginated_songs[page - 1], len(paginated_songs)
+    page_count = await artist_page_count(artist)
+    songs = await get_artist_page_songs(artist, page)
+    if page < page_count and not get_artist_page_songs.is_cached(artist, page + 1):
+        prefetch(get_artist_page_songs(artist, page + 1))
+    return songs, page_count
+
+
+def prefetch(coroutine) -> asyncio.Task:
+    """
+    Runs a scraper call in the background, for its value to be cached when it's needed.
+    """
+    task = asyncio.create_task(coroutine)
+    prefetch_tasks.add(task)
+    task.add_done_callback(_prefetch_done)
+    return task
+
+
+def _prefetch_done(task: asyncio.Task) -> None:
+    prefetch_tasks.discard(task)
+    # failures are already logged by music_cacher, the page is fetched again when it's requested.
+    if not task.cancelled():
+        task.exception()
 
 
 @music_cacher(cache)
 async def all_artist_songs_paginated(artist: Artist) -> List[List[Song]]:
-    bs = await _artist_bs(artist)
-    last_page_number = last_page_number_extractor(bs)
+    first_page_songs, last_page_number = await _artist_page(artist)
     if not last_page_number:
-        page_songs =  [await get_artist_page_songs(artist)]
-        return page_songs
-    paginated_songs = await asyncio.gather(
-        *[get_artist_page_songs(artist, i+1) for i in range(last_page_number)]
-    )
+        paginated_songs = [first_page_songs]
+    else:
+        other_pages = await asyncio.gather(
+            *[_artist_page(artist, i) for i in range(2, last_page_number + 1)]
+        )
+        paginated_songs = [first_page_songs] + [songs for songs, _ in other_pages]
+    index_artist_songs(paginated_songs)
     return paginated_songs
 
 
+def get_audio_store(directory: str) -> AudioStore:
+    directory = os.path.abspath(directory)
+    if directory not in audio_stores:
+        audio_stores[directory] = AudioStore(
+            directory, settings.AUDIO_STORE_MAX_BYTES, settings.AUDIO_STORE_POLICY
+        )
+    return audio_stores[directory]
+
+
+def close_audio_stores() -> None:
+    """
+    Writes the usage of the stored files not written yet, and closes their indexes.
+    """
+    for store in audio_stores.values():
+        store.close()
+    audio_stores.clear()
+
+
+def close_scrape_cache() -> None:
+    """
+    Writes the scraping results not written yet.
+    """
+    cache.close()
+
+
 async def download_songs_from_page(
-    artist: str, page: int = 1, save_dir: str = None
-) -> None:
-    if not save_dir:
-        save_dir = getattr(settings, "SAVE_DIR", None)
+    artist: Artist,
+    page: int = 1,
+    save_dir: str = settings.SAVE_DIR,
+    selected_quality: Literal["320", "128", "any"] = "any",
+    on_song: Callable[[Song, Optional[List[str]]], None] = None,
+) -> List[Optional[List[str]]]:
     songs = await get_artist_page_songs(artist, page)
-    if save_dir:
-        artist_dir = os.path.join(os.abs.path(save_dir), artist)
-    else:
-        artist_dir = os.path.abspath(artist)  # "/home/user/همایون شجریان/"
-    if not os.path.isdir(artist_dir):
-        os.makedirs(artist)
-    for song in songs:
-        _download_music(song.url, artist_dir)
+    return await download_songs(songs, save_dir, selected_quality, on_song=on_song)
+
+
+async def song_audio_links(
+    song: Song, selected_quality: Literal["320", "128", "any"] = "any"
+) -> List[str]:
+    """
+    Returns a link of every audio of the song (a song page may have several), in the selected quality.
+    """
+    return _select_audio_links(await music_link_extractor(song), selected_quality)
+
+
+def cached_audio_links(
+    song: Song, selected_quality: Literal["320", "128", "any"] = "any"
+) -> List[str]:
+    """
+    Like song_audio_links, but only from the cache, however old. Empty when the song's page
+    wasn't fetched yet.
+    """
+    music_download_links = music_link_extractor.last_known_value(song)
+    if not music_download_links:
+        return []
+    return _select_audio_links(music_download_links, selected_quality)
+
+
+def _select_audio_links(
+    music_download_links: Dict[str, Dict[str, str]], selected_quality: str
+) -> List[str]:
+    audio_links = []
+    for quality_choices in music_download_links.values():
+        if selected_quality not in quality_choices or selected_quality == "any":
+            # the link map is shared with the cache, it mustn't be mutated.
+            audio_links.append(list(quality_choices.values())[-1])
+        else:
+            audio_links.append(quality_choices[selected_quality])
+    return audio_links
 
 
 async def download_song(
     song: Song,
     save_dir: str = None,
     selected_quality: Literal["320", "128", "any"] = "any",
-) -> str:
-    music_download_links = await music_link_extractor(song)
+    on_progress: Callable[[int, Optional[int]], None] = None,
+    on_file: Callable[[str], None] = None,
+    audio_links: List[str] = None,
+) -> List[str]:
+    """
+    on_progress is called with the downloaded and total bytes of all of the song's files together,
+    on_file with the path of every file as soon as it's downloaded, so it can be sent while the
+    rest are still downloading. audio_links limits the download to some of the song's audios.
+    """
+    if audio_links is None:
+        audio_links = await song_audio_links(song, selected_quality)
     if save_dir:
         file_dir = os.path.abspath(save_dir)
     else:
         file_dir = os.path.abspath("")
-    audio_links = []
-    for quality_choices in music_download_links.values():
-        if selected_quality not in quality_choices or selected_quality == "any":
-            audio_links.append(quality_choices.popitem()[1])
+    progresses = {audio_link: (0, None) for audio_link in audio_links}
+
+    def file_progress(audio_link, downloaded_bytes, total_bytes):
+        progresses[audio_link] = (downloaded_bytes, total_bytes)
+        if any(total is None for _, total in progresses.values()):
+            total_bytes = None
         else:
-            audio_links.append(quality_choices[selected_quality])
-    downloaded_file_paths = [
-        _download_music(audio_link, file_dir) for audio_link in audio_links
-    ]
-    return downloaded_file_paths
+            total_bytes = sum(total for _, total in progresses.values())
+        on_progress(sum(downloaded for downloaded, _ in progresses.values()), total_bytes)
+
+    async def download(audio_link):
+        file_path = await _download_music(
+            audio_link,
+            file_dir,
+            functools.partial(file_progress, audio_link) if on_progress else None,
+        )
+        if on_file:
+            on_file(file_path)
+        return file_path
+
+    downloaded_file_paths = await asyncio.gather(
+        *[download(audio_link) for audio_link in audio_links]
+    )
+    return list(downloaded_file_paths)
+
 
+async def download_songs(
+    songs: List[Song],
+    save_dir: str = None,
+    selected_quality: Literal["320", "128", "any"] = "any",
+    concurrency: int = settings.BULK_CONCURRENT_SONGS,
+    on_song: Callable[[Song, Optional[List[str]]], None] = None,
+) -> List[Optional[List[str]]]:
+    """
+    Downloads the songs, concurrency of them at a time (download_semaphore bounds all downloads
+    together anyway). The links of every song are resolved at once up front, files already in
+    the store aren't downloaded again. A song that fails is logged and its result is None, the
+    others are still downloaded. on_song is called with each song and its result once it's done.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def download(song: Song) -> Optional[List[str]]:
+        try:
+            audio_links = await song_audio_links(song, selected_quality)
+            async with semaphore:
+                file_paths = await download_song(song, save_dir, audio_links=audio_links)
+        except Exception as error:
+            logger.error(f"Couldn't download {song.name}: {error!r}", extra={"song_id": song.id})
+            file_paths = None
+        if on_song:
+            on_song(song, file_paths)
+        return file_paths
 
+    return await asyncio.gather(*[download(song) for song in songs])
+
+
+@music_cacher(cache)
 async def music_link_extractor(
     song: Song,
 ) -> Dict[
     str, Dict[Optional[Literal["320", "128", "unknown"]], str]
 ]:  # unnessacry complex data structure, needs refactoring
-    async with ClientSession() as session:
-        response_content = await fetch(session, song.url)
-    bs = BeautifulSoup(response_content, "html.parser")
-    links = [
-        a_tag.attrs["href"]
-        for a_tag in bs.find("div", class_=HTMLTagClass.SONG_COVER.value).find_all("a")
-    ]
+    response_content = await fetch(song.url)
+    links = html_extractor().audio_links(response_content)
     audio_links = set(filter(lambda link: link[-4:] == ".mp3", links))  # no duplicates!
     if not audio_links:
-        raise Exception("No audio links were found")
+        raise NoAudioLinksError(song.url)
     QUALITY_START_INDEX, QUALITY_END_INDEX = -8, -5
     SONG_NAME_END_INDEX = -10
     songs = dict()
@@ -141,35 +440,52 @@ async def music_link_extractor(
     return songs
 
 
-async def download_artist_album(artist: str, save_dir: str = None) -> None:
-    bs = await _artist_bs(artist)
-    last_page_number = last_page_number_extractor(bs)
-    for i in range(last_page_number):
-        await download_songs_from_page(artist, i + 1, save_dir)
+async def download_artist_album(
+    artist: Artist,
+    save_dir: str = settings.SAVE_DIR,
+    selected_quality: Literal["320", "128", "any"] = "any",
+    on_song: Callable[[Song, Optional[List[str]]], None] = None,
+) -> List[Optional[List[str]]]:
+    songs = [song for page in await all_artist_songs_paginated(artist) for song in page]
+    return await download_songs(songs, save_dir, selected_quality, on_song=on_song)
 
 
-def _download_music(music_url: str, file_dir: str) -> str:
+async def _download_music(
+    music_url: str,
+    file_dir: str,
+    on_progress: Callable[[int, Optional[int]], None] = None,
+) -> str:
     file_name = music_url.split("/")[-1].replace("%20", " ")
+    store = get_audio_store(file_dir)
     # /home/user/همایون شجریان/Irane Man.mp3
-    file_full_path = os.path.join(file_dir, file_name)
-    if not os.path.isfile(file_full_path):
-        logger.info(f"{file_name} doesn't exist, downloading.")
-        with open(file_full_path, "wb") as file:
-            _download_file(music_url, file)
-            logger.info(f"{file_name} downloaded.")
-        return file_full_path
-    # sometimes request for downloads throws a broken exception & connection error and the file stays empty.
-    if os.path.getsize(file_full_path) == 0:
-        logger.info(f"{file_name} is empty, redownloading.")
-        with open(file_full_path, "wb") as file:
-            _download_file(music_url, file)
-            logger.info(f"{file_name}, Downloaded.")
+    file_full_path = store.get(file_name)
+    if file_full_path:
+        logger.debug(f"{file_name} is already downloaded, skipping.")
+        if store.usage_flush_due():
+            # the hits of a while are written at once, off the event loop.
+            await asyncio.to_thread(store.write_usage, store.take_usage())
+        if on_progress:
+            file_size = store.size(file_name)
+            on_progress(file_size, file_size)
         return file_full_path
-    logger.info(f"{file_name} is already downloaded, skipping.")
+    logger.debug(f"{file_name} doesn't exist, downloading.")
+    temp_path = store.temp_path(file_name)
+    async with download_semaphore:
+        start = time.perf_counter()
+        try:
+            downloaded_bytes = await download_file(
+                music_url, temp_path, on_progress=on_progress
+            )
+            # the index may be waiting for another worker process's write.
+            file_full_path = await asyncio.to_thread(store.commit, file_name, temp_path)
+        finally:
+            # a no-op once committed, a partial file never makes it into the store.
+            store.discard(temp_path)
+        elapsed = time.perf_counter() - start
+    download_duration.observe(elapsed)
+    logger.info(
+        f"{file_name} downloaded: {downloaded_bytes} bytes in {elapsed:.2f}s "
+        f"({downloaded_bytes / 1024 / max(elapsed, 1e-6):.1f} KB/s).",
+        extra={"bytes": downloaded_bytes, "duration_s": elapsed},
+    )
     return file_full_path
-
-
-def _download_file(url: str, file: BinaryIO) -> None:
-    with requests.get(url) as response:
-        downloaded_file = response.content
-        file.write(downloaded_file)
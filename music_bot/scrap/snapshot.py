@@ -0,0 +1,135 @@
+"""
+Snapshot of the catalog: the artist list and the songs of every artist the crawler fetched, in a
+single gzipped json file. A fresh dyno starts with an empty disk, scrape cache included; restored
+on boot, the snapshot lets its first users be answered without scraping. Entries older than their
+ttl come back as stale, they're served and refreshed in the background like any other.
+
+The crawler writes it after every crawl.
+
+    python -m music_bot.scrap.snapshot [--crawl]     writes it from the scrape cache, or a crawl
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import time
+from typing import Any, Dict, List
+
+import music_bot.settings as settings
+from music_bot.logger import logger
+from music_bot.scrap.cache import MISSING
+from music_bot.scrap.models import intern_artist, intern_song
+from music_bot.scrap.scraper import (
+    all_artist_songs_paginated,
+    cache,
+    get_all_artists,
+    index_artist_songs,
+    index_artists,
+)
+
+# bumped when the layout changes, older snapshots are ignored.
+VERSION = 1
+
+
+def snapshot_data() -> Dict[str, Any]:
+    """
+    The catalog as the scrape cache has it, however old.
+    """
+    artists = get_all_artists.last_known_value() or []
+    songs = dict()
+    for artist in artists:
+        paginated_songs = all_artist_songs_paginated.last_known_value(artist)
+        if paginated_songs:
+            songs[artist.url] = [
+                [[song.id, song.name, song.url] for song in page] for page in paginated_songs
+            ]
+    return {
+        "version": VERSION,
+        "saved_at": time.time(),
+        "artists": [[artist.name, artist.url] for artist in artists],
+        "songs": songs,
+    }
+
+
+def write_snapshot(data: Dict[str, Any], path: str = settings.CATALOG_SNAPSHOT) -> None:
+    temp_path = f"{path}.tmp"
+    with gzip.open(temp_path, "wt", encoding="utf-8", compresslevel=6) as file:
+        json.dump(data, file, ensure_ascii=False, separators=(",", ":"))
+    # readers never see a partly written snapshot.
+    os.replace(temp_path, path)
+
+
+async def save_snapshot(path: str = settings.CATALOG_SNAPSHOT) -> None:
+    data = snapshot_data()
+    if not data["artists"]:
+        return
+    # compressing takes a while, the event loop isn't held up by it.
+    await asyncio.to_thread(write_snapshot, data, path)
+    logger.info(
+        f"Catalog snapshot of {len(data['artists'])} artists saved to {path}.",
+        extra={"artists": len(data["artists"]), "artists_with_songs": len(data["songs"])},
+    )
+
+
+def restore_snapshot(path: str = settings.CATALOG_SNAPSHOT) -> int:
+    """
+    Fills the scrape cache with the snapshot's entries it doesn't have, and the artist and song
+    indexes with all of them. Returns the number of artists restored, 0 without a snapshot.
+    """
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as file:
+            data = json.load(file)
+    except FileNotFoundError:
+        return 0
+    except (OSError, ValueError) as error:
+        logger.warning(f"Catalog snapshot {path} can't be read ({error!r}), ignoring it.")
+        return 0
+    if data.get("version") != VERSION:
+        logger.warning(f"Catalog snapshot {path} is of another version, ignoring it.")
+        return 0
+    artists = [intern_artist(name, url) for name, url in data["artists"]]
+    values = {get_all_artists.cache_key(): artists}
+    paginated_songs: List[List[Any]] = []
+    for artist in artists:
+        pages = [
+            [intern_song(id_, name, url, artist) for id_, name, url in page]
+            for page in data["songs"].get(artist.url, [])
+        ]
+        if pages:
+            values[all_artist_songs_paginated.cache_key(artist)] = pages
+            paginated_songs.extend(pages)
+    # the cache may have been filled since, by this worker or another one.
+    values = {key: value for key, value in values.items() if cache.last_known(key) is MISSING}
+    # older than its ttl, an entry is served as stale and refreshed, rather than fetched again.
+    stored_at = {key: max(data["saved_at"], time.time() - cache.ttl(key)) for key in values}
+    cache.set_many(values, stored_at)
+    index_artists(artists)
+    index_artist_songs(paginated_songs)
+    logger.info(
+        f"Catalog snapshot of {len(artists)} artists restored, "
+        f"{(time.time() - data['saved_at']) / 3600:.1f} hours old.",
+        extra={"artists": len(artists), "restored_entries": len(values)},
+    )
+    return len(artists)
+
+
+async def main(crawl_first: bool) -> None:
+    from music_bot.scrap.crawler import crawl
+    from music_bot.utils.aioutils import close_session
+
+    try:
+        if crawl_first:
+            # saves the snapshot itself.
+            await crawl()
+        else:
+            await save_snapshot()
+    finally:
+        await close_session()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--crawl", action="store_true", help="crawl the site first, it takes long")
+    args = parser.parse_args()
+    asyncio.run(main(args.crawl))
@@ -3,12 +3,112 @@ import os
 PORT = os.environ.get("PORT")
 if PORT:
     PORT = int(PORT)
-BASE_URL = "https://music-fa.com"
+BASE_URL = os.environ.get("BASE_URL", "https://music-fa.com")
 ARTIST_URL = "https://music-fa.com/artist"
+# required to run the bot, checked when it starts rather than on import.
 TELEGRAM_BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN")
-if not TELEGRAM_BOT_TOKEN:
-    raise Exception("No telegram bot token was found in environment variables.")
+TELEGRAM_BASE_URL = os.environ.get("TELEGRAM_BASE_URL", "https://api.telegram.org/bot")
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL", "https://musicfa-bot.herokuapp.com/")
 BASE_DOWNLOAD_URL = "https://music-fa.com/download-song/"
-SAVE_DIR = os.path.abspath("downloaded_audios")
-if not os.path.exists(SAVE_DIR):
-    os.mkdir(SAVE_DIR)
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+MAX_CONCURRENT_DOWNLOADS = 4
+# interrupted downloads are resumed with a Range request, after a jittered exponential backoff.
+DOWNLOAD_RETRIES = int(os.environ.get("DOWNLOAD_RETRIES", 4))
+DOWNLOAD_RETRY_BACKOFF = 1.0
+DOWNLOAD_RETRY_MAX_DELAY = 30
+# shared aiohttp client, see music_bot.utils.aioutils.get_session
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", 100))
+HTTP_POOL_SIZE_PER_HOST = int(os.environ.get("HTTP_POOL_SIZE_PER_HOST", 20))
+HTTP_KEEPALIVE_TIMEOUT = 30
+HTTP_DNS_CACHE_TTL = 300
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", 10))
+HTTP_READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", 30))
+HTTP_RETRIES = int(os.environ.get("HTTP_RETRIES", 2))
+HTTP_RETRY_BACKOFF = 0.5
+# per host limits of the scraper's requests, see music_bot.utils.host_limiter
+SCRAPE_RATE_LIMIT = float(os.environ.get("SCRAPE_RATE_LIMIT", 5))  # requests per second
+SCRAPE_RATE_BURST = int(os.environ.get("SCRAPE_RATE_BURST", 10))
+SCRAPE_CONCURRENCY_PER_HOST = int(os.environ.get("SCRAPE_CONCURRENCY_PER_HOST", 4))
+# consecutive failures which open the circuit, and the seconds it stays open.
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_TIMEOUT = 30
+# created on the first download, see music_bot.scrap.audio_store
+SAVE_DIR = os.path.abspath(os.environ.get("SAVE_DIR", "downloaded_audios"))
+# bytes of audio files kept in SAVE_DIR, see music_bot.scrap.audio_store
+AUDIO_STORE_MAX_BYTES = int(os.environ.get("AUDIO_STORE_MAX_BYTES", 2 * 1024**3))
+AUDIO_STORE_POLICY = os.environ.get("AUDIO_STORE_POLICY", "lru")
+FILE_ID_DB = os.path.abspath(os.environ.get("FILE_ID_DB", "file_ids.sqlite3"))
+# file_ids kept in memory, see music_bot.file_id_cache
+FILE_ID_MEMORY_SIZE = 16384
+# seconds a song without file_ids is remembered, another worker process may upload it meanwhile.
+FILE_ID_MISS_TTL = 60
+# one of music_bot.scrap.extractors.EXTRACTORS, the fastest available one when not set.
+HTML_EXTRACTOR = os.environ.get("HTML_EXTRACTOR")
+SCRAPE_CACHE_DB = os.path.abspath(os.environ.get("SCRAPE_CACHE_DB", "scrape_cache.sqlite3"))
+SCRAPE_CACHE_MAX_BYTES = int(os.environ.get("SCRAPE_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+# seconds, keyed by the cached scraper function's name.
+SCRAPE_CACHE_TTLS = {
+    "get_all_artists": 172800,
+    "all_artist_songs_paginated": 86400,
+    "get_artist_page_songs": 86400,
+    "artist_page_count": 86400,
+    "music_link_extractor": 21600,
+}
+# how long an expired entry is still served while it's being refreshed.
+SCRAPE_CACHE_STALE_TTL = 604800
+# the artists and their songs, restored on boot when the scrape cache doesn't have them, see
+# music_bot.scrap.snapshot
+CATALOG_SNAPSHOT = os.path.abspath(os.environ.get("CATALOG_SNAPSHOT", "catalog_snapshot.json.gz"))
+# background crawler, see music_bot.scrap.crawler
+CRAWLER_INTERVAL = int(os.environ.get("CRAWLER_INTERVAL", 43200))
+CRAWLER_FIRST_DELAY = 60
+CRAWLER_CONCURRENCY = 2
+# minimum seconds between two page requests of the crawler.
+CRAWLER_REQUEST_INTERVAL = 1.0
+# download scheduler, see music_bot.download_scheduler
+DOWNLOAD_WORKERS = int(os.environ.get("DOWNLOAD_WORKERS", 3))
+DOWNLOADS_PER_USER = 1
+MAX_QUEUED_DOWNLOADS_PER_USER = 5
+# minimum seconds between two edits of a download's status message.
+STATUS_UPDATE_INTERVAL = 3
+# "upload" downloads songs and uploads them, "url" lets telegram fetch them from music-fa itself,
+# falling back to uploading the ones telegram couldn't fetch.
+AUDIO_SEND_MODE = os.environ.get("AUDIO_SEND_MODE", "upload")
+# songs of a bulk download (/album) downloaded at a time, the rest of the downloads stay free
+# for other users' single songs.
+BULK_CONCURRENT_SONGS = 2
+# songs sent at most for a whole artist, its first pages.
+BULK_MAX_SONGS = 100
+# inline mode, see music_bot.inline
+INLINE_RESULTS_LIMIT = 20
+# seconds an answer is reused for the same query, by the bot and by telegram.
+INLINE_CACHE_TTL = 30
+INLINE_CACHE_SIZE = 4096
+# answers sent at once, a user's queries superseded while waiting aren't answered.
+INLINE_CONCURRENT_ANSWERS = 16
+# keyboards of list pages kept built, see music_bot.utils.utils.create_keyboard_page
+KEYBOARD_CACHE_SIZE = 256
+# conversations and user data, see music_bot.persistence
+PERSISTENCE_DB = os.path.abspath(os.environ.get("PERSISTENCE_DB", "persistence.sqlite3"))
+# seconds between two writes of the changed data.
+PERSISTENCE_UPDATE_INTERVAL = 10
+# prometheus text format metrics on http://METRICS_HOST:METRICS_PORT/metrics, 0 disables them.
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 9464))
+# fraction of handler calls profiled with cProfile, see music_bot.profiling
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+PROFILE_DIR = os.path.abspath(os.environ.get("PROFILE_DIR", "profiles"))
+# json lines, rotated by size, see music_bot.logger
+LOG_FILE = os.path.abspath(os.environ.get("LOG_FILE", "music_bot.log"))
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_BYTES", 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.environ.get("LOG_BACKUP_COUNT", 5))
+# fraction of the debug records kept, with LOG_LEVEL=DEBUG.
+LOG_DEBUG_SAMPLE_RATE = float(os.environ.get("LOG_DEBUG_SAMPLE_RATE", 0.1))
+# where the scrape cache, file_ids and persistence are kept, see music_bot.backends. The worker
+# processes share them, "memory" only fits a single process.
+STATE_BACKEND = os.environ.get("STATE_BACKEND", "sqlite")
+# with more than one, a front process dispatches the webhook's updates to the workers by user id,
+# see music_bot.front. Worker i listens on 127.0.0.1:WORKER_BASE_PORT + i.
+WEBHOOK_WORKERS = int(os.environ.get("WEBHOOK_WORKERS", 1))
+WORKER_BASE_PORT = int(os.environ.get("WORKER_BASE_PORT", 8100))
@@ -0,0 +1,15 @@
+import os
+import shutil
+import tempfile
+
+# set before music_bot.settings is imported, nothing the tests run touches the working directory.
+_WORK_DIR = tempfile.mkdtemp(prefix="music_bot_tests_")
+os.environ["STATE_BACKEND"] = "memory"
+os.environ["SAVE_DIR"] = os.path.join(_WORK_DIR, "downloaded_audios")
+os.environ["LOG_FILE"] = os.path.join(_WORK_DIR, "music_bot.log")
+os.environ["CATALOG_SNAPSHOT"] = os.path.join(_WORK_DIR, "catalog_snapshot.json.gz")
+os.environ["METRICS_PORT"] = "0"
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_WORK_DIR, ignore_errors=True)
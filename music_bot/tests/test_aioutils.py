@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from music_bot.benchmarks.fake_server import MP3_FRAME_HEADER, FakeMusicFaServer
+from music_bot.scrap.exceptions import DownloadHTTPError, DownloadRetriesExhaustedError
+from music_bot.utils import aioutils
+
+MP3_SIZE = 200_000
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    # retries are immediate, the backoff itself isn't what's tested.
+    monkeypatch.setattr(aioutils, "DOWNLOAD_RETRY_BACKOFF", 0.001)
+
+
+def download(file_path, path: str = "/tagdl/1/song.mp3", **fault_options) -> FakeMusicFaServer:
+    server = FakeMusicFaServer(mp3_size=MP3_SIZE, chunk_size=16 * 1024, **fault_options)
+
+    async def main():
+        async with server:
+            try:
+                await aioutils.download_file(f"{server.url}{path}", str(file_path), retries=4)
+            finally:
+                await aioutils.close_session()
+
+    asyncio.run(main())
+    return server
+
+
+def expected_mp3() -> bytes:
+    return (MP3_FRAME_HEADER * (MP3_SIZE // len(MP3_FRAME_HEADER) + 1))[:MP3_SIZE]
+
+
+def test_disconnects_are_resumed_with_range_requests(tmp_path):
+    file_path = tmp_path / "song.mp3"
+    server = download(file_path, disconnect_after=MP3_SIZE // 3, disconnects=2)
+    assert file_path.read_bytes() == expected_mp3()
+    assert server.requests["mp3"] == 3
+    # every byte was sent once, nothing was downloaded again.
+    assert server.sent_bytes == MP3_SIZE
+
+
+def test_disconnects_without_range_support_start_over(tmp_path):
+    file_path = tmp_path / "song.mp3"
+    server = download(file_path, disconnect_after=MP3_SIZE // 3, disconnects=2, accept_ranges=False)
+    assert file_path.read_bytes() == expected_mp3()
+    assert server.requests["mp3"] == 3
+
+
+def test_retries_are_exhausted(tmp_path):
+    with pytest.raises(DownloadRetriesExhaustedError) as error:
+        download(tmp_path / "song.mp3", disconnect_after=MP3_SIZE // 10)
+    assert error.value.attempts == 5
+
+
+def test_client_errors_arent_retried(tmp_path):
+    with pytest.raises(DownloadHTTPError) as error:
+        download(tmp_path / "song.mp3", path="/tagdl/1")
+    assert error.value.status == 404
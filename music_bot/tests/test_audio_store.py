@@ -0,0 +1,116 @@
+import os
+
+import pytest
+
+from music_bot.scrap import audio_store
+from music_bot.scrap.audio_store import AudioStore
+
+
+class FakeTime:
+    """
+    Clock of the store, a second passes on every reading so no two uses are at the same time.
+    """
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self) -> float:
+        self.now += 1
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture(autouse=True)
+def fake_time(monkeypatch):
+    monkeypatch.setattr(audio_store, "time", FakeTime())
+
+
+def store_file(store: AudioStore, name: str, size: int) -> str:
+    temp_path = store.temp_path(name)
+    with open(temp_path, "wb") as file:
+        file.write(b"\0" * size)
+    return store.commit(name, temp_path)
+
+
+def stored_names(store: AudioStore) -> set:
+    return {name for name in ("a", "b", "c", "d") if name in store}
+
+
+def test_the_least_recently_used_file_is_evicted(tmp_path):
+    store = AudioStore(tmp_path, max_bytes=300, policy="lru")
+    for name in ("a", "b", "c"):
+        store_file(store, name, 100)
+    assert store.get("a") == os.path.join(tmp_path, "a")
+    store_file(store, "d", 100)
+    assert stored_names(store) == {"a", "c", "d"}
+    assert not os.path.exists(os.path.join(tmp_path, "b"))
+    assert store.get("b") is None
+    assert store.current_bytes == 300
+    store.close()
+
+
+def test_the_least_frequently_used_file_is_evicted(tmp_path):
+    store = AudioStore(tmp_path, max_bytes=300, policy="lfu")
+    for name in ("a", "b", "c"):
+        store_file(store, name, 100)
+    for name in ("a", "a", "b", "c", "c"):
+        store.get(name)
+    # b was used after a, but less often.
+    store_file(store, "d", 100)
+    assert stored_names(store) == {"a", "c", "d"}
+    store.close()
+
+
+def test_usage_flushed_by_another_process_counts(tmp_path):
+    other_process = AudioStore(tmp_path, max_bytes=300, policy="lfu")
+    store = AudioStore(tmp_path, max_bytes=300, policy="lfu")
+    for name in ("a", "b", "c"):
+        store_file(store, name, 100)
+    for name in ("a", "b", "b"):
+        other_process.get(name)
+    other_process.flush()
+    store.get("a")
+    store_file(store, "d", 100)
+    assert stored_names(store) == stored_names(other_process) == {"a", "b", "d"}
+    other_process.close()
+    store.close()
+
+
+def test_sizes_are_accounted_for(tmp_path):
+    store = AudioStore(tmp_path, max_bytes=1000)
+    store_file(store, "a", 100)
+    store_file(store, "b", 200)
+    assert store.current_bytes == 300
+    # downloaded again, replaced rather than counted twice.
+    store_file(store, "a", 150)
+    assert store.size("a") == 150
+    assert store.current_bytes == 350
+    store.remove("b")
+    assert store.current_bytes == 150
+    # larger than the whole store, it's kept and everything else is evicted.
+    store_file(store, "c", 1200)
+    assert stored_names(store) == {"c"}
+    assert store.current_bytes == 1200
+    store.close()
+
+
+def test_the_index_is_reconciled_with_the_directory(tmp_path):
+    store = AudioStore(tmp_path, max_bytes=1000)
+    store_file(store, "a", 100)
+    store_file(store, "b", 100)
+    store.close()
+    os.remove(os.path.join(tmp_path, "a"))
+    # downloaded before the index existed.
+    with open(os.path.join(tmp_path, "c"), "wb") as file:
+        file.write(b"\0" * 300)
+    # left by an interrupted download.
+    stale_temp_path = os.path.join(tmp_path, f"d.1234{audio_store.TEMP_FILE_SUFFIX}")
+    open(stale_temp_path, "wb").close()
+    os.utime(stale_temp_path, (0, 0))
+    store = AudioStore(tmp_path, max_bytes=1000)
+    assert stored_names(store) == {"b", "c"}
+    assert store.current_bytes == 400
+    assert not os.path.exists(stale_temp_path)
+    store.close()
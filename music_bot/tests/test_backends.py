@@ -0,0 +1,65 @@
+import asyncio
+import os
+import sqlite3
+import time
+
+from music_bot.backends import MemoryBackend, SqliteBackend, WriteBehindBackend
+
+
+def test_writes_are_read_back_before_and_after_being_written():
+    backend = MemoryBackend()
+    write_behind = WriteBehindBackend(backend)
+
+    async def main():
+        write_behind.set("ns", "a", b"1")
+        write_behind.set("ns", "b", b"2")
+        write_behind.delete("ns", "b")
+        # handed to the worker thread, not written yet.
+        assert backend.get("ns", "a") is None
+        assert write_behind.get("ns", "a") == b"1"
+        assert write_behind.items("ns") == {"a": b"1"}
+        await asyncio.sleep(0.1)
+        assert backend.items("ns") == {"a": b"1"}
+
+    asyncio.run(main())
+    # without a running loop, written right away.
+    write_behind.set("ns", "c", b"3")
+    assert backend.get("ns", "c") == b"3"
+
+
+def test_a_locked_database_doesnt_hold_up_the_event_loop(tmp_path):
+    location = os.path.join(tmp_path, "state.sqlite3")
+    backend = SqliteBackend(location)
+    backend.set("ns", "a", b"1")
+    # another worker process in the middle of a write.
+    other_process = sqlite3.connect(location, isolation_level=None)
+    other_process.execute("BEGIN IMMEDIATE")
+    write_behind = WriteBehindBackend(backend)
+
+    async def main():
+        start = time.perf_counter()
+        write_behind.set("ns", "b", b"2")
+        await asyncio.sleep(0.2)
+        # the worker thread is waiting for the other process, reads aren't.
+        assert write_behind.get("ns", "a") == b"1"
+        assert write_behind.get("ns", "b") == b"2"
+        assert time.perf_counter() - start < 0.3
+        other_process.execute("COMMIT")
+        while write_behind.get("ns", "b") != backend.get("ns", "b"):
+            await asyncio.sleep(0.01)
+
+    asyncio.run(main())
+    other_process.close()
+    assert backend.items("ns") == {"a": b"1", "b": b"2"}
+
+
+def test_close_writes_the_pending_changes():
+    backend = MemoryBackend()
+    write_behind = WriteBehindBackend(backend)
+
+    async def main():
+        write_behind.set("ns", "a", b"1")
+        write_behind.close()
+
+    asyncio.run(main())
+    assert backend.get("ns", "a") == b"1"
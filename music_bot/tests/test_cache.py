@@ -0,0 +1,26 @@
+import os
+import time
+
+from music_bot.backends import SqliteBackend
+from music_bot.scrap.cache import ScrapeCache
+
+
+def test_contains_is_only_a_probe(tmp_path):
+    backend = SqliteBackend(os.path.join(tmp_path, "scrape_cache.sqlite3"))
+    ScrapeCache(max_bytes=1024 * 1024, backend=backend).set(("artists",), ["an artist"])
+    # another worker process, only the backend has the entry.
+    cache = ScrapeCache(max_bytes=1024 * 1024, backend=backend)
+    assert cache.contains(("artists",))
+    assert not cache.contains(("artist_songs", "an artist"))
+    assert len(cache) == 0
+    assert cache.stats["hits"] == cache.stats["disk_hits"] == cache.stats["misses"] == 0
+    assert cache.get(("artists",)) == ["an artist"]
+    assert cache.stats["disk_hits"] == 1
+
+
+def test_contains_goes_by_the_age_of_an_entry_in_memory():
+    cache = ScrapeCache(max_bytes=1024 * 1024, ttls={"artists": 10}, stale_ttl=10)
+    cache.set_many({("artists",): []}, stored_at={("artists",): time.time() - 15})
+    assert cache.contains(("artists",))
+    cache.set_many({("artists",): []}, stored_at={("artists",): time.time() - 25})
+    assert not cache.contains(("artists",))
@@ -0,0 +1,24 @@
+import asyncio
+
+from music_bot.benchmarks.fake_server import FakeMusicFaServer
+from music_bot.scrap.crawler import RequestPacer, refresh_artist_songs
+from music_bot.scrap.models import intern_artist
+from music_bot.scrap.scraper import _artist_page, all_artist_songs_paginated
+from music_bot.utils import aioutils
+
+
+def test_new_songs_are_laid_out_on_the_sites_pages():
+    async def main():
+        async with FakeMusicFaServer() as server:
+            try:
+                artist = intern_artist("همایون شجریان", f"{server.url}/artist/homayoun-shajarian")
+                first_page, _ = await _artist_page(artist)
+                second_page, _ = await _artist_page(artist, 2)
+                # cached before the site listed the first page's newest three songs.
+                all_artist_songs_paginated.set_cached([first_page[3:], second_page], artist)
+                return first_page, second_page, await refresh_artist_songs(artist, RequestPacer(0))
+            finally:
+                await aioutils.close_session()
+
+    first_page, second_page, pages = asyncio.run(main())
+    assert pages == [first_page, second_page]
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+from music_bot.scrap.cache import ScrapeCache
+from music_bot.scrap.decorators import music_cacher
+
+
+@pytest.fixture
+def cache() -> ScrapeCache:
+    return ScrapeCache(max_bytes=1024 * 1024)
+
+
+def test_concurrent_misses_share_a_single_call(cache):
+    calls = 0
+
+    @music_cacher(cache)
+    async def load(key):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return f"value of {key}"
+
+    async def main():
+        return await asyncio.gather(*[load("a") for _ in range(50)])
+
+    assert asyncio.run(main()) == ["value of a"] * 50
+    assert calls == 1
+    assert load.is_cached("a")
+
+
+def test_exception_reaches_every_waiter_and_isnt_cached(cache):
+    calls = 0
+
+    @music_cacher(cache)
+    async def load(key):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        if calls == 1:
+            raise ValueError("site is down")
+        return f"value of {key}"
+
+    async def main():
+        results = await asyncio.gather(*[load("a") for _ in range(10)], return_exceptions=True)
+        assert not load.is_cached("a")
+        # the failed load isn't shared with later calls.
+        return results, await load("a")
+
+    results, value = asyncio.run(main())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert value == "value of a"
+    assert calls == 2
+
+
+def test_cancelled_first_caller_doesnt_cancel_the_load(cache):
+    calls = 0
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    @music_cacher(cache)
+    async def load(key):
+        nonlocal calls
+        calls += 1
+        started.set()
+        await release.wait()
+        return f"value of {key}"
+
+    async def main():
+        first = asyncio.create_task(load("a"))
+        await started.wait()
+        second = asyncio.create_task(load("a"))
+        await asyncio.sleep(0)
+        first.cancel()
+        release.set()
+        value = await second
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return value
+
+    assert asyncio.run(main()) == "value of a"
+    assert calls == 1
+    assert load.is_cached("a")
@@ -0,0 +1,201 @@
+import asyncio
+
+import pytest
+
+from music_bot.download_scheduler import DownloadScheduler, QueueFullError
+
+
+def test_users_are_served_round_robin():
+    scheduler = DownloadScheduler(workers=1)
+    started = []
+
+    def job(name: str):
+        async def download(on_progress, on_part):
+            started.append(name)
+            return name
+
+        return download
+
+    async def main():
+        try:
+            # all queued before the worker picks the first one.
+            return await asyncio.gather(
+                scheduler.submit(1, "1a", job("1a")),
+                scheduler.submit(1, "1b", job("1b")),
+                scheduler.submit(1, "1c", job("1c")),
+                scheduler.submit(2, "2a", job("2a")),
+            )
+        finally:
+            await scheduler.stop()
+
+    assert asyncio.run(main()) == ["1a", "1b", "1c", "2a"]
+    assert started == ["1a", "2a", "1b", "1c"]
+
+
+def test_a_user_runs_at_most_per_user_limit_downloads():
+    scheduler = DownloadScheduler(workers=3, per_user_limit=1)
+    running = {1: 0, 2: 0}
+    most_running = {1: 0, 2: 0}
+
+    def job(user_id: int):
+        async def download(on_progress, on_part):
+            running[user_id] += 1
+            most_running[user_id] = max(most_running[user_id], running[user_id])
+            await asyncio.sleep(0.01)
+            running[user_id] -= 1
+
+        return download
+
+    async def main():
+        try:
+            await asyncio.gather(
+                *[scheduler.submit(1, ("user 1", i), job(1)) for i in range(3)],
+                *[scheduler.submit(2, ("user 2", i), job(2)) for i in range(3)],
+            )
+        finally:
+            await scheduler.stop()
+
+    asyncio.run(main())
+    assert most_running == {1: 1, 2: 1}
+
+
+def test_queue_positions_are_the_order_jobs_are_picked_in():
+    scheduler = DownloadScheduler(workers=1)
+    positions = {}
+    started = []
+
+    async def main():
+        proceed = asyncio.Event()
+
+        async def blocking(on_progress, on_part):
+            await proceed.wait()
+
+        def job(name: str):
+            async def download(on_progress, on_part):
+                started.append(name)
+
+            async def on_position(position: int) -> None:
+                positions.setdefault(name, []).append(position)
+
+            return download, on_position
+
+        try:
+            # keeps the only worker busy while the others are queued.
+            first = asyncio.create_task(scheduler.submit(3, "3a", blocking))
+            await asyncio.sleep(0)
+            jobs = [
+                asyncio.create_task(scheduler.submit(user, name, *job(name)))
+                for user, name in ((1, "1a"), (1, "1b"), (2, "2a"))
+            ]
+            await asyncio.sleep(0.01)
+            # 2a overtakes the job user 1 queued before it.
+            assert {name: reported[-1] for name, reported in positions.items()} == {
+                "1a": 1,
+                "2a": 2,
+                "1b": 3,
+            }
+            proceed.set()
+            await asyncio.gather(first, *jobs)
+        finally:
+            await scheduler.stop()
+
+    asyncio.run(main())
+    assert started == ["1a", "2a", "1b"]
+    # moved up as the jobs before them were picked.
+    assert positions["1b"] == [2, 3, 2, 1]
+
+
+def test_a_download_already_queued_is_merged():
+    scheduler = DownloadScheduler(workers=1)
+    calls = []
+
+    async def main():
+        proceed = asyncio.Event()
+
+        async def download(on_progress, on_part):
+            calls.append("song")
+            on_part("part 1")
+            on_progress(10, 20)
+            await proceed.wait()
+            on_part("part 2")
+            return "song"
+
+        first_parts, second_parts, progress = [], [], []
+        try:
+            first = asyncio.create_task(
+                scheduler.submit(1, "song", download, on_part=first_parts.append)
+            )
+            await asyncio.sleep(0.01)
+            # requested by another user while it's running, the part so far is replayed.
+            second = asyncio.create_task(
+                scheduler.submit(
+                    2,
+                    "song",
+                    download,
+                    on_progress=lambda *args: progress.append(args),
+                    on_part=second_parts.append,
+                )
+            )
+            await asyncio.sleep(0.01)
+            assert second_parts == ["part 1"]
+            proceed.set()
+            assert await asyncio.gather(first, second) == ["song", "song"]
+        finally:
+            await scheduler.stop()
+        assert first_parts == second_parts == ["part 1", "part 2"]
+        # reported before the second user's request, not replayed.
+        assert progress == []
+
+    asyncio.run(main())
+    assert calls == ["song"]
+
+
+def test_a_cancelled_caller_doesnt_cancel_a_merged_download():
+    scheduler = DownloadScheduler(workers=1)
+
+    async def main():
+        async def download(on_progress, on_part):
+            await asyncio.sleep(0.02)
+            return "song"
+
+        try:
+            first = asyncio.create_task(scheduler.submit(1, "song", download))
+            second = asyncio.create_task(scheduler.submit(2, "song", download))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            assert await second == "song"
+        finally:
+            await scheduler.stop()
+
+    asyncio.run(main())
+
+
+def test_a_full_queue_is_refused():
+    scheduler = DownloadScheduler(workers=1, max_queued_per_user=2)
+
+    async def main():
+        proceed = asyncio.Event()
+
+        async def download(on_progress, on_part):
+            await proceed.wait()
+
+        try:
+            running = asyncio.create_task(scheduler.submit(1, "running", download))
+            await asyncio.sleep(0)
+            queued = [
+                asyncio.create_task(scheduler.submit(1, key, download)) for key in ("a", "b")
+            ]
+            await asyncio.sleep(0)
+            with pytest.raises(QueueFullError):
+                await scheduler.submit(1, "c", download)
+            # merged with a queued one, nothing is added to the queue.
+            merged = asyncio.create_task(scheduler.submit(1, "a", download))
+            # other users have queues of their own.
+            other_user = asyncio.create_task(scheduler.submit(2, "c", download))
+            await asyncio.sleep(0)
+            proceed.set()
+            await asyncio.gather(running, *queued, merged, other_user)
+        finally:
+            await scheduler.stop()
+
+    asyncio.run(main())
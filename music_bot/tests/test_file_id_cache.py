@@ -0,0 +1,29 @@
+from music_bot import file_id_cache
+from music_bot.backends import MemoryBackend
+from music_bot.file_id_cache import NAMESPACE, FileIdCache
+
+
+def test_file_ids_are_read_from_memory():
+    backend = MemoryBackend()
+    cache = FileIdCache(backend, memory_size=2)
+    cache.set("song1", ["a", "b"])
+    backend.delete(NAMESPACE, "any song1")
+    assert cache.get("song1") == ["a", "b"]
+    cache.get("song2")
+    cache.get("song3")
+    # least recently used, read from the backend again.
+    assert cache.get("song1") == []
+    cache.set("song1", ["c"])
+    cache.delete("song1")
+    assert cache.get("song1") == []
+
+
+def test_misses_are_read_again_once_expired(monkeypatch):
+    backend = MemoryBackend()
+    cache = FileIdCache(backend)
+    assert cache.get("song") == []
+    # uploaded by another worker process.
+    backend.set(NAMESPACE, "any song", b'["a"]')
+    assert cache.get("song") == []
+    monkeypatch.setattr(file_id_cache.time, "monotonic", lambda: float("inf"))
+    assert cache.get("song") == ["a"]
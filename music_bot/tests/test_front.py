@@ -0,0 +1,27 @@
+from music_bot.front import worker_index
+
+
+def message_update(user_id: int, chat_id: int) -> dict:
+    return {
+        "update_id": 1,
+        "message": {"message_id": 1, "from": {"id": user_id}, "chat": {"id": chat_id}},
+    }
+
+
+def test_a_users_updates_land_on_one_worker_whatever_the_chat():
+    user_id, group_id = 7, -1001234567890
+    updates = [
+        message_update(user_id, user_id),
+        message_update(user_id, group_id),
+        {
+            "update_id": 2,
+            "callback_query": {
+                "id": "1", "from": {"id": user_id}, "message": {"chat": {"id": group_id}}
+            },
+        },
+        {"update_id": 3, "inline_query": {"id": "1", "from": {"id": user_id}, "query": "عشق"}},
+    ]
+    assert {worker_index(update, 4) for update in updates} == {user_id % 4}
+    # an update without a user goes by its chat.
+    channel_post = {"update_id": 4, "channel_post": {"message_id": 1, "chat": {"id": -1002}}}
+    assert worker_index(channel_post, 4) == -1002 % 4
@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+from aiohttp import ClientResponseError
+
+from music_bot.scrap.exceptions import CircuitOpenError
+from music_bot.utils import host_limiter
+from music_bot.utils.host_limiter import CircuitBreaker, HostLimiter, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float) -> None:
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr(host_limiter, "time", clock)
+    monkeypatch.setattr(host_limiter.asyncio, "sleep", clock.sleep)
+    return clock
+
+
+def test_the_bucket_allows_bursts_then_the_rate(clock):
+    bucket = TokenBucket(rate=2, burst=3)
+
+    async def main():
+        for _ in range(3):
+            await bucket.acquire()
+        assert clock.slept == []
+        await bucket.acquire()
+        await bucket.acquire()
+        assert clock.slept == [0.5, 0.5]
+        # idle for long, refilled up to the burst only.
+        clock.now += 60
+        for _ in range(4):
+            await bucket.acquire()
+        assert clock.slept == [0.5, 0.5, 0.5]
+
+    asyncio.run(main())
+
+
+def test_the_circuit_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    assert not breaker.record_failure()
+    assert not breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    assert breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    clock.now += 10
+    assert breaker.retry_after() == 20
+
+
+def test_a_half_open_circuit_lets_a_single_trial_through(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()
+    # the trial failed, open for another reset_timeout.
+    assert breaker.record_failure()
+    assert breaker.state == "open"
+    clock.now += 30
+    assert breaker.allow()
+    # cancelled before reaching the host, the next caller makes the trial.
+    breaker.release_trial()
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow() and breaker.allow()
+
+
+def response_error(status: int) -> ClientResponseError:
+    return ClientResponseError(request_info=None, history=(), status=status)
+
+
+def test_only_host_failures_open_the_circuit(clock):
+    limiter = HostLimiter(
+        "music-fa.com", rate=100, burst=100, concurrency=2, failure_threshold=2, reset_timeout=30
+    )
+
+    async def fetch(error: Exception = None) -> None:
+        async with limiter.request():
+            if error:
+                raise error
+
+    async def main():
+        for status in (404, 503, 404, 429, 404, 503):
+            with pytest.raises(ClientResponseError):
+                await fetch(response_error(status))
+        # a 404 means the host is up, the other errors weren't consecutive failures.
+        assert limiter.breaker.state == "closed"
+        with pytest.raises(asyncio.TimeoutError):
+            await fetch(asyncio.TimeoutError())
+        assert limiter.breaker.state == "open"
+        with pytest.raises(CircuitOpenError) as raised:
+            await fetch()
+        assert raised.value.retry_after == 30
+        clock.now += 30
+        await fetch()
+        assert limiter.breaker.state == "closed"
+
+    asyncio.run(main())
+    assert limiter.stats["failures"] == 4
+    assert limiter.stats["rejected"] == 1
+    assert limiter.stats["circuit_opened"] == 1
+    assert limiter.semaphore._value == 2
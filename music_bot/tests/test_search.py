@@ -0,0 +1,104 @@
+import itertools
+import random
+import statistics
+import time
+
+import pytest
+
+from music_bot.utils import search
+from music_bot.utils.search import SearchIndex
+
+CATALOG_SONGS = 90_000
+PAGE_SIZE = 10
+LETTERS = "ابپتثجچحخدذرزژسشصضطظعغفقکگلمنوهی"
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    """
+    Song names of a catalog the size of the site's, a few words out of a zipf distributed
+    vocabulary each, so common words start thousands of them.
+    """
+    random.seed(0)
+    vocabulary = [
+        "".join(random.choice(LETTERS) for _ in range(random.randint(2, 7))) for _ in range(5000)
+    ]
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    names = [
+        " ".join(random.choices(vocabulary, cum_weights=cum_weights, k=random.randint(1, 4)))
+        for _ in range(CATALOG_SONGS)
+    ]
+    return vocabulary, names
+
+
+@pytest.fixture(scope="module")
+def catalog_index(catalog):
+    _, names = catalog
+    index = SearchIndex()
+    # page by page, the way the crawler and the song pages fill it.
+    for start in range(0, len(names), PAGE_SIZE):
+        page = enumerate(names[start : start + PAGE_SIZE], start)
+        index.add_many([(name, name, id_) for id_, name in page])
+    return index
+
+
+def test_ranks_exact_then_prefix_then_fuzzy_matches():
+    index = SearchIndex()
+    index.add_many(
+        [
+            ("محسن لرستانی", "lorestani", 1),
+            ("محسن یگانه", "yeganeh", 2),
+            ("محسن", "mohsen", 3),
+            ("علی محسنی", "mohseni", 4),
+        ]
+    )
+    assert index.search_with_scores("محسن", limit=4) == [
+        ("mohsen", search.EXACT_MATCH_SCORE),
+        # shorter names first among equally scored ones.
+        ("yeganeh", search.TEXT_PREFIX_MATCH_SCORE),
+        ("lorestani", search.TEXT_PREFIX_MATCH_SCORE),
+        ("mohseni", search.PREFIX_MATCH_SCORE),
+    ]
+    assert index.search("یگانه محسن", limit=1) == ["yeganeh"]
+    # arabic forms of the letters, as typed by an arabic keyboard layout.
+    assert index.search("علي", limit=1) == ["mohseni"]
+
+
+def test_finds_prefixes_before_and_after_they_are_merged(monkeypatch):
+    monkeypatch.setattr(search, "MIN_PREFIX_MERGE_SIZE", 8)
+    index = SearchIndex()
+    for id_ in range(100):
+        index.add(f"آهنگ شماره {id_}", id_, id_)
+        # the last one added is found, whether it's still a new prefix or merged already.
+        assert index.search(f"آهنگ شماره {id_}", limit=1) == [id_]
+    assert index._prefixes == sorted(index._prefixes)
+    assert index._new_prefixes == sorted(index._new_prefixes)
+    assert sorted(index.search("آهنگ شماره 1", limit=11)) == [1] + list(range(10, 20))
+
+
+def test_indexing_a_page_into_a_catalog_sized_index_is_fast(catalog_index):
+    durations = []
+    for page in range(200):
+        start = time.perf_counter()
+        catalog_index.add_many(
+            [(f"آهنگ تازه {page} {i}", None, ("new", page, i)) for i in range(PAGE_SIZE)]
+        )
+        durations.append(time.perf_counter() - start)
+    assert statistics.median(durations) < 0.002
+
+
+def test_searching_a_catalog_sized_index_is_fast(catalog, catalog_index):
+    vocabulary, _ = catalog
+    # single letters and the most common words match the most songs.
+    queries = [
+        "ع", "عش", "بارو",
+        vocabulary[0][:2], vocabulary[0], f"{vocabulary[3]} {vocabulary[7]}",
+    ]
+    for query in queries:
+        durations = []
+        for _ in range(5):
+            start = time.perf_counter()
+            catalog_index.search(query)
+            durations.append(time.perf_counter() - start)
+        assert statistics.median(durations) < 0.005, query
+    assert catalog_index.search(vocabulary[0])[0] == vocabulary[0]
@@ -1,29 +1,208 @@
-from aiohttp import ClientSession
+import asyncio
+import random
+import time
+from typing import Any, AsyncIterator, Callable, Optional, Tuple
+from urllib.parse import urlsplit
 
-from bs4 import BeautifulSoup
+from aiohttp import (
+    ClientError,
+    ClientResponseError,
+    ClientSession,
+    ClientTimeout,
+    TCPConnector,
+)
 
-from music_bot.scrap.models import Artist
-from music_bot.settings import BASE_URL
-from music_bot.utils.utils import last_page_number_extractor, HTMLTagClass
+from music_bot.logger import logger
+from music_bot.metrics import upstream_bytes, upstream_latency, upstream_requests
+from music_bot.scrap.exceptions import (
+    DownloadHTTPError,
+    DownloadRetriesExhaustedError,
+    IncompleteDownloadError,
+)
+from music_bot.scrap.extractors import get_extractor
+from music_bot.scrap.models import Artist, intern_artist
+from music_bot.utils.host_limiter import get_host_limiter, is_host_failure
+from music_bot.settings import (
+    BASE_URL,
+    DOWNLOAD_CHUNK_SIZE,
+    DOWNLOAD_RETRIES,
+    DOWNLOAD_RETRY_BACKOFF,
+    DOWNLOAD_RETRY_MAX_DELAY,
+    HTTP_POOL_SIZE,
+    HTTP_POOL_SIZE_PER_HOST,
+    HTTP_KEEPALIVE_TIMEOUT,
+    HTTP_DNS_CACHE_TTL,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+    HTTP_RETRIES,
+    HTTP_RETRY_BACKOFF,
+)
 
+# song downloads can take longer than any sane total timeout for a page.
+DOWNLOAD_TIMEOUT = ClientTimeout(
+    total=None, sock_connect=HTTP_CONNECT_TIMEOUT, sock_read=60
+)
 
-async def fetch(session, url):
-    async with session.get(url) as response:
-        return await response.text()
+_session: Optional[ClientSession] = None
+
+
+def get_session() -> ClientSession:
+    """
+    Returns the application wide ClientSession, creating it on first use.
+    """
+    global _session
+    if _session is None or _session.closed:
+        connector = TCPConnector(
+            limit=HTTP_POOL_SIZE,
+            limit_per_host=HTTP_POOL_SIZE_PER_HOST,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+        )
+        timeout = ClientTimeout(
+            total=HTTP_CONNECT_TIMEOUT + HTTP_READ_TIMEOUT,
+            sock_connect=HTTP_CONNECT_TIMEOUT,
+            sock_read=HTTP_READ_TIMEOUT,
+        )
+        _session = ClientSession(connector=connector, timeout=timeout)
+    return _session
+
+
+async def start_session(application=None) -> None:
+    # signature matches Application.post_init
+    get_session()
+
+
+async def close_session(application=None) -> None:
+    # signature matches Application.post_shutdown
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+async def fetch(url: str, session: ClientSession = None, retries: int = HTTP_RETRIES) -> str:
+    """
+    Requests go through the host's limiter, raises CircuitOpenError without requesting
+    while the host is failing.
+    """
+    session = session or get_session()
+    limiter = get_host_limiter(url)
+    start = time.perf_counter()
+    try:
+        for attempt in range(retries + 1):
+            try:
+                async with limiter.request():
+                    async with session.get(url) as response:
+                        upstream_requests.inc(host=limiter.host, status=response.status)
+                        response.raise_for_status()
+                        body = await response.read()
+                        upstream_bytes.inc(len(body), host=limiter.host, kind="page")
+                        return body.decode(response.get_encoding())
+            except ClientResponseError as error:
+                if not is_host_failure(error) or attempt == retries:
+                    raise
+            except (ClientError, asyncio.TimeoutError):
+                upstream_requests.inc(host=limiter.host, status="error")
+                if attempt == retries:
+                    raise
+            await asyncio.sleep(HTTP_RETRY_BACKOFF * 2**attempt)
+    finally:
+        upstream_latency.observe(time.perf_counter() - start, host=limiter.host)
+
+
+def _content_range(header: Optional[str]) -> Tuple[Optional[int], Optional[int]]:
+    # "bytes 1000-4999/5000" -> (1000, 5000)
+    try:
+        unit_and_range, total = header.split("/")
+        start = unit_and_range.split(" ")[-1].split("-")[0]
+        return int(start), None if total == "*" else int(total)
+    except (AttributeError, ValueError):
+        return None, None
+
+
+async def download_file(
+    url: str,
+    file_path: str,
+    session: ClientSession = None,
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+    on_progress: Callable[[int, Optional[int]], None] = None,
+    retries: int = DOWNLOAD_RETRIES,
+) -> int:
+    """
+    Streams the response body of url into file_path chunk by chunk, returns the written bytes count.
+    on_progress is called with the written and the total (when known) bytes after every chunk.
+
+    Interrupted transfers are retried after a jittered exponential backoff, resuming from the
+    already written bytes with a Range request. Raises DownloadHTTPError on client error statuses
+    and DownloadRetriesExhaustedError once every retry failed.
+    """
+    session = session or get_session()
+    host = urlsplit(url).netloc
+    written_bytes = 0
+    for attempt in range(retries + 1):
+        headers = {"Range": f"bytes={written_bytes}-"} if written_bytes else None
+        try:
+            async with session.get(url, headers=headers, timeout=DOWNLOAD_TIMEOUT) as response:
+                upstream_requests.inc(host=host, status=response.status)
+                if response.status == 416 and written_bytes:
+                    # everything was received before the connection dropped.
+                    _, total_bytes = _content_range(response.headers.get("Content-Range"))
+                    if total_bytes == written_bytes:
+                        return written_bytes
+                if 400 <= response.status < 500:
+                    raise DownloadHTTPError(url, response.status)
+                response.raise_for_status()
+                range_start, total_bytes = _content_range(response.headers.get("Content-Range"))
+                if response.status != 206 or range_start != written_bytes:
+                    # the server ignored the Range header, starting over.
+                    written_bytes = 0
+                    total_bytes = response.content_length
+                with open(file_path, "ab" if written_bytes else "wb") as file:
+                    async for chunk in response.content.iter_chunked(chunk_size):
+                        file.write(chunk)
+                        written_bytes += len(chunk)
+                        upstream_bytes.inc(len(chunk), host=host, kind="audio")
+                        if on_progress:
+                            on_progress(written_bytes, total_bytes)
+                if total_bytes is not None and written_bytes != total_bytes:
+                    raise IncompleteDownloadError(url, total_bytes, written_bytes)
+                return written_bytes
+        except DownloadHTTPError:
+            raise
+        except (ClientError, asyncio.TimeoutError, IncompleteDownloadError) as error:
+            if attempt == retries:
+                raise DownloadRetriesExhaustedError(url, attempt + 1, error) from error
+            # full jitter, so retries of concurrent downloads don't hit the server all at once.
+            delay = random.uniform(
+                0, min(DOWNLOAD_RETRY_MAX_DELAY, DOWNLOAD_RETRY_BACKOFF * 2**attempt)
+            )
+            logger.warning(
+                f"Download of {url} failed at {written_bytes} bytes ({error!r}), "
+                f"retrying in {delay:.1f}s."
+            )
+            await asyncio.sleep(delay)
+
+
+async def iterate_queue(queue: asyncio.Queue) -> AsyncIterator[Any]:
+    """
+    Yields the items put into queue as they arrive, until a None is put.
+    """
+    while True:
+        item = await queue.get()
+        if item is None:
+            return
+        yield item
 
 
 # This function is not used in program, but rather in debugging and testing.
 async def artist_with_most_pages() -> Artist:
-    async with ClientSession() as session:
-        response = await fetch(session, BASE_URL)
-        bs = BeautifulSoup(response, "html.parser")
-        artists = bs.find("aside", class_=HTMLTagClass.ARTISTS.value).find_all("li")
-        max_page = 0
-        for artist in artists:
-            response = await fetch(session, artist.a.attrs["href"])
-            art_bs = BeautifulSoup(response, "html.parser")
-            last_page_number = last_page_number_extractor(art_bs)
-            if last_page_number > max_page:
-                max_page = int(last_page_number)
-                art = Artist(name=artist.text, url=artist.a.attrs["href"])
-        return art
+    extractor = get_extractor()
+    response = await fetch(BASE_URL)
+    max_page = 0
+    for name, url in extractor.artists(response):
+        response = await fetch(url)
+        _, last_page_number = extractor.artist_page(response)
+        if last_page_number and last_page_number > max_page:
+            max_page = last_page_number
+            art = intern_artist(name, url)
+    return art
@@ -0,0 +1,238 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+from urllib.parse import urlsplit
+
+from aiohttp import ClientResponseError
+
+from music_bot.logger import logger
+from music_bot.metrics import Gauge
+from music_bot.scrap.exceptions import CircuitOpenError
+from music_bot.settings import (
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_RESET_TIMEOUT,
+    SCRAPE_CONCURRENCY_PER_HOST,
+    SCRAPE_RATE_BURST,
+    SCRAPE_RATE_LIMIT,
+)
+
+
+class TokenBucket:
+    """
+    Allows rate calls per second on average, with bursts of up to burst calls.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self) -> None:
+        # the lock keeps waiters in line, so they're served in the order they came.
+        async with self._lock:
+            self._refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures and rejects calls for reset_timeout seconds,
+    then lets a single trial call through (half open): its success closes the circuit again,
+    its failure opens it for another reset_timeout.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return "open"
+        return "half_open"
+
+    def retry_after(self) -> float:
+        if self.opened_at is None:
+            return 0
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def release_trial(self) -> None:
+        # the trial call didn't reach the host, the next caller gets to make it.
+        self._trial_running = False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def record_failure(self) -> bool:
+        """
+        Returns whether the failure opened the circuit.
+        """
+        self.failures += 1
+        was_trial, self._trial_running = self._trial_running, False
+        if was_trial or (self.opened_at is None and self.failures >= self.failure_threshold):
+            self.opened_at = time.monotonic()
+            return True
+        return False
+
+
+class HostLimiter:
+    """
+    Rate limit, concurrency limit and circuit breaker of the requests to a single host.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        rate: float,
+        burst: int,
+        concurrency: int,
+        failure_threshold: int,
+        reset_timeout: float,
+    ):
+        self.host = host
+        self.bucket = TokenBucket(rate, burst)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.stats = dict(
+            requests=0,
+            rejected=0,
+            failures=0,
+            circuit_opened=0,
+            queued=0,
+            queue_delay_total_s=0.0,
+            queue_delay_max_s=0.0,
+        )
+
+    @asynccontextmanager
+    async def request(self) -> AsyncIterator[None]:
+        """
+        Waits for a token and a free slot, raises CircuitOpenError when the host is unhealthy.
+        Exceptions raised inside count as failures of the host, unless they're client errors.
+        """
+        if not self.breaker.allow():
+            self.stats["rejected"] += 1
+            raise CircuitOpenError(self.host, self.breaker.retry_after())
+        queued_at = time.monotonic()
+        self.stats["queued"] += 1
+        try:
+            await self.bucket.acquire()
+            await self.semaphore.acquire()
+        except asyncio.CancelledError:
+            self.breaker.release_trial()
+            raise
+        finally:
+            self.stats["queued"] -= 1
+        queue_delay = time.monotonic() - queued_at
+        self.stats["requests"] += 1
+        self.stats["queue_delay_total_s"] += queue_delay
+        self.stats["queue_delay_max_s"] = max(self.stats["queue_delay_max_s"], queue_delay)
+        try:
+            yield
+        except asyncio.CancelledError:
+            self.breaker.release_trial()
+            raise
+        except Exception as error:
+            if is_host_failure(error):
+                self.failure()
+            else:
+                self.breaker.record_success()
+            raise
+        else:
+            self.breaker.record_success()
+        finally:
+            self.semaphore.release()
+
+    def failure(self) -> None:
+        self.stats["failures"] += 1
+        if self.breaker.record_failure():
+            self.stats["circuit_opened"] += 1
+            logger.warning(
+                f"{self.host} is failing, rejecting its requests for {self.breaker.reset_timeout}s."
+            )
+
+
+def is_host_failure(error: BaseException) -> bool:
+    # a 404 means the host is up, a 5xx, 429 or a connection error that it may not be.
+    if isinstance(error, ClientResponseError):
+        return error.status >= 500 or error.status == 429
+    return True
+
+
+# host -> its limiter, shared by every fetch to the host.
+host_limiters: Dict[str, HostLimiter] = dict()
+
+
+def get_host_limiter(url: str) -> HostLimiter:
+    host = urlsplit(url).netloc
+    if host not in host_limiters:
+        host_limiters[host] = HostLimiter(
+            host,
+            rate=SCRAPE_RATE_LIMIT,
+            burst=SCRAPE_RATE_BURST,
+            concurrency=SCRAPE_CONCURRENCY_PER_HOST,
+            failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+            reset_timeout=CIRCUIT_RESET_TIMEOUT,
+        )
+    return host_limiters[host]
+
+
+def host_limiter_stats() -> Dict[str, dict]:
+    return {
+        host: dict(limiter.stats, circuit=limiter.breaker.state)
+        for host, limiter in host_limiters.items()
+    }
+
+
+CIRCUIT_STATES = {"closed": 0, "half_open": 1, "open": 2}
+Gauge(
+    "musicbot_host_requests_total",
+    "Requests let through, rejected by an open circuit and failed, per host.",
+    ["host", "outcome"],
+    function=lambda: {
+        (host, outcome): limiter.stats[outcome]
+        for host, limiter in host_limiters.items()
+        for outcome in ("requests", "rejected", "failures")
+    },
+    type_="counter",
+)
+Gauge(
+    "musicbot_host_queued_requests",
+    "Requests waiting for a token or a free slot of the host.",
+    ["host"],
+    function=lambda: {(host,): limiter.stats["queued"] for host, limiter in host_limiters.items()},
+)
+Gauge(
+    "musicbot_host_circuit_state",
+    "Circuit of the host, 0 closed, 1 half open, 2 open.",
+    ["host"],
+    function=lambda: {
+        (host,): CIRCUIT_STATES[limiter.breaker.state] for host, limiter in host_limiters.items()
+    },
+)
@@ -0,0 +1,175 @@
+import heapq
+import itertools
+import math
+import re
+from bisect import bisect_left, insort
+from collections import defaultdict
+from typing import Any, Dict, Hashable, Iterator, List, Set, Tuple
+
+# arabic forms of persian letters, which are commonly typed by arabic keyboard layouts.
+PERSIAN_CHARACTERS_MAP = str.maketrans(
+    {
+        "ي": "ی",
+        "ى": "ی",
+        "ئ": "ی",
+        "ك": "ک",
+        "ة": "ه",
+        "ۀ": "ه",
+        "ە": "ه",
+        "أ": "ا",
+        "إ": "ا",
+        "ٱ": "ا",
+        "ؤ": "و",
+        "\u200c": " ",  # ZWNJ
+        "\u200f": "",  # RLM
+        "\u0640": "",  # tatweel
+        **{persian: str(i) for i, persian in enumerate("۰۱۲۳۴۵۶۷۸۹")},
+        **{arabic: str(i) for i, arabic in enumerate("٠١٢٣٤٥٦٧٨٩")},
+    }
+)
+DIACRITICS = re.compile("[\u064b-\u065f\u0670]")
+WHITESPACES = re.compile(r"\s+")
+# scores of the matches found by prefix, higher than any of the ones found by ngrams.
+EXACT_MATCH_SCORE = 2.0
+# the query is the start of the text.
+TEXT_PREFIX_MATCH_SCORE = 1.5
+# the query is the start of the text, or of one of its words.
+PREFIX_MATCH_SCORE = 1.2
+# new prefixes are merged into the sorted ones once they're this fraction of them, or this many.
+PREFIX_MERGE_FRACTION = 8
+MIN_PREFIX_MERGE_SIZE = 4096
+# bounds of the work of a single search, a short query may match most of a big index.
+MAX_PREFIX_MATCHES = 200
+MAX_GRAM_CANDIDATES = 2000
+
+
+def normalize_persian(text: str) -> str:
+    text = text.translate(PERSIAN_CHARACTERS_MAP)
+    text = DIACRITICS.sub("", text)
+    return WHITESPACES.sub(" ", text).strip().lower()
+
+
+def ngrams(text: str, n: int = 3) -> Set[str]:
+    padded = f" {text} "
+    return {padded[i : i + n] for i in range(len(padded) - n + 1)}
+
+
+class SearchIndex:
+    """
+    In-memory index of items by their name, supports exact, prefix (of the whole name or of
+    any of its words) and trigram based fuzzy lookups over normalized persian text.
+    """
+
+    def __init__(self):
+        self._texts: List[str] = []
+        self._items: List[Any] = []
+        self._keys: Dict[Hashable, int] = dict()
+        # sorted (text or word, item index) pairs for prefix lookups.
+        self._prefixes: List[Tuple[str, int]] = []
+        # the recently added pairs, sorted too. Songs are indexed a page at a time, sorting all the
+        # pairs for each page would hold up the event loop for long on a big index.
+        self._new_prefixes: List[Tuple[str, int]] = []
+        self._grams: Dict[str, Set[int]] = defaultdict(set)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._keys
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        position = self._keys.get(key)
+        return default if position is None else self._items[position]
+
+    def add(self, text: str, item: Any, key: Hashable = None) -> None:
+        key = key if key is not None else text
+        if key in self._keys:
+            return
+        self.add_many([(text, item, key)])
+
+    def add_many(self, entries: List[Tuple[str, Any, Hashable]]) -> None:
+        new_prefixes = []
+        for text, item, key in entries:
+            if key in self._keys:
+                continue
+            index = len(self._items)
+            normalized = normalize_persian(text)
+            self._keys[key] = index
+            self._texts.append(normalized)
+            self._items.append(item)
+            new_prefixes.append((normalized, index))
+            new_prefixes.extend((word, index) for word in normalized.split(" ")[1:])
+            for gram in ngrams(normalized):
+                self._grams[gram].add(index)
+        merge_size = max(MIN_PREFIX_MERGE_SIZE, len(self._prefixes) // PREFIX_MERGE_FRACTION)
+        if len(self._new_prefixes) + len(new_prefixes) > merge_size:
+            # both are mostly sorted runs, which sort merges in about linear time.
+            self._prefixes.extend(self._new_prefixes)
+            self._prefixes.extend(new_prefixes)
+            self._prefixes.sort()
+            self._new_prefixes = []
+        else:
+            for prefix in new_prefixes:
+                insort(self._new_prefixes, prefix)
+
+    def _prefix_matches(self, query: str) -> Iterator[int]:
+        """
+        Indexes of the items whose text, or one of its words, starts with query. The first
+        MAX_PREFIX_MATCHES of each sorted list, the ones equal to query come first.
+        """
+        for prefixes in (self._prefixes, self._new_prefixes):
+            position = bisect_left(prefixes, (query, -1))
+            end = min(len(prefixes), position + MAX_PREFIX_MATCHES)
+            while position < end and prefixes[position][0].startswith(query):
+                yield prefixes[position][1]
+                position += 1
+
+    def _gram_scores(
+        self, query: str, min_score: float, exclude: Dict[int, float]
+    ) -> Dict[int, float]:
+        """
+        Fraction of the query's trigrams of the items sharing at least min_score of them.
+        """
+        query_grams = ngrams(query)
+        postings = sorted((self._grams.get(gram, set()) for gram in query_grams), key=len)
+        needed = max(1, math.ceil(min_score * len(postings)))
+        scores: Dict[int, float] = dict()
+        # an item sharing `needed` grams is in at least one of the rarest len - needed + 1 ones,
+        # the most common ones, which may hold most of the index, are only looked up.
+        candidates = itertools.chain.from_iterable(postings[: len(postings) - needed + 1])
+        for index in itertools.islice(candidates, MAX_GRAM_CANDIDATES):
+            if index in exclude or index in scores:
+                continue
+            shared = sum(1 for posting in postings if index in posting)
+            if shared >= needed:
+                scores[index] = shared / len(postings)
+        return scores
+
+    def search(self, query: str, limit: int = 10, min_score: float = 0.5) -> List[Any]:
+        return [item for item, _ in self.search_with_scores(query, limit, min_score)]
+
+    def search_with_scores(
+        self, query: str, limit: int = 10, min_score: float = 0.5
+    ) -> List[Tuple[Any, float]]:
+        query = normalize_persian(query)
+        if not query:
+            return []
+        scores: Dict[int, float] = dict()
+        for index in self._prefix_matches(query):
+            if self._texts[index] == query:
+                scores[index] = EXACT_MATCH_SCORE
+            elif self._texts[index].startswith(query):
+                scores[index] = max(scores.get(index, 0), TEXT_PREFIX_MATCH_SCORE)
+            else:
+                scores[index] = max(scores.get(index, 0), PREFIX_MATCH_SCORE)
+        # prefix matches score above any trigram one, limit of them leave no place for those.
+        if len(scores) < limit and min_score <= 1:
+            scores.update(self._gram_scores(query, min_score, scores))
+        # the best few of possibly thousands of matches of a short query.
+        ranked = heapq.nsmallest(
+            limit,
+            (item for item in scores.items() if item[1] >= min_score),
+            # shorter names are closer to the query among equally scored ones.
+            key=lambda item: (-item[1], len(self._texts[item[0]])),
+        )
+        return [(self._items[index], score) for index, score in ranked]
@@ -1,10 +1,16 @@
-from typing import List, Union
+from typing import TYPE_CHECKING, List, Optional, Tuple
 from enum import Enum
+import asyncio
+import functools
+import time
 
-from bs4 import BeautifulSoup
-from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Message
+from telegram.error import BadRequest
 
-from music_bot.scrap.models import Artist, Song
+from music_bot.settings import KEYBOARD_CACHE_SIZE
+
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
 
 
 class HTMLTagClass(Enum):
@@ -13,7 +19,7 @@ class HTMLTagClass(Enum):
     SONG_COVER = "cntfa"
 
 
-def last_page_number_extractor(bs: BeautifulSoup) -> int:
+def last_page_number_extractor(bs: "BeautifulSoup") -> int:
     page_indexes_div = bs.find("div", class_=HTMLTagClass.PAGE_INDEXES.value)
     if not page_indexes_div:
         return None
@@ -26,25 +32,30 @@ def paginate_list(list_: List, page_size=10) -> List[List]:
     return [list_[i : i + page_size] for i in range(0, len(list_), page_size)]
 
 
+@functools.lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
 def create_keyboard_page(
-    paginated_objects: List[List[Union[Artist, Song]]], requested_page: int
+    buttons: Tuple[Tuple[str, str], ...], requested_page: int, last_page: int
 ) -> InlineKeyboardMarkup:
+    """
+    Creates the keyboard of a single page from its (text, callback data) buttons, only the page
+    count of the other pages is needed. Keyboards are immutable, so each one is built once and
+    shared by every user paging through the same list.
+    """
     keyboard_layout = []
-    # page count on website starts from 1, while python list indexing starts from 0
-    requested_object_page = paginated_objects[requested_page - 1]
-    for i in range(0, len(requested_object_page) - 1, 2):
-        current, next = requested_object_page[i], requested_object_page[i + 1]
-        line = [
-            InlineKeyboardButton(current.name, callback_data=current),
-            InlineKeyboardButton(next.name, callback_data=next),
-        ]
-        keyboard_layout.append(line)
-    if len(requested_object_page) % 2 != 0:
-        last = requested_object_page[-1]
-        keyboard_layout.append([InlineKeyboardButton(last.name, callback_data=last)])
-    last_page = len(paginated_objects)
+    for i in range(0, len(buttons) - 1, 2):
+        keyboard_layout.append(
+            [
+                InlineKeyboardButton(text, callback_data=data)
+                for text, data in buttons[i : i + 2]
+            ]
+        )
+    if len(buttons) % 2 != 0:
+        text, data = buttons[-1]
+        keyboard_layout.append([InlineKeyboardButton(text, callback_data=data)])
     next_page, previous_page = "-->", "<--"
-    if requested_page == 1:
+    if last_page == 1:
+        line = [InlineKeyboardButton(text="خروج", callback_data="exit")]
+    elif requested_page == 1:
         line = [
             InlineKeyboardButton(text="خروج", callback_data="exit"),
             InlineKeyboardButton(
@@ -70,3 +81,59 @@ def create_keyboard_page(
         ]
     keyboard_layout.append(line)
     return InlineKeyboardMarkup(keyboard_layout)
+
+
+class StatusMessageUpdater:
+    """
+    Shows a download's queue position and progress on its status message, progress edits are
+    throttled to one every interval seconds to stay clear of telegram's flood limits.
+    """
+
+    def __init__(self, message: Message, interval: float):
+        self.message = message
+        self.interval = interval
+        self.stopped = False
+        self._last_text = None
+        self._last_edit = 0.0
+        self._edit_task: Optional[asyncio.Task] = None
+
+    async def edit(self, text: str) -> None:
+        if self.stopped or text == self._last_text:
+            return
+        self._last_text = text
+        self._last_edit = time.monotonic()
+        try:
+            await self.message.edit_text(text)
+        except BadRequest:  # the message was deleted or wasn't modified.
+            pass
+
+    async def position(self, position: int) -> None:
+        await self.edit(f"در صف دانلود، نوبت شما: {position}")
+
+    def _throttled_edit(self, text: str) -> None:
+        if time.monotonic() - self._last_edit < self.interval:
+            return
+        if self._edit_task and not self._edit_task.done():
+            return
+        self._last_edit = time.monotonic()
+        self._edit_task = asyncio.create_task(self.edit(text))
+
+    def progress(self, downloaded_bytes: int, total_bytes: Optional[int]) -> None:
+        downloaded = f"{downloaded_bytes / 1024 / 1024:.1f}"
+        if total_bytes:
+            text = f"در حال دانلود آهنگ ... {downloaded_bytes * 100 // total_bytes}% ({downloaded}/{total_bytes / 1024 / 1024:.1f} MB)"
+        else:
+            text = f"در حال دانلود آهنگ ... ({downloaded} MB)"
+        self._throttled_edit(text)
+
+    def songs(self, done: int, total: int) -> None:
+        """
+        Progress of a bulk download, in songs rather than bytes.
+        """
+        self._throttled_edit(f"در حال دانلود آهنگ ها ... {done} از {total}")
+
+    def stop(self) -> None:
+        """
+        Stops further position and progress edits, so they don't overwrite the message's next text.
+        """
+        self.stopped = True